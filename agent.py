@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import uuid
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, urlencode
+
+from ingest import BATCH_CONTENT_ENCODING, BATCH_CONTENT_TYPE, encode_batch, read_records
+
+
+# Период отправки новых отсчётов на сервер, с
+SHIP_INTERVAL = 5.0
+
+# Максимальное количество отсчётов в одной пачке
+SHIP_BATCH_SIZE = 500
+
+# Повторы запроса при сетевых ошибках и ответах 5xx: число попыток и экспоненциальная пауза, с
+MAX_ATTEMPTS = 5
+BACKOFF_MIN = 0.5
+BACKOFF_MAX = 8.0
+
+# Тайм-аут одного HTTP-запроса, с
+REQUEST_TIMEOUT = 10.0
+
+# Ответы, которыми сервер отклоняет саму пачку (отсчёт неверной формы, слишком большая пачка):
+# повтор той же пачки не поможет, поэтому она делится пополам, пока не останутся отклонённые отсчёты
+REJECTED_CODES = (400, 413)
+
+
+def _is_transient(error):
+    """
+    Ошибки, после которых запрос стоит повторить: сеть недоступна, тайм-аут,
+    сервер перегружен (429) или вернул 5xx. Ошибки 4xx не повторяются.
+    """
+    if isinstance(error, HTTPError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (URLError, ConnectionError, TimeoutError, socket.timeout))
+
+
+def rejected_path(db_name):
+    """
+    Файл для отсчётов, которые сервер отклонил: <база>.rejected.ndjson рядом с базой.
+    """
+    return f"{db_name}.rejected.ndjson"
+
+
+def source_id(db_name):
+    """
+    Возвращает постоянный идентификатор локальной базы агента.
+
+    Идентификатор хранится рядом с базой в файле <база>.source. Для новой базы
+    (например, после удаления старой) создаётся новый идентификатор, поэтому сервер
+    не путает её id с уже принятыми.
+    """
+    path = f"{db_name}.source"
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    value = uuid.uuid4().hex
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(value)
+    return value
+
+
+class Agent:
+    """
+    Агент: отправляет новые отсчёты локальной базы на центральный сервер (main.py).
+
+    Локальная база сборщика служит буфером: агент раз в interval секунд читает отсчёты
+    с id больше отметки сервера и отправляет их пачками (NDJSON, сжатый gzip) на
+    /api/ingest/<host>. Отметку (id последнего принятого отсчёта) возвращает сервер,
+    поэтому после перезапуска агента или недоступности сервера отправка продолжается
+    с того же места, без потерь и дублей. Сетевые ошибки повторяются с экспоненциальной
+    паузой (tenacity); если сервер так и не ответил, данные остаются в локальной базе
+    до следующей попытки. Пачку, которую сервер отклонил (400, 413), агент не повторяет:
+    она делится пополам, пока не найдутся отклонённые отсчёты, остальные отправляются,
+    а отклонённые пропускаются и сохраняются в <база>.rejected.ndjson (rejected_path),
+    иначе один испорченный отсчёт навсегда остановил бы отправку.
+
+    Атрибуты:
+        db_name (str): Локальная база сборщика.
+        url (str): Адрес сервера, например http://127.0.0.1:5000.
+        host (str): Имя хоста на сервере (по умолчанию — имя машины).
+        interval (float): Период отправки в секундах.
+        batch_size (int): Максимальное количество отсчётов в пачке.
+    """
+
+    def __init__(self, db_name, url, host=None, interval=SHIP_INTERVAL, batch_size=SHIP_BATCH_SIZE):
+        self.db_name = db_name
+        self.url = url.rstrip("/")
+        self.host = host or socket.gethostname()
+        self.interval = interval
+        self.batch_size = batch_size
+        self.source = None
+        self.last_id = None
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Статистика отправки
+        self.batches = 0
+        self.records = 0
+        self.bytes_sent = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def _endpoint(self):
+        return f"{self.url}/api/ingest/{quote(self.host)}?{urlencode({'source': self.source})}"
+
+    def _request(self, data=None):
+        """
+        Выполняет запрос к серверу с повторами и возвращает разобранный JSON-ответ.
+        """
+        # tenacity и urllib.request (с ssl) нужны только при отправке: импорт модуля остаётся лёгким
+        from urllib.request import Request, urlopen
+
+        from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_exponential, wait_random
+
+        headers = {"Accept": "application/json"}
+        if data is not None:
+            headers.update({"Content-Type": BATCH_CONTENT_TYPE, "Content-Encoding": BATCH_CONTENT_ENCODING})
+        for attempt in Retrying(
+            stop=stop_after_attempt(MAX_ATTEMPTS),
+            wait=wait_exponential(multiplier=BACKOFF_MIN, max=BACKOFF_MAX) + wait_random(0, BACKOFF_MIN),
+            retry=retry_if_exception(_is_transient),
+            reraise=True,
+        ):
+            with attempt:
+                method = "GET" if data is None else "POST"
+                request = Request(self._endpoint(), data=data, headers=headers, method=method)
+                with urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                    return json.loads(response.read())
+
+    def ship(self):
+        """
+        Отправляет все новые отсчёты локальной базы.
+
+        Возвращает:
+            int: Количество отсчётов, принятых сервером.
+        """
+        if not os.path.exists(self.db_name):
+            return 0
+        if self.source is None:
+            self.source = source_id(self.db_name)
+        if self.last_id is None:
+            self.last_id = self._request()["last_id"]
+
+        shipped = 0
+        conn = sqlite3.connect(f"file:{self.db_name}?mode=ro", uri=True)
+        try:
+            while True:
+                records = read_records(conn, self.last_id, self.batch_size)
+                if not records:
+                    break
+                shipped += self._send(records)
+                if len(records) < self.batch_size:
+                    break
+        finally:
+            conn.close()
+        return shipped
+
+    def _send(self, records):
+        """
+        Отправляет пачку; отклонённую сервером пачку делит пополам, а отклонённый
+        отсчёт пропускает (см. _reject).
+
+        Возвращает:
+            int: Количество отсчётов, принятых сервером.
+        """
+        body = encode_batch(records)
+        try:
+            response = self._request(body)
+        except HTTPError as e:
+            if e.code not in REJECTED_CODES:
+                raise
+            if len(records) == 1:
+                self._reject(records[0], e)
+                return 0
+            middle = len(records) // 2
+            return self._send(records[:middle]) + self._send(records[middle:])
+        if response["last_id"] <= self.last_id:
+            raise ValueError(f"Сервер не принял пачку: отметка {response['last_id']}")
+        self.last_id = response["last_id"]
+        self.batches += 1
+        self.records += response["accepted"]
+        self.bytes_sent += len(body)
+        return response["accepted"]
+
+    def _reject(self, record, error):
+        """
+        Пропускает отсчёт, отклонённый сервером: отметка переходит за него,
+        а сам отсчёт дописывается в rejected_path для разбора.
+        """
+        self.last_id = max(self.last_id, record["id"])
+        self.rejected += 1
+        with open(rejected_path(self.db_name), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(
+            f"Сервер {self.url} отклонил отсчёт {record['id']} ({error.code}), он сохранён в {rejected_path(self.db_name)}"
+        )
+
+    def _ship_quietly(self):
+        try:
+            self.ship()
+        except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+            # Сервер недоступен после всех повторов — данные дождутся следующей попытки
+            self.failures += 1
+            print(f"Не удалось отправить отсчёты на {self.url}: {e}")
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._ship_quietly()
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="agent", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Останавливает периодическую отправку и отправляет оставшиеся отсчёты.
+        """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        self._ship_quietly()
+
+    def report(self):
+        """
+        Формирует строку со статистикой отправки для вывода в консоль.
+        """
+        return (
+            f"Агент {self.host} -> {self.url}: {self.records} отсчётов в {self.batches} пачках, "
+            f"{self.bytes_sent / 1024:.1f} КБ, неудачных попыток {self.failures}, отклонено отсчётов {self.rejected}"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Однократная отправка новых отсчётов базы на сервер (вместо повторной загрузки файла целиком)"
+    )
+    parser.add_argument("--db", required=True, help="локальная база сборщика")
+    parser.add_argument("--url", required=True, help="адрес сервера, например http://127.0.0.1:5000")
+    parser.add_argument("--host", default=None, help="имя хоста на сервере (по умолчанию — имя машины)")
+    parser.add_argument("--batch-size", type=int, default=SHIP_BATCH_SIZE, help="отсчётов в одной пачке")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    agent = Agent(args.db, args.url, host=args.host, batch_size=args.batch_size)
+    agent.ship()
+    print(agent.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+import json
+import math
+import queue
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+from schema import to_epoch_us
+
+
+# Метрики отсчёта, по которым можно задавать правила
+METRICS = ("cpu", "memory", "gpu", "cycle_time")
+
+# Параметры правила аномалий по умолчанию: порог |z|, коэффициент сглаживания EWMA
+# и количество отсчётов до начала проверки (пока среднее и дисперсия не устоялись)
+ANOMALY_Z = 4.0
+ANOMALY_ALPHA = 0.05
+ANOMALY_WARMUP = 30
+
+# Тайм-аут отправки оповещения на webhook, с
+WEBHOOK_TIMEOUT = 5.0
+
+# Схемы адресов webhook, которые умеет отправлять urllib
+WEBHOOK_SCHEMES = ("http", "https")
+
+_THRESHOLD_SPEC = re.compile(
+    r"^\s*(?P<metric>\w+)\s*(?P<op>[<>])\s*(?P<value>[-+]?[\d.]+)\s*(?:for\s+(?P<seconds>[\d.]+)\s*s?)?\s*$"
+)
+_ANOMALY_SPEC = re.compile(r"^\s*(?P<metric>\w+)\s+z\s*>\s*(?P<z>[\d.]+)\s*$")
+
+
+def sample_values(sample):
+    """
+    Значения метрик отсчёта (см. collector.make_sample); для GPU — максимальная загрузка.
+    Метрика без значения (например, GPU не найден) равна None.
+    """
+    gpu_usage = sample["gpu_usage"]
+    # Загрузка GPU, которую nvidia-smi не сообщает ([N/A]), равна None
+    loads = [item[1] for item in gpu_usage if item[1] is not None] if isinstance(gpu_usage, list) else []
+    gpu = max(loads, default=None)
+    return {
+        "cpu": sample["cpu_usage"],
+        "memory": sample["memory_usage"],
+        "gpu": gpu,
+        "cycle_time": sample["cycle_time"],
+    }
+
+
+class ThresholdRule:
+    """
+    Статический порог: значение метрики выше (или ниже) value дольше for_seconds секунд.
+
+    Оповещение отправляется один раз при срабатывании; повторно — только после того,
+    как значение вернётся в норму.
+
+    Атрибуты:
+        name (str): Имя правила (по умолчанию — его запись, например "cpu>90 for 30").
+        metric (str): Метрика из METRICS.
+        above (bool): True — порог сверху, False — снизу.
+        value (float): Порог.
+        for_seconds (float): Сколько секунд условие должно выполняться подряд.
+    """
+
+    def __init__(self, metric, value, above=True, for_seconds=0.0, name=None):
+        if metric not in METRICS:
+            raise ValueError(f"Неизвестная метрика: {metric}")
+        self.metric = metric
+        self.value = value
+        self.above = above
+        self.for_seconds = for_seconds
+        self.name = name or (
+            f"{metric}{'>' if above else '<'}{value:g}" + (f" for {for_seconds:g}" if for_seconds else "")
+        )
+        self.active = False
+        self._since = None
+
+    def update(self, now, value):
+        """
+        Учитывает очередное значение; возвращает текст оповещения при срабатывании, иначе None.
+        """
+        if (value > self.value) if self.above else (value < self.value):
+            if self._since is None:
+                self._since = now
+            if not self.active and now - self._since >= self.for_seconds:
+                self.active = True
+                duration = f" в течение {now - self._since:.0f} с" if self.for_seconds else ""
+                side = "выше" if self.above else "ниже"
+                return f"{self.metric} = {value:g} {side} порога {self.value:g}{duration}"
+        else:
+            self._since = None
+            self.active = False
+        return None
+
+
+class AnomalyRule:
+    """
+    Аномалия: отклонение значения от экспоненциально сглаженного среднего (EWMA)
+    больше z стандартных отклонений.
+
+    Среднее и дисперсия обновляются за O(1) на отсчёт без хранения истории:
+    mean += alpha * d, var = (1 - alpha) * (var + alpha * d²), где d = x - mean.
+    Значение сравнивается со статистикой до его учёта. Первые warmup отсчётов только
+    накапливают статистику. Стандартное отклонение ограничено снизу min_std, чтобы
+    почти постоянный ряд не давал ложных срабатываний на шуме.
+
+    Атрибуты:
+        name (str): Имя правила (по умолчанию — его запись, например "cpu z>4").
+        metric (str): Метрика из METRICS.
+        z (float): Порог |z|.
+        alpha (float): Коэффициент сглаживания EWMA (0 < alpha < 1).
+        warmup (int): Количество отсчётов до начала проверки.
+        min_std (float): Нижняя граница стандартного отклонения.
+    """
+
+    def __init__(self, metric, z=ANOMALY_Z, alpha=ANOMALY_ALPHA, warmup=ANOMALY_WARMUP, min_std=1e-6, name=None):
+        if metric not in METRICS:
+            raise ValueError(f"Неизвестная метрика: {metric}")
+        self.metric = metric
+        self.z = z
+        self.alpha = alpha
+        self.warmup = warmup
+        self.min_std = min_std
+        self.name = name or f"{metric} z>{z:g}"
+        self.active = False
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+
+    def update(self, now, value):
+        """
+        Учитывает очередное значение; возвращает текст оповещения при срабатывании, иначе None.
+        """
+        message = None
+        if self.count >= self.warmup:
+            score = (value - self.mean) / max(math.sqrt(self.var), self.min_std)
+            if abs(score) >= self.z:
+                if not self.active:
+                    self.active = True
+                    message = f"{self.metric} = {value:g}: аномалия, z = {score:+.1f} (среднее {self.mean:g})"
+            else:
+                self.active = False
+
+        if self.count == 0:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            increment = self.alpha * diff
+            self.mean += increment
+            self.var = (1 - self.alpha) * (self.var + diff * increment)
+        self.count += 1
+        return message
+
+
+def parse_rule(text):
+    """
+    Разбирает правило из строки (например, из параметра --alert):
+
+    - "cpu>90" — порог;
+    - "memory>85 for 30" — порог, который держится 30 секунд;
+    - "cycle_time z>4" — аномалия: |z| относительно EWMA больше 4.
+
+    Исключения:
+        ValueError: Строка не похожа на правило или метрика неизвестна.
+    """
+    match = _ANOMALY_SPEC.match(text)
+    if match:
+        return AnomalyRule(match["metric"], z=float(match["z"]), name=text.strip())
+    match = _THRESHOLD_SPEC.match(text)
+    if match:
+        return ThresholdRule(
+            match["metric"],
+            float(match["value"]),
+            above=match["op"] == ">",
+            for_seconds=float(match["seconds"] or 0),
+            name=text.strip(),
+        )
+    raise ValueError(f"Некорректное правило: {text!r} (примеры: cpu>90, memory>85 for 30, cpu z>4)")
+
+
+def parse_webhook_url(text):
+    """
+    Проверяет адрес webhook (--alert-webhook): схема http или https и имя хоста.
+
+    Исключения:
+        ValueError: Адрес некорректен.
+    """
+    parts = urlsplit(text.strip())
+    if parts.scheme.lower() not in WEBHOOK_SCHEMES or not parts.netloc:
+        raise ValueError(f"Некорректный адрес webhook: {text!r} (пример: https://example.com/hook)")
+    return text.strip()
+
+
+class WebhookSink:
+    """
+    Отправляет оповещение POST-запросом с JSON на адрес url (например, входящий webhook чата).
+    Адрес проверяется сразу (parse_webhook_url), а не при первом оповещении.
+    """
+
+    def __init__(self, url, timeout=WEBHOOK_TIMEOUT):
+        self.url = parse_webhook_url(url)
+        self.timeout = timeout
+
+    def __repr__(self):
+        return f"WebhookSink({self.url!r})"
+
+    def __call__(self, alert):
+        # Вызывается в потоке доставки: urllib.request (с ssl) не загружается, пока webhook не понадобился
+        from urllib.request import Request, urlopen
+
+        body = json.dumps(alert, ensure_ascii=False).encode("utf-8")
+        request = Request(self.url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class AlertEngine:
+    """
+    Проверка правил оповещений для каждого отсчёта прямо в цикле сбора.
+
+    evaluate() обновляет состояние правил за O(1) на отсчёт и не обращается к базе.
+    Сработавшие оповещения передаются через очередь фоновому потоку доставки,
+    который печатает их, записывает в таблицу alerts базы сборщика и передаёт
+    дополнительным получателям sinks (например, WebhookSink; в тестах — любой
+    вызываемый объект). Поэтому медленная сеть или занятая база не увеличивают время цикла.
+
+    Как и SystemProbes, до вызова open() объект не хранит потоков и соединений
+    и может быть передан в процесс сбора.
+
+    Атрибуты:
+        rules (list): Правила (ThresholdRule, AnomalyRule).
+        sinks (list): Дополнительные получатели оповещений: callable(alert).
+    """
+
+    def __init__(self, rules, sinks=()):
+        self.rules = list(rules)
+        self.sinks = list(sinks)
+        self.db_name = None
+        self._queue = None
+        self._thread = None
+
+        # Статистика
+        self.evaluated = 0
+        self.fired = 0
+        self.delivered = 0
+        self.failures = 0
+        self._eval_time = 0.0
+
+    def open(self, db_name=None):
+        """
+        Запускает поток доставки оповещений; db_name — база для таблицы alerts (None — без записи).
+        """
+        self.db_name = db_name
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._deliver, name="alerts", daemon=True)
+        self._thread.start()
+        return self
+
+    def evaluate(self, sample, now=None):
+        """
+        Проверяет правила для отсчёта (формат collector.make_sample).
+
+        Возвращает:
+            list: Сработавшие оповещения (словари timestamp, rule, metric, value, message).
+        """
+        started = time.perf_counter()
+        now = time.monotonic() if now is None else now
+        values = sample_values(sample)
+        fired = []
+        for rule in self.rules:
+            value = values[rule.metric]
+            if value is None:
+                continue
+            message = rule.update(now, value)
+            if message is not None:
+                alert = {
+                    "timestamp": sample["timestamp"],
+                    "rule": rule.name,
+                    "metric": rule.metric,
+                    "value": value,
+                    "message": message,
+                }
+                fired.append(alert)
+                if self._queue is not None:
+                    self._queue.put(alert)
+        self.evaluated += 1
+        self.fired += len(fired)
+        self._eval_time += time.perf_counter() - started
+        return fired
+
+    def _deliver(self):
+        conn = None
+        try:
+            while True:
+                alert = self._queue.get()
+                if alert is None:
+                    break
+                print(f"Оповещение [{alert['rule']}]: {alert['message']}")
+                failed = False
+                if self.db_name is not None:
+                    try:
+                        if conn is None:
+                            conn = sqlite3.connect(self.db_name, timeout=30)
+                        with conn:
+                            conn.execute(
+                                "INSERT INTO alerts (timestamp, rule, metric, value, message) VALUES (?, ?, ?, ?, ?)",
+                                (
+                                    to_epoch_us(alert["timestamp"]),
+                                    alert["rule"],
+                                    alert["metric"],
+                                    alert["value"],
+                                    alert["message"],
+                                ),
+                            )
+                    except (OSError, sqlite3.Error) as e:
+                        failed = True
+                        print(f"Не удалось записать оповещение [{alert['rule']}] в базу: {e}")
+                for sink in self.sinks:
+                    # Любая ошибка получателя (в том числе в чужом callable) не должна остановить поток
+                    # доставки: иначе следующие оповещения навсегда остались бы в очереди
+                    try:
+                        sink(alert)
+                    except Exception as e:
+                        failed = True
+                        print(f"Не удалось доставить оповещение [{alert['rule']}] получателю {sink!r}: {e}")
+                if failed:
+                    self.failures += 1
+                else:
+                    self.delivered += 1
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def close(self):
+        """
+        Дожидается доставки оставшихся оповещений и останавливает поток доставки.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {
+            "evaluated": self.evaluated,
+            "fired": self.fired,
+            "delivered": self.delivered,
+            "failures": self.failures,
+            "eval_us": self._eval_time / self.evaluated * 1e6 if self.evaluated else 0.0,
+        }
+
+    def report(self):
+        """
+        Формирует строку со статистикой оповещений для вывода в консоль.
+        """
+        stats = self.stats()
+        return (
+            f"Оповещения: {len(self.rules)} правил, проверено отсчётов {stats['evaluated']} "
+            f"({stats['eval_us']:.1f} мкс на отсчёт), сработало {stats['fired']}, "
+            f"доставлено {stats['delivered']}, ошибок доставки {stats['failures']}"
+        )
@@ -0,0 +1,235 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from archive import read_series
+from rollup_cache import compute_rollup, file_state
+from series import MAX_TIME, MIN_TIME, count_samples, read_into
+
+
+# Столбцы таблицы performance, которые можно читать в массивы
+PERFORMANCE_COLUMNS = ("id", "timestamp", "cpu_usage", "memory_usage", "elapsed_time")
+
+# Процентили сводки по умолчанию
+SUMMARY_PERCENTILES = (50, 95, 99)
+
+# Количество корзин гистограммы по умолчанию
+HISTOGRAM_BINS = 50
+
+# Сколько результатов describe хранится в памяти
+DESCRIBE_CACHE_SIZE = 32
+
+# Статистики resample, которые считаются через reduceat (p95 — через compute_rollup)
+RESAMPLE_STATS = {"avg": np.add, "min": np.minimum, "max": np.maximum, "count": None}
+
+
+def read_columns(conn, columns=PERFORMANCE_COLUMNS, start=None, end=None):
+    """
+    Читает столбцы таблицы performance в диапазоне времени в массивы numpy.
+
+    Количество строк считается заранее по индексу времени, массив выделяется один раз,
+    и пачки строк из курсора записываются прямо в его срезы (series.read_into).
+
+    Аргументы:
+        conn (sqlite3.Connection): Соединение с базой текущей схемы.
+        columns (tuple): Имена столбцов из PERFORMANCE_COLUMNS.
+        start (int): Начало диапазона в микросекундах (включительно).
+        end (int): Конец диапазона в микросекундах (включительно).
+
+    Возвращает:
+        dict: Имя столбца -> массив float64 (NULL — NaN), по возрастанию времени.
+    """
+    unknown = set(columns) - set(PERFORMANCE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Неизвестные столбцы: {', '.join(sorted(unknown))}")
+    bounds = (MIN_TIME if start is None else start, MAX_TIME if end is None else end)
+    data = np.empty((count_samples(conn, *bounds), len(columns)), dtype=np.float64)
+    cursor = conn.execute(
+        f"SELECT {', '.join(columns)} FROM performance WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp",
+        bounds,
+    )
+    filled = read_into(cursor, data)
+    return {name: data[:filled, i] for i, name in enumerate(columns)}
+
+
+def _finite(values):
+    values = np.asarray(values, dtype=np.float64)
+    mask = ~np.isnan(values)
+    return values if mask.all() else values[mask]
+
+
+def percentiles(values, q=SUMMARY_PERCENTILES):
+    """
+    Процентили ряда без учёта NaN (быстрее np.nanpercentile: NaN отбрасываются один раз).
+
+    Возвращает:
+        dict: "p<q>" -> значение (None для пустого ряда).
+    """
+    values = _finite(values)
+    if len(values) == 0:
+        return {f"p{p:g}": None for p in q}
+    return {f"p{p:g}": float(value) for p, value in zip(q, np.percentile(values, q))}
+
+
+def summary(values, q=SUMMARY_PERCENTILES):
+    """
+    Сводка ряда: количество, среднее, стандартное отклонение, минимум, максимум и процентили q.
+    NaN (нет значения) не учитываются.
+    """
+    values = _finite(values)
+    if len(values) == 0:
+        return {"count": 0, "mean": None, "std": None, "min": None, "max": None, **percentiles(values, q)}
+    return {
+        "count": len(values),
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        **percentiles(values, q),
+    }
+
+
+def histogram(values, bins=HISTOGRAM_BINS, value_range=None):
+    """
+    Гистограмма ряда без учёта NaN.
+
+    Возвращает:
+        tuple: (количества в корзинах, границы корзин) — как у numpy.histogram.
+    """
+    return np.histogram(_finite(values), bins=bins, range=value_range)
+
+
+def rolling_mean(values, window, timestamps=None):
+    """
+    Скользящее среднее за O(n) через накопленные суммы.
+
+    Окно задаётся числом отсчётов или, если переданы timestamps, длительностью
+    в микросекундах (для неравномерного опроса: границы окна находятся двоичным поиском).
+    В начале ряда усредняется то, что уже есть; NaN в окне не учитываются.
+
+    Аргументы:
+        values (numpy.ndarray): Значения.
+        window (int): Ширина окна в отсчётах или в микросекундах.
+        timestamps (numpy.ndarray | None): Время отсчётов в микросекундах по возрастанию.
+
+    Возвращает:
+        numpy.ndarray: Ряд той же длины; NaN, если в окне нет ни одного значения.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if window < 1:
+        raise ValueError("Ширина окна должна быть положительной")
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    ends = np.arange(1, len(values) + 1)
+    if timestamps is None:
+        starts = np.maximum(ends - int(window), 0)
+    else:
+        starts = np.searchsorted(timestamps, np.asarray(timestamps) - window, side="right")
+    total = counts[ends] - counts[starts]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, (sums[ends] - sums[starts]) / total, np.nan)
+
+
+def rate_of_change(timestamps, values):
+    """
+    Скорость изменения значения в единицах в секунду между соседними отсчётами.
+
+    Возвращает:
+        tuple: (время второго отсчёта каждой пары в мкс, производная); пары с одинаковым
+            временем дают NaN.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    dt = np.diff(timestamps) / 1e6
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = np.where(dt > 0, np.diff(values) / dt, np.nan)
+    return timestamps[1:], rate
+
+
+def resample(timestamps, values, interval, stat="avg"):
+    """
+    Приводит ряд к равномерной сетке: одно значение на корзину длиной interval микросекунд
+    (пустые корзины пропускаются, NaN не учитываются). Корзины выровнены так же, как
+    агрегаты кэша; среднее, минимум, максимум и количество считаются через reduceat
+    без сортировки, p95 — через compute_rollup.
+
+    Аргументы:
+        stat (str): "avg", "min", "max", "p95" или "count".
+
+    Возвращает:
+        tuple: (начала корзин в мкс, значения).
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if stat == "p95":
+        rollup = compute_rollup(timestamps, values, interval)
+        return rollup["bucket"], rollup["p95"]
+    if stat not in RESAMPLE_STATS:
+        raise ValueError(f"Неизвестная статистика: {stat}")
+    mask = ~np.isnan(values)
+    timestamps, values = timestamps[mask], values[mask]
+    if len(values) == 0:
+        return np.empty(0), np.empty(0)
+    buckets = (timestamps // interval).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(buckets)])
+    if stat == "count":
+        result = counts.astype(np.float64)
+    elif stat == "avg":
+        result = np.add.reduceat(values, starts) / counts
+    else:
+        result = RESAMPLE_STATS[stat].reduceat(values, starts)
+    return (buckets[starts] * interval).astype(np.float64), result
+
+
+def describe(db_path, metrics, start=None, end=None, bins=HISTOGRAM_BINS):
+    """
+    Сводка и гистограмма нескольких метрик базы за диапазон времени.
+
+    Ряды читаются через archive.read_series (закрытые сегменты — из столбцового архива
+    через mmap, остальное — из SQLite), вся обработка векторизована.
+
+    Возвращает:
+        dict: Имя метрики -> {сводка (см. summary), "histogram": {"counts", "edges"}}.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        result = {}
+        for metric in metrics:
+            _, values = read_series(conn, db_path, metric, start, end)
+            values = _finite(values)
+            counts, edges = histogram(values, bins) if len(values) else (np.empty(0), np.empty(0))
+            result[metric] = {
+                **summary(values),
+                "histogram": {"counts": counts.astype(np.int64).tolist(), "edges": edges.tolist()},
+            }
+        return result
+    finally:
+        conn.close()
+
+
+_described = OrderedDict()
+_described_lock = threading.Lock()
+
+
+def cached_describe(db_path, metrics, start=None, end=None, bins=HISTOGRAM_BINS):
+    """
+    describe() с запоминанием результата до изменения файла (ключ — путь и версия файла
+    с журналом -wal, как у RollupCache): повторные открытия страницы просмотра не пересчитывают сводку.
+    """
+    key = (os.path.abspath(db_path), *file_state(db_path), tuple(metrics), start, end, bins)
+    with _described_lock:
+        result = _described.get(key)
+        if result is not None:
+            _described.move_to_end(key)
+            return result
+    result = describe(db_path, metrics, start, end, bins)
+    with _described_lock:
+        _described[key] = result
+        while len(_described) > DESCRIBE_CACHE_SIZE:
+            _described.popitem(last=False)
+    return result
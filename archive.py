@@ -0,0 +1,380 @@
+import argparse
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+
+import numpy as np
+
+from series import EXTENDED_METRICS, MAX_TIME, MIN_TIME, fetch_rollups, fetch_series
+
+
+# Длина сегмента архива по умолчанию, мкс (сутки)
+SEGMENT_US = 86_400_000_000
+
+# Формат файла сегмента (little-endian): заголовок, таблица столбцов, затем столбцы подряд,
+# каждый выровнен по 8 байт. Время — int64 (мкс), значения метрик — float32 (NaN — нет значения).
+MAGIC = b"LOGSEG\x00\x00"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIqqq")  # magic, версия, число столбцов, число отсчётов, начало, конец сегмента
+COLUMN = struct.Struct("<16s4sq")  # имя, dtype numpy, смещение от начала файла
+TIME_DTYPE = "<i8"
+VALUE_DTYPE = "<f4"
+
+# Метрики, которые берутся из связанных таблиц: отсчёт без строки в них в ряд не попадает
+JOINED_METRICS = ("gpu", *EXTENDED_METRICS)
+
+# Все метрики отсчёта одной строкой, в порядке _SEGMENT_METRICS
+_SEGMENT_QUERY = f"""
+SELECT p.timestamp, p.cpu_usage, p.memory_usage, p.elapsed_time,
+       (SELECT MAX(g.load) FROM gpu_samples AS g WHERE g.sample_id = p.id),
+       {", ".join(f"s.{metric}" for metric in EXTENDED_METRICS)}
+FROM performance AS p
+LEFT JOIN system_samples AS s ON s.sample_id = p.id
+WHERE p.timestamp >= ? AND p.timestamp < ?
+ORDER BY p.timestamp
+"""
+_SEGMENT_METRICS = ("cpu", "memory", "elapsed_time", "gpu", *EXTENDED_METRICS)
+
+MANIFEST = "manifest.json"
+
+# Размер пачки при чтении строк сегмента из курсора
+FETCH_SIZE = 10000
+
+
+def archive_path(db_path):
+    """
+    Возвращает папку архива базы: <база>.archive рядом с файлом базы.
+    """
+    return f"{db_path}.archive"
+
+
+def load_manifest(archive_dir):
+    """
+    Читает описание архива: длину сегмента, границу until (все отсчёты раньше неё
+    есть в архиве) и last_id — наибольший id базы на момент последнего сжатия.
+    Возвращает None, если архива нет.
+    """
+    try:
+        with open(os.path.join(archive_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_manifest(archive_dir, manifest):
+    path = os.path.join(archive_dir, MANIFEST)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _segment_file(archive_dir, start):
+    return os.path.join(archive_dir, f"{start}.seg")
+
+
+def write_segment(path, start, end, timestamps, columns):
+    """
+    Записывает сегмент архива: заголовок и столбцы подряд.
+
+    Файл пишется под временным именем и атомарно переименовывается, поэтому
+    читатели никогда не видят недописанный сегмент.
+
+    Аргументы:
+        path (str): Путь к файлу сегмента.
+        start (int): Начало сегмента в микросекундах (включительно).
+        end (int): Конец сегмента в микросекундах (не включительно).
+        timestamps (numpy.ndarray): Время отсчётов по возрастанию.
+        columns (dict): Имя метрики -> массив значений той же длины.
+    """
+    arrays = [("timestamp", np.ascontiguousarray(timestamps, dtype=TIME_DTYPE))]
+    arrays += [(name, np.ascontiguousarray(values, dtype=VALUE_DTYPE)) for name, values in columns.items()]
+
+    offset = HEADER.size + COLUMN.size * len(arrays)
+    table = []
+    for name, array in arrays:
+        offset = -(-offset // 8) * 8
+        table.append(COLUMN.pack(name.encode("ascii"), array.dtype.str.encode("ascii"), offset))
+        offset += array.nbytes
+
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(arrays), len(timestamps), start, end))
+        f.write(b"".join(table))
+        for (_, array), entry in zip(arrays, table):
+            f.write(b"\0" * (COLUMN.unpack(entry)[2] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(f"{path}.tmp", path)
+
+
+def read_segment(path, metric, start=None, end=None):
+    """
+    Читает ряд метрики из сегмента архива в диапазоне времени [start, end].
+
+    Файл отображается в память (mmap), границы диапазона находятся двоичным поиском
+    по столбцу времени, и копируется только нужный срез двух столбцов — строки
+    не разбираются, а с диска читаются только затронутые страницы.
+
+    Возвращает:
+        tuple: Массивы float64 (время в мкс, значения); пустые, если метрики в сегменте нет.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        magic, version, ncolumns, count, _, _ = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Неизвестный формат сегмента архива: {path}")
+        table = {}
+        for i in range(ncolumns):
+            name, dtype, offset = COLUMN.unpack_from(mm, HEADER.size + i * COLUMN.size)
+            table[name.rstrip(b"\0").decode("ascii")] = (dtype.rstrip(b"\0").decode("ascii"), offset)
+        if metric not in table:
+            return np.empty(0), np.empty(0)
+
+        timestamps = np.frombuffer(mm, dtype=table["timestamp"][0], count=count, offset=table["timestamp"][1])
+        values = np.frombuffer(mm, dtype=table[metric][0], count=count, offset=table[metric][1])
+        lo = 0 if start is None else np.searchsorted(timestamps, start, side="left")
+        hi = count if end is None else np.searchsorted(timestamps, end, side="right")
+        x = timestamps[lo:hi].astype(np.float64)
+        y = values[lo:hi].astype(np.float64)
+        # Срезы скопированы — отпускаем буфер, чтобы mmap можно было закрыть
+        del timestamps, values
+    if metric in JOINED_METRICS:
+        mask = ~np.isnan(y)
+        x, y = x[mask], y[mask]
+    return x, y
+
+
+def _build_segment(conn, archive_dir, start, segment):
+    """
+    Читает отсчёты одного сегмента из базы и записывает их в архив.
+    """
+    cursor = conn.execute(_SEGMENT_QUERY, (start, start + segment))
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        chunks.append(np.array(rows, dtype=np.float64))
+    path = _segment_file(archive_dir, start)
+    if not chunks:
+        # Отсчётов в сегменте больше нет (например, их удалили)
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    data = np.concatenate(chunks)
+    columns = {
+        metric: data[:, i + 1]
+        for i, metric in enumerate(_SEGMENT_METRICS)
+        # Столбцы метрик, которых в сегменте нет совсем (GPU, дополнительные метрики), не сохраняются
+        if metric not in JOINED_METRICS or not np.isnan(data[:, i + 1]).all()
+    }
+    write_segment(path, start, start + segment, data[:, 0].astype(np.int64), columns)
+
+
+def compact(db_path, segment=SEGMENT_US):
+    """
+    Копирует закрытые сегменты таблицы performance в столбцовый архив.
+
+    Закрытыми считаются сегменты целиком раньше сегмента с самым новым отсчётом:
+    в них сборщик уже не пишет. Каждый сегмент — отдельный файл <начало>.seg в папке
+    <база>.archive. Повторное сжатие обрабатывает только новые данные: новые закрытые
+    сегменты и сегменты, в которые после прошлого сжатия дописаны отсчёты
+    (например, при объединении загруженной базы) — они находятся по id больше last_id.
+    Архив — кэш для чтения длинных диапазонов, а не перенос: строки остаются в базе
+    (их читают страницы таблицы, онлайн-просмотр, объединение загрузок и агент) до удаления
+    по сроку хранения (retention.py); тогда же они убираются из архива функцией prune_archive.
+
+    Аргументы:
+        db_path (str): Путь к базе данных текущей схемы.
+        segment (int): Длина сегмента в микросекундах.
+
+    Возвращает:
+        int: Количество записанных сегментов.
+    """
+    archive_dir = archive_path(db_path)
+    os.makedirs(archive_dir, exist_ok=True)
+    manifest = load_manifest(archive_dir)
+    if manifest is None or manifest["segment"] != segment:
+        for name in os.listdir(archive_dir):
+            os.remove(os.path.join(archive_dir, name))
+        manifest = {"segment": segment, "until": MIN_TIME, "last_id": 0}
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        # Все запросы сжатия видят один снимок базы, даже если сборщик продолжает запись
+        conn.execute("BEGIN")
+        # Отдельные запросы: MAX по индексу и по первичному ключу читают по одной строке
+        max_time = conn.execute("SELECT MAX(timestamp) FROM performance").fetchone()[0]
+        max_id = conn.execute("SELECT MAX(id) FROM performance").fetchone()[0]
+        if max_time is None:
+            return 0
+        until = max(manifest["until"], max_time // segment * segment)
+
+        # Сегменты, уже бывшие в архиве, в которые дописаны отсчёты
+        # (унарный + не даёт выбрать индекс по времени вместо первичного ключа)
+        starts = {
+            row[0] * segment
+            for row in conn.execute(
+                "SELECT DISTINCT timestamp / ? FROM performance WHERE id > ? AND +timestamp < ?",
+                (segment, manifest["last_id"], manifest["until"]),
+            )
+        }
+        # Сегменты, закрывшиеся после прошлого сжатия
+        starts.update(
+            row[0] * segment
+            for row in conn.execute(
+                "SELECT DISTINCT timestamp / ? FROM performance WHERE timestamp >= ? AND timestamp < ?",
+                (segment, manifest["until"], until),
+            )
+        )
+        for start in sorted(starts):
+            _build_segment(conn, archive_dir, start, segment)
+    finally:
+        conn.close()
+
+    _save_manifest(archive_dir, {"segment": segment, "until": until, "last_id": max_id})
+    return len(starts)
+
+
+def prune_archive(conn, db_path, cutoff):
+    """
+    Убирает из архива отсчёты раньше cutoff — после того как retention.py удалил их из базы.
+
+    Сегменты целиком раньше границы удаляются, сегмент, в который граница попадает,
+    собирается заново из оставшихся в базе отсчётов. Иначе read_series возвращал бы
+    из архива отсчёты, которых в базе уже нет (вместо агрегатов sample_rollups).
+
+    Аргументы:
+        conn (sqlite3.Connection): Соединение с базой, из которой уже удалены отсчёты раньше cutoff.
+        db_path (str): Путь к базе (по нему находится архив).
+        cutoff (int): Граница хранения в микросекундах.
+
+    Возвращает:
+        int: Количество удалённых или пересобранных сегментов.
+    """
+    archive_dir = archive_path(db_path)
+    manifest = load_manifest(archive_dir)
+    if manifest is None:
+        return 0
+    segment = manifest["segment"]
+    changed = 0
+    for name in os.listdir(archive_dir):
+        if not name.endswith(".seg"):
+            continue
+        start = int(name[:-4])
+        if start + segment <= cutoff:
+            os.remove(os.path.join(archive_dir, name))
+            changed += 1
+        elif start < cutoff:
+            _build_segment(conn, archive_dir, start, segment)
+            changed += 1
+    return changed
+
+
+_compact_locks = {}
+_compact_locks_guard = threading.Lock()
+
+
+def compact_async(db_path, then=None):
+    """
+    Сжимает базу в фоновом потоке (например, после загрузки файла или пачки агента).
+
+    Если сжатие этой базы уже идёт, новое не запускается: следующий вызов
+    подхватит данные, дописанные за это время.
+
+    Аргументы:
+        db_path (str): Путь к базе данных.
+        then (callable | None): Вызывается с db_path после сжатия (например, построение агрегатов).
+    """
+    with _compact_locks_guard:
+        lock = _compact_locks.setdefault(os.path.abspath(db_path), threading.Lock())
+
+    def run():
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            compact(db_path)
+        except (OSError, ValueError, sqlite3.DatabaseError) as e:
+            print(f"Не удалось сжать {db_path} в архив: {e}")
+        finally:
+            lock.release()
+        if then is not None:
+            then(db_path)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def read_series(conn, db_path, metric, start=None, end=None):
+    """
+    Читает ряд метрики из агрегатов удалённых отсчётов, архива (холодные данные)
+    и базы (горячие данные) вместе.
+
+    Время, отсчёты которого удалены по сроку хранения (retention.py), представлено средними
+    минутных и часовых корзин sample_rollups (fetch_rollups). Отсчёты раньше границы until
+    архива читаются из файлов сегментов через mmap, остальные — из SQLite (fetch_series).
+    Если архива нет, весь ряд читается из базы.
+
+    Аргументы:
+        conn (sqlite3.Connection): Соединение с базой.
+        db_path (str): Путь к базе (по нему находится архив).
+        metric (str): Имя метрики из METRIC_QUERIES.
+        start (int): Начало диапазона в микросекундах (включительно).
+        end (int): Конец диапазона в микросекундах (включительно).
+
+    Возвращает:
+        tuple: Массивы (время в мкс, значения), как у fetch_series.
+    """
+    start = MIN_TIME if start is None else start
+    end = MAX_TIME if end is None else end
+    # Агрегаты лежат целиком раньше оставшихся отсчётов, поэтому идут первыми
+    xs, ys = [], []
+    x, y = fetch_rollups(conn, metric, start, end)
+    if len(x):
+        xs.append(x)
+        ys.append(y)
+    archive_dir = archive_path(db_path)
+    manifest = load_manifest(archive_dir)
+    if manifest is None or start >= manifest["until"]:
+        x, y = fetch_series(conn, metric, start, end)
+        if not xs:
+            return x, y
+        return np.concatenate([*xs, x]), np.concatenate([*ys, y])
+
+    segment, until = manifest["segment"], manifest["until"]
+    cold_end = min(end, until - 1)
+    for name in sorted(os.listdir(archive_dir), key=lambda name: (len(name), name)):
+        if not name.endswith(".seg"):
+            continue
+        seg_start = int(name[:-4])
+        if seg_start + segment <= start or seg_start > cold_end:
+            continue
+        x, y = read_segment(os.path.join(archive_dir, name), metric, start, cold_end)
+        xs.append(x)
+        ys.append(y)
+    if end >= until:
+        x, y = fetch_series(conn, metric, until, end)
+        xs.append(x)
+        ys.append(y)
+    if not xs:
+        return np.empty(0), np.empty(0)
+    return np.concatenate(xs), np.concatenate(ys)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Сжатие закрытых сегментов базы в столбцовый архив")
+    parser.add_argument("db", nargs="+", help="базы данных")
+    parser.add_argument("--segment-hours", type=float, default=SEGMENT_US / 3_600_000_000, help="длина сегмента, ч")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    for db_path in args.db:
+        written = compact(db_path, segment=int(args.segment_hours * 3_600_000_000))
+        print(f"{db_path}: записано сегментов {written} в {archive_path(db_path)}")
+
+
+if __name__ == "__main__":
+    main()
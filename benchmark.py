@@ -0,0 +1,423 @@
+"""
+Воспроизводимое сравнение backend'ов сборщика (thread, process, asyncio).
+
+Каждый backend запускается без GUI на заданных частотах и длительностях. Опросы системы
+по умолчанию подменяются детерминированными (MockProbes), поэтому результаты не зависят
+от наличия GPU и от загрузки машины, на которой идёт прогон. Измеряются:
+
+- отсчётов в секунду и пропущенные дедлайны планировщика;
+- p50/p99 времени цикла опроса;
+- загрузка CPU и прирост RSS процесса, в котором работает сборщик;
+- стоимость записи в базу (среднее время сброса пачки и на одну строку);
+- задержка доставки отсчёта потребителю (очередь интерфейса или кольцевой буфер).
+
+Результаты сохраняются в JSON и выводятся таблицей:
+
+    python -m benchmark --backends thread,process,asyncio --rates 1,10 --durations 5 --output benchmark.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import queue
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import psutil
+
+from collector import AsyncioBackend, ProcessBackend, SystemProbes, ThreadBackend
+from shm_ring import SharedRingBuffer
+
+
+# Период опроса ресурсов процесса сборщика, с
+MONITOR_INTERVAL = 0.1
+
+# Период чтения кольцевого буфера потребителем (backend process), с
+RING_POLL_INTERVAL = 0.01
+
+# Ёмкость кольцевого буфера для прогона
+RING_CAPACITY = 4096
+
+# Столбцы итоговой таблицы: заголовок, ключ результата, формат
+TABLE_COLUMNS = (
+    ("backend", "backend", "{}"),
+    ("Гц", "rate", "{:g}"),
+    ("сек.", "duration", "{:g}"),
+    ("отсч./с", "samples_per_sec", "{:.2f}"),
+    ("пропущено", "missed", "{}"),
+    ("цикл p50, мс", "cycle_p50_ms", "{:.3f}"),
+    ("цикл p99, мс", "cycle_p99_ms", "{:.3f}"),
+    ("CPU, %", "cpu_percent", "{:.2f}"),
+    ("RSS, МБ", "rss_delta_mb", "{:.1f}"),
+    ("сброс БД, мс", "db_flush_ms", "{:.3f}"),
+    ("строка БД, мкс", "db_row_us", "{:.1f}"),
+    ("очередь p50, мс", "queue_p50_ms", "{:.3f}"),
+    ("очередь p99, мс", "queue_p99_ms", "{:.3f}"),
+)
+
+
+class MockProbes:
+    """
+    Детерминированные опросы системы для бенчмарка.
+
+    Значения берутся из генератора случайных чисел с фиксированным seed, а стоимость
+    опроса имитируется активным ожиданием заданной длительности (как у настоящего
+    вызова, который занимает CPU). Объект передаётся в процесс сбора, поэтому
+    состояние создаётся только в open().
+
+    Атрибуты:
+        cost (float): Длительность одного опроса CPU/RAM в секундах.
+        gpus (int): Количество имитируемых GPU (0 — "ГП не найден").
+        seed (int): Начальное значение генератора случайных чисел.
+    """
+
+    def __init__(self, cost=0.0, gpus=0, seed=0):
+        self.cost = cost
+        self.gpus = gpus
+        self.seed = seed
+        self._random = None
+
+    def open(self):
+        self._random = random.Random(self.seed)
+        return self
+
+    def _spend(self):
+        deadline = time.perf_counter() + self.cost
+        while time.perf_counter() < deadline:
+            pass
+
+    def cpu(self):
+        self._spend()
+        return round(self._random.uniform(0, 100), 1)
+
+    def memory(self):
+        self._spend()
+        return round(self._random.uniform(20, 80), 1)
+
+    def gpu(self):
+        if not self.gpus:
+            return "ГП не найден"
+        return [(f"Mock GPU {index}", round(self._random.uniform(0, 100), 1)) for index in range(self.gpus)]
+
+    def extended(self):
+        return None
+
+    def stats(self):
+        return None
+
+    def report(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class ResourceMonitor:
+    """
+    Фоновое измерение загрузки CPU и пикового RSS процесса сборщика.
+    """
+
+    def __init__(self, pid, interval=MONITOR_INTERVAL):
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.baseline_rss = self.process.memory_info().rss
+        self.peak_rss = self.baseline_rss
+        self._cpu_start = None
+        self._cpu_end = None
+        self._started_at = None
+        self._stopped_at = None
+
+    def _cpu_seconds(self):
+        times = self.process.cpu_times()
+        return times.user + times.system
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+                self._cpu_end = self._cpu_seconds()
+            except psutil.Error:
+                # Процесс сборщика уже завершился — используем последние показания
+                return
+
+    def start(self):
+        self._cpu_start = self._cpu_end = self._cpu_seconds()
+        self._started_at = time.monotonic()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        try:
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+            self._cpu_end = self._cpu_seconds()
+        except psutil.Error:
+            pass
+        self._stopped_at = time.monotonic()
+        self._stop.set()
+        self._thread.join()
+
+    def stats(self):
+        elapsed = self._stopped_at - self._started_at
+        return {
+            "cpu_percent": 100 * (self._cpu_end - self._cpu_start) / elapsed if elapsed > 0 else 0.0,
+            "rss_delta_mb": (self.peak_rss - self.baseline_rss) / (1024 * 1024),
+            "rss_peak_mb": self.peak_rss / (1024 * 1024),
+        }
+
+
+def _latency(timestamp):
+    """
+    Задержка доставки отсчёта: от его времени (ISO или мкс от эпохи) до текущего момента, с.
+    """
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp).timestamp()
+    else:
+        timestamp = timestamp / 1_000_000
+    return time.time() - timestamp
+
+
+def _run_thread(db_name, rate, duration, probes):
+    """
+    Прогон backend'а thread: потребитель забирает отсчёты из queue.Queue в отдельном потоке.
+    """
+    samples = queue.Queue()
+    cycles, latencies = [], []
+
+    def consume():
+        while True:
+            data = samples.get()
+            if data is None:
+                return
+            latencies.append(_latency(data["timestamp"]))
+            cycles.append(data["cycle_time"])
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    backend = ThreadBackend(db_name, rate=rate, probes=probes, verbose=False)
+    monitor = ResourceMonitor(os.getpid()).start()
+    backend.start(samples.put)
+    time.sleep(duration)
+    backend.stop()
+    monitor.stop()
+    samples.put(None)
+    consumer.join()
+    return backend.result, monitor.stats(), cycles, latencies
+
+
+def _run_process(db_name, rate, duration, probes):
+    """
+    Прогон backend'а process: потребитель читает кольцевой буфер в разделяемой памяти.
+    """
+    ring = SharedRingBuffer.create(capacity=RING_CAPACITY)
+    cycles, latencies = [], []
+    lost = 0
+    last_seq = 0
+
+    def drain():
+        nonlocal last_seq, lost
+        segments, last_seq, skipped = ring.read_since(last_seq)
+        lost += skipped
+        for segment in segments:
+            for record in segment:
+                latencies.append(_latency(int(record["timestamp"])))
+                cycles.append(float(record["cycle_time"]))
+
+    backend = ProcessBackend(db_name, rate=rate, ring_name=ring.name, probes=probes, verbose=False)
+    try:
+        backend.start()
+        monitor = ResourceMonitor(backend.pid).start()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            time.sleep(RING_POLL_INTERVAL)
+            drain()
+        monitor.stop()
+        backend.stop()
+        drain()
+    finally:
+        ring.close()
+        ring.unlink()
+    result = backend.result or {}
+    result["lost"] = lost
+    return result, monitor.stats(), cycles, latencies
+
+
+def _run_asyncio(db_name, rate, duration, probes):
+    """
+    Прогон backend'а asyncio: потребитель — задача, читающая asyncio.Queue в том же цикле событий.
+    """
+    cycles, latencies = [], []
+
+    async def main():
+        samples = asyncio.Queue()
+
+        async def consume():
+            while True:
+                data = await samples.get()
+                latencies.append(_latency(data["timestamp"]))
+                cycles.append(data["cycle_time"])
+
+        consumer = asyncio.create_task(consume())
+        backend = AsyncioBackend(db_name, rate=rate, probes=probes, verbose=False)
+        monitor = ResourceMonitor(os.getpid()).start()
+        backend.start(samples.put)
+        await asyncio.sleep(duration)
+        # Останавливаем без отмены задачи, чтобы получить её статистику
+        backend.stop_event.set()
+        result = await backend.task
+        monitor.stop()
+        while not samples.empty():
+            await asyncio.sleep(0)
+        consumer.cancel()
+        return result, monitor.stats()
+
+    result, resources = asyncio.run(main())
+    return result, resources, cycles, latencies
+
+
+# Функции прогона для каждого backend'а
+RUNNERS = {"thread": _run_thread, "process": _run_process, "asyncio": _run_asyncio}
+
+
+def _percentile_ms(values, q):
+    return float(np.percentile(values, q) * 1000) if values else 0.0
+
+
+def run_case(backend, rate, duration, probes, workdir):
+    """
+    Выполняет один прогон backend'а и собирает метрики.
+
+    Аргументы:
+        backend (str): thread, process или asyncio.
+        rate (float): Частота опроса в Гц.
+        duration (float): Длительность прогона в секундах.
+        probes (MockProbes | SystemProbes): Опросы системы.
+        workdir (str): Папка для временных баз данных.
+
+    Возвращает:
+        dict: Метрики прогона.
+    """
+    db_name = os.path.join(workdir, f"{backend}-{rate:g}-{duration:g}.db")
+    started = time.monotonic()
+    result, resources, cycles, latencies = RUNNERS[backend](db_name, rate, duration, probes)
+    wall = time.monotonic() - started
+    writer = result.get("writer", {})
+    scheduler = result.get("scheduler", {})
+    rows = writer.get("rows_written", 0)
+    commits = writer.get("commits", 0)
+    flush = writer.get("avg_flush_time", 0.0)
+    return {
+        "backend": backend,
+        "rate": rate,
+        "duration": duration,
+        "wall_time": wall,
+        "samples": len(cycles),
+        "samples_per_sec": len(cycles) / duration,
+        "missed": scheduler.get("missed", 0),
+        "lost": result.get("lost", 0),
+        "jitter_p99_ms": scheduler.get("jitter_p99", 0.0) * 1000,
+        "cycle_p50_ms": _percentile_ms(cycles, 50),
+        "cycle_p99_ms": _percentile_ms(cycles, 99),
+        **resources,
+        "db_rows": rows,
+        "db_commits": commits,
+        "db_flush_ms": flush * 1000,
+        "db_row_us": flush * commits / rows * 1_000_000 if rows else 0.0,
+        "queue_p50_ms": _percentile_ms(latencies, 50),
+        "queue_p99_ms": _percentile_ms(latencies, 99),
+    }
+
+
+def format_table(results):
+    """
+    Формирует итоговую таблицу результатов для вывода в консоль.
+    """
+    header = [title for title, _, _ in TABLE_COLUMNS]
+    rows = [[fmt.format(result[key]) for _, key, fmt in TABLE_COLUMNS] for result in results]
+    widths = [max(len(cell) for cell in column) for column in zip(header, *rows)]
+    lines = ["  ".join(cell.rjust(width) for cell, width in zip(line, widths)) for line in [header, *rows]]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
+
+
+def environment():
+    """
+    Сведения о машине и версиях, сохраняемые вместе с результатами.
+    """
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "memory_mb": psutil.virtual_memory().total // (1024 * 1024),
+        "psutil": psutil.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def _list(cast):
+    return lambda value: [cast(item) for item in value.split(",") if item]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmark",
+        description="Сравнение backend'ов сборщика данных о производительности.",
+    )
+    parser.add_argument("--backends", type=_list(str), default=list(RUNNERS), help="список через запятую")
+    parser.add_argument("--rates", type=_list(float), default=[1.0, 10.0], help="частоты опроса в Гц через запятую")
+    parser.add_argument("--durations", type=_list(float), default=[5.0], help="длительности прогонов в секундах через запятую")
+    parser.add_argument("--repeat", type=int, default=1, help="количество повторов каждого прогона")
+    parser.add_argument(
+        "--probes",
+        choices=("mock", "system", "extended"),
+        default="mock",
+        help="опросы системы: имитация, настоящие или настоящие с дополнительными метриками",
+    )
+    parser.add_argument("--probe-cost", type=float, default=0.0005, help="длительность имитируемого опроса в секундах")
+    parser.add_argument("--gpus", type=int, default=1, help="количество имитируемых GPU")
+    parser.add_argument("--seed", type=int, default=0, help="seed имитируемых значений")
+    parser.add_argument("--output", default="benchmark.json", help="файл с результатами в формате JSON")
+    args = parser.parse_args(argv)
+    unknown = set(args.backends) - set(RUNNERS)
+    if unknown:
+        parser.error(f"неизвестные backend'ы: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.probes == "mock":
+        probes = MockProbes(cost=args.probe_cost, gpus=args.gpus, seed=args.seed)
+    else:
+        probes = SystemProbes(extended=args.probes == "extended")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="logger-bench-") as workdir:
+        for duration in args.durations:
+            for rate in args.rates:
+                for backend in args.backends:
+                    for _ in range(args.repeat):
+                        print(f"Прогон: {backend}, {rate:g} Гц, {duration:g} с")
+                        results.append(run_case(backend, rate, duration, probes, workdir))
+
+    report = {
+        "created": datetime.now().isoformat(),
+        "environment": environment(),
+        "config": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(format_table(results))
+    print(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
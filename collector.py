@@ -0,0 +1,844 @@
+"""
+Общее ядро сборщика данных о производительности и консольный запуск без GUI.
+
+Сбор данных (опрос CPU, RAM и GPU, запись в SQLite, такты по расписанию) реализован
+один раз и запускается одним из трёх способов (backend): в потоке, в отдельном процессе
+или в цикле событий asyncio. Приложения с PyQt5 используют эти же backend'ы, а на
+серверах без графики сборщик запускается из консоли:
+
+    python -m collector --backend thread --rate 1 --duration 60 --db collector.db
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import psutil
+
+from agent import SHIP_INTERVAL, Agent
+from alerts import AlertEngine, WebhookSink, parse_rule, parse_webhook_url
+from db_writer import BatchedDatabaseWriter
+from gpu_probe import detect_gpu_probe
+from instrumentation import SNAPSHOT_INTERVAL, CycleLog, StageTimings
+from profiling import PROFILE_DIR_ENV, PROFILE_ENV, CycleProfiler
+from retention import RAW_RETENTION_DAYS, Retention
+from scheduler import FixedRateScheduler
+from system_metrics import CPU_BUDGET, TOP_PROCESSES, ExtendedSampler
+
+
+# Максимальное число потоков для блокирующих вызовов psutil (asyncio)
+PROBE_WORKERS = 3
+
+# Максимальный размер очереди записей для базы данных (asyncio)
+DB_QUEUE_SIZE = 1000
+
+
+class SystemProbes:
+    """
+    Опросы системы: загрузка CPU, использование RAM и загрузка GPU, а при extended=True
+    ещё и дополнительные метрики (ядра CPU, диск, сеть, средняя загрузка, top-N процессов).
+
+    Объект передаётся в сборщик целиком, поэтому в тестах и бенчмарках его можно
+    заменить объектом с теми же методами. До вызова open() объект не хранит
+    состояния и может быть передан в другой процесс.
+
+    Атрибуты:
+        extended_enabled (bool): Собирать дополнительные метрики.
+        top_n (int): Количество сохраняемых процессов.
+        cpu_budget (float): Бюджет собственной загрузки CPU сборщиком, % одного ядра.
+    """
+
+    def __init__(self, extended=False, top_n=TOP_PROCESSES, cpu_budget=CPU_BUDGET):
+        self.extended_enabled = extended
+        self.top_n = top_n
+        self.cpu_budget = cpu_budget
+        self.gpu_probe = None
+        self.sampler = None
+
+    def open(self):
+        """
+        Запоминает начальные счётчики CPU и один раз определяет наличие GPU.
+        """
+        psutil.cpu_percent(interval=None)
+        self.gpu_probe = detect_gpu_probe()
+        if self.extended_enabled:
+            self.sampler = ExtendedSampler(self.top_n, self.cpu_budget).open()
+        return self
+
+    def cpu(self):
+        """
+        Загрузка CPU в процентах с момента предыдущего вызова (не блокирует).
+        """
+        return psutil.cpu_percent(interval=None)
+
+    def memory(self):
+        """
+        Использование оперативной памяти в процентах.
+        """
+        return psutil.virtual_memory().percent
+
+    def gpu(self):
+        """
+        Загрузка и память GPU из кэша опроса GPU (тройки название, загрузка, память)
+        либо "ГП не найден".
+        """
+        return self.gpu_probe.read()
+
+    def extended(self):
+        """
+        Дополнительные метрики такта (см. ExtendedSampler.sample) или None, если они выключены.
+        """
+        return self.sampler.sample() if self.sampler is not None else None
+
+    def stats(self):
+        """
+        Собственная стоимость сбора (см. ExtendedSampler.stats) или None.
+        """
+        return self.sampler.stats() if self.sampler is not None else None
+
+    def report(self):
+        return self.sampler.report() if self.sampler is not None else None
+
+    def close(self):
+        if self.gpu_probe is not None:
+            self.gpu_probe.close()
+
+
+def make_sample(cpu_usage, memory_usage, gpu_usage, cycle_time, jitter):
+    """
+    Формирует отсчёт, который передаётся в интерфейс.
+    """
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "cpu_usage": cpu_usage,
+        "memory_usage": memory_usage,
+        "gpu_usage": gpu_usage,
+        "cycle_time": cycle_time,
+        "jitter": jitter,
+    }
+
+
+def _summary(writer, scheduler, probes, alerts, timings, verbose):
+    if verbose:
+        print(writer.report())
+        print(scheduler.report())
+        print(timings.report())
+        if probes.report():
+            print(probes.report())
+        if alerts is not None:
+            print(alerts.report())
+    return {
+        "writer": writer.stats(),
+        "scheduler": scheduler.stats(),
+        "overhead": probes.stats(),
+        "alerts": alerts.stats() if alerts is not None else None,
+        "stages": timings.snapshot()["stages"],
+    }
+
+
+def run_collector(publish, db_name, stop_event, rate=1.0, probes=None, verbose=True, alerts=None, timings=None):
+    """
+    Синхронный цикл сбора данных (используется backend'ами thread и process).
+
+    Аргументы:
+        publish (callable | None): Функция, которой передаётся каждый отсчёт (например, queue.put).
+        db_name (str): Имя файла базы данных SQLite.
+        stop_event (threading.Event | multiprocessing.Event): Событие для остановки сбора.
+        rate (float): Частота опроса в Гц (от 0.1 до 10).
+        probes (SystemProbes): Опросы системы; по умолчанию — реальные.
+        verbose (bool): Печатать сводку циклов (не чаще раза в LOG_INTERVAL секунд) и итоговую статистику.
+        alerts (AlertEngine | None): Правила оповещений, проверяемые для каждого отсчёта.
+        timings (StageTimings | None): Гистограммы времени этапов цикла; по умолчанию — новые.
+
+    При LOGGER_PROFILE=1 (флаг --profile) цикл профилируется cProfile окнами по минуте
+    (см. profiling.CycleProfiler); без него цикл платит одну проверку.
+
+    Возвращает:
+        dict: Статистика писателя базы данных, планировщика и этапов цикла.
+    """
+    profiler = CycleProfiler.from_env(os.path.basename(db_name))
+    probes = (probes or SystemProbes()).open()
+    timings = (timings or StageTimings()).open()
+    record = timings.record
+    clock = time.perf_counter_ns
+    cycle_log = CycleLog(timings) if verbose else None
+    writer = BatchedDatabaseWriter(db_name).open()
+    if alerts is not None:
+        alerts.open(db_name)
+    # Дедлайны считаются от старта по монотонным часам, поэтому период не «плывёт»
+    scheduler = FixedRateScheduler(rate).start()
+    next_snapshot = time.monotonic() + SNAPSHOT_INTERVAL
+    if profiler is not None:
+        profiler.start()
+    try:
+        while scheduler.wait(stop_event):
+            # Метки времени этапов; в горячем цикле только perf_counter_ns и запись в гистограмму
+            t0 = clock()
+            cpu_usage = probes.cpu()
+            t1 = clock()
+            memory_usage = probes.memory()
+            t2 = clock()
+            gpu_usage = probes.gpu()
+            t3 = clock()
+
+            elapsed_time = (t3 - t0) / 1e9  # Время опроса CPU, RAM и GPU (как и раньше)
+
+            # Дополнительные метрики не входят во время цикла: их стоимость ограничивает бюджет CPU
+            extended = probes.extended()
+            t4 = clock()
+
+            data = make_sample(cpu_usage, memory_usage, gpu_usage, elapsed_time, scheduler.last_jitter)
+            if publish is not None:
+                publish(data)
+            t5 = clock()
+            if alerts is not None:
+                alerts.evaluate(data)
+            t6 = clock()
+
+            # Запись в буфер базы данных (сбрасывается пачками)
+            writer.write(
+                cpu_usage, memory_usage, gpu_usage, elapsed_time, timestamp=data["timestamp"], extended=extended
+            )
+            t7 = clock()
+
+            record("cpu", t1 - t0)
+            record("memory", t2 - t1)
+            record("gpu", t3 - t2)
+            if extended is not None:
+                record("extended", t4 - t3)
+            if publish is not None:
+                record("publish", t5 - t4)
+            if alerts is not None:
+                record("alerts", t6 - t5)
+            record("db_write", t7 - t6)
+            record("cycle", t7 - t0)
+
+            if cycle_log is not None:
+                cycle_log.log(data)
+            if time.monotonic() >= next_snapshot:
+                next_snapshot += SNAPSHOT_INTERVAL
+                writer.write_stage_timings(timings.rows())
+            if profiler is not None:
+                profiler.tick((t7 - t0) / 1e9)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            if verbose:
+                print(profiler.report())
+        # Сбрасываем оставшиеся записи при остановке
+        probes.close()
+        writer.write_stage_timings(timings.rows())
+        writer.close()
+        timings.close()
+        if alerts is not None:
+            alerts.close()
+    return _summary(writer, scheduler, probes, alerts, timings, verbose)
+
+
+def _write_rows(writer, rows, timings):
+    """
+    Передаёт пачку записей писателю базы данных (выполняется в потоке записи).
+    """
+    clock = time.perf_counter_ns
+    for cpu_usage, memory_usage, gpu_usage, elapsed_time, timestamp, extended in rows:
+        start = clock()
+        writer.write(cpu_usage, memory_usage, gpu_usage, elapsed_time, timestamp=timestamp, extended=extended)
+        timings.record("db_write", clock() - start)
+
+
+def _timed(timings, stage, probe):
+    """
+    Оборачивает опрос так, чтобы его время записывалось в том потоке пула, где он выполняется.
+    """
+    clock = time.perf_counter_ns
+
+    def call():
+        start = clock()
+        try:
+            return probe()
+        finally:
+            timings.record(stage, clock() - start)
+
+    return call
+
+
+async def database_consumer(db_queue, writer, executor, timings):
+    """
+    Забирает записи из асинхронной очереди и передаёт их писателю базы данных.
+
+    Все обращения к SQLite выполняются в однопоточном executor, поэтому соединение
+    всегда используется из одного и того же потока, а цикл событий не блокируется.
+    Значение None в очереди означает завершение работы.
+
+    Аргументы:
+        db_queue (asyncio.Queue): Очередь записей для базы данных.
+        writer (BatchedDatabaseWriter): Писатель базы данных.
+        executor (ThreadPoolExecutor): Однопоточный пул для операций с SQLite.
+        timings (StageTimings): Гистограммы этапов; время записи каждой строки — этап db_write.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    finished = False
+    while not finished:
+        batch = [await db_queue.get()]
+        # Забираем всё, что успело накопиться, чтобы передать в поток одним вызовом
+        while not db_queue.empty():
+            batch.append(db_queue.get_nowait())
+        if batch[-1] is None:
+            finished = True
+        rows = [row for row in batch if row is not None]
+        if rows:
+            await loop.run_in_executor(executor, _write_rows, writer, rows, timings)
+
+
+async def run_collector_async(
+    publish, db_name, stop_event, rate=1.0, probes=None, verbose=True, alerts=None, timings=None
+):
+    """
+    Асинхронный цикл сбора данных (backend asyncio).
+
+    Опросы CPU и RAM выполняются одновременно через asyncio.gather в ограниченном пуле
+    потоков, GPU читается из кэша, поэтому время цикла определяется самым медленным
+    опросом. Запись в базу выполняет отдельная задача-потребитель через
+    BatchedDatabaseWriter, так что цикл событий (в том числе цикл Qt через qasync)
+    не блокируется ни опросом, ни фиксацией транзакций.
+
+    Аргументы:
+        publish (callable | None): Функция или корутина, которой передаётся каждый
+            отсчёт (например, asyncio.Queue.put).
+        db_name (str): Имя файла базы данных SQLite.
+        stop_event (asyncio.Event): Событие для остановки сбора данных.
+        rate (float): Частота опроса в Гц (от 0.1 до 10).
+        probes (SystemProbes): Опросы системы; по умолчанию — реальные.
+        verbose (bool): Печатать сводку циклов (не чаще раза в LOG_INTERVAL секунд) и итоговую статистику.
+        alerts (AlertEngine | None): Правила оповещений, проверяемые для каждого отсчёта.
+        timings (StageTimings | None): Гистограммы времени этапов цикла; по умолчанию — новые.
+            Опросы CPU и RAM измеряются в потоках пула, запись в базу — в потоке записи,
+            этап publish — передача отсчёта интерфейсу вместе с постановкой в очередь базы.
+
+    При LOGGER_PROFILE=1 профилируется поток цикла событий (см. profiling.CycleProfiler).
+
+    Возвращает:
+        dict: Статистика писателя базы данных, планировщика и этапов цикла.
+    """
+    # asyncio и пулы потоков загружаются только backend'ом asyncio
+    import asyncio
+    import inspect
+    from concurrent.futures import ThreadPoolExecutor
+
+    loop = asyncio.get_running_loop()
+    profiler = CycleProfiler.from_env(os.path.basename(db_name))
+    probe_executor = ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="probe")
+    db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+    writer = BatchedDatabaseWriter(db_name)
+    await loop.run_in_executor(db_executor, writer.open)
+    # Обнаружение GPU запускает nvidia-smi, поэтому тоже выполняется в пуле потоков
+    probes = await loop.run_in_executor(probe_executor, (probes or SystemProbes()).open)
+    timings = (timings or StageTimings()).open()
+    record = timings.record
+    clock = time.perf_counter_ns
+    probe_cpu = _timed(timings, "cpu", probes.cpu)
+    probe_memory = _timed(timings, "memory", probes.memory)
+    cycle_log = CycleLog(timings) if verbose else None
+    if alerts is not None:
+        # База уже открыта писателем, поэтому таблица alerts существует
+        alerts.open(db_name)
+
+    db_queue = asyncio.Queue(maxsize=DB_QUEUE_SIZE)
+    consumer_task = asyncio.create_task(database_consumer(db_queue, writer, db_executor, timings))
+    scheduler = FixedRateScheduler(rate).start()
+    next_snapshot = time.monotonic() + SNAPSHOT_INTERVAL
+    if profiler is not None:
+        profiler.start()
+    try:
+        while await scheduler.wait_async(stop_event):
+            t0 = clock()
+            cpu_usage, memory_usage = await asyncio.gather(
+                loop.run_in_executor(probe_executor, probe_cpu),
+                loop.run_in_executor(probe_executor, probe_memory),
+            )
+            t1 = clock()
+            gpu_usage = probes.gpu()
+            t2 = clock()
+
+            elapsed_time = (t2 - t0) / 1e9  # Время опроса CPU, RAM и GPU (как и раньше)
+
+            # Перебор процессов блокирующий, поэтому дополнительные метрики — тоже в пуле потоков
+            extended = await loop.run_in_executor(probe_executor, probes.extended)
+            t3 = clock()
+
+            # Отклонение от расписания здесь — это задержка цикла событий
+            data = make_sample(cpu_usage, memory_usage, gpu_usage, elapsed_time, scheduler.last_jitter)
+            if publish is not None:
+                result = publish(data)
+                if inspect.isawaitable(result):
+                    await result
+            t4 = clock()
+            if alerts is not None:
+                alerts.evaluate(data)
+            t5 = clock()
+            await db_queue.put((cpu_usage, memory_usage, gpu_usage, elapsed_time, data["timestamp"], extended))
+            t6 = clock()
+
+            record("gpu", t2 - t1)
+            if extended is not None:
+                record("extended", t3 - t2)
+            record("publish", (t4 - t3) + (t6 - t5))
+            if alerts is not None:
+                record("alerts", t5 - t4)
+            record("cycle", t6 - t0)
+
+            if cycle_log is not None:
+                cycle_log.log(data)
+            if time.monotonic() >= next_snapshot:
+                next_snapshot += SNAPSHOT_INTERVAL
+                await loop.run_in_executor(db_executor, writer.write_stage_timings, timings.rows())
+            if profiler is not None:
+                profiler.tick((t6 - t0) / 1e9)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            if verbose:
+                print(profiler.report())
+        # Задача может быть отменена — оставшиеся записи всё равно сбрасываются в базу
+        await db_queue.put(None)
+        await consumer_task
+        await loop.run_in_executor(db_executor, writer.write_stage_timings, timings.rows())
+        await loop.run_in_executor(db_executor, writer.close)
+        probes.close()
+        timings.close()
+        if alerts is not None:
+            await loop.run_in_executor(None, alerts.close)
+        db_executor.shutdown(wait=False)
+        probe_executor.shutdown(wait=False)
+    return _summary(writer, scheduler, probes, alerts, timings, verbose)
+
+
+def _process_main(ring_name, db_name, stop_event, rate, probes, verbose, alerts, timings, results):
+    """
+    Точка входа процесса сбора данных: отсчёты передаются через кольцевой буфер,
+    статистика работы после остановки — через очередь results.
+    """
+    # Кольцевой буфер (numpy, shared_memory) нужен только процессу сбора backend'а process
+    from shm_ring import SharedRingBuffer
+
+    ring = SharedRingBuffer.attach(ring_name) if ring_name else None
+
+    def publish(data):
+        gpu_usage = data["gpu_usage"]
+        gpu_loads = [item[1] for item in gpu_usage] if isinstance(gpu_usage, list) else []
+        # Запись отсчёта в кольцевой буфер (без pickle, старые отсчёты перезаписываются)
+        ring.push(data["cpu_usage"], data["memory_usage"], gpu_loads, data["cycle_time"])
+
+    try:
+        results.put(
+            run_collector(publish if ring else None, db_name, stop_event, rate, probes, verbose, alerts, timings)
+        )
+    finally:
+        if ring is not None:
+            ring.close()
+
+
+class ThreadBackend:
+    """
+    Сбор данных в фоновом потоке; отсчёты передаются функции publish (например, queue.Queue.put).
+
+    Атрибуты:
+        db_name (str): Имя файла базы данных SQLite.
+        rate (float): Частота опроса в Гц.
+        probes (SystemProbes): Опросы системы.
+        verbose (bool): Печатать сводку циклов и итоговую статистику.
+        alerts (AlertEngine | None): Правила оповещений.
+        timings (StageTimings): Гистограммы этапов цикла; интерфейс добавляет в них этап gui_update.
+    """
+
+    name = "thread"
+
+    def __init__(self, db_name, rate=1.0, probes=None, verbose=True, alerts=None, timings=None):
+        self.db_name = db_name
+        self.rate = rate
+        self.probes = probes
+        self.verbose = verbose
+        self.alerts = alerts
+        self.timings = timings if timings is not None else StageTimings()
+        self.stop_event = threading.Event()
+        self.result = None
+        self._thread = None
+
+    def _target(self, publish):
+        self.result = run_collector(
+            publish, self.db_name, self.stop_event, self.rate, self.probes, self.verbose, self.alerts, self.timings
+        )
+
+    def start(self, publish=None):
+        if self.is_running():
+            return
+        self.stop_event.clear()
+        self._thread = threading.Thread(target=self._target, args=(publish,), name="collector")
+        self._thread.start()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        if self.is_running():
+            self.stop_event.set()
+            self._thread.join()
+        self._thread = None
+
+    def run_for(self, duration, started=None):
+        """
+        Собирает данные duration секунд (None — до Ctrl+C) и останавливается.
+        Функция started (если задана) вызывается сразу после запуска сбора.
+        """
+        self.start()
+        if started is not None:
+            started()
+        try:
+            self._thread.join(duration)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+        return self.result
+
+
+class ProcessBackend:
+    """
+    Сбор данных в отдельном процессе; отсчёты передаются через кольцевой буфер
+    в разделяемой памяти (SharedRingBuffer), имя которого задаётся ring_name.
+
+    Атрибуты:
+        db_name (str): Имя файла базы данных SQLite.
+        rate (float): Частота опроса в Гц.
+        ring_name (str | None): Имя сегмента кольцевого буфера; None — без передачи отсчётов.
+        probes (SystemProbes): Опросы системы (должны передаваться в другой процесс).
+        verbose (bool): Печатать сводку циклов и итоговую статистику.
+        alerts (AlertEngine | None): Правила оповещений (проверяются в процессе сбора).
+        timings (StageTimings): Гистограммы этапов цикла. В процесс сбора передаётся копия:
+            этапы сбора накапливаются и экспортируются там, а gui_update записывается
+            в этот объект в процессе интерфейса.
+    """
+
+    name = "process"
+
+    def __init__(self, db_name, rate=1.0, ring_name=None, probes=None, verbose=True, alerts=None, timings=None):
+        self.db_name = db_name
+        self.rate = rate
+        self.ring_name = ring_name
+        self.probes = probes
+        self.verbose = verbose
+        self.alerts = alerts
+        self.timings = timings if timings is not None else StageTimings()
+        self.stop_event = multiprocessing.Event()
+        self.result = None
+        self._results = multiprocessing.Queue()
+        self._process = None
+
+    @property
+    def pid(self):
+        """
+        Идентификатор процесса сбора данных (None, если он не запущен).
+        """
+        return self._process.pid if self._process is not None else None
+
+    def start(self):
+        if self.is_running():
+            return
+        self.stop_event.clear()
+        self.result = None
+        self._process = multiprocessing.Process(
+            target=_process_main,
+            args=(
+                self.ring_name,
+                self.db_name,
+                self.stop_event,
+                self.rate,
+                self.probes,
+                self.verbose,
+                self.alerts,
+                self.timings,
+                self._results,
+            ),
+            name="collector",
+        )
+        self._process.start()
+
+    def is_running(self):
+        return self._process is not None and self._process.is_alive()
+
+    def stop(self, timeout=5):
+        if self.is_running():
+            # Сначала просим процесс завершиться сам, чтобы он успел сбросить буфер в базу
+            self.stop_event.set()
+            try:
+                # Статистику забираем до join, иначе процесс может ждать опустошения очереди
+                self.result = self._results.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            self._process.join(timeout=timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+        self._process = None
+
+    def run_for(self, duration, started=None):
+        """
+        Собирает данные duration секунд (None — до Ctrl+C) и останавливается.
+        Функция started (если задана) вызывается сразу после запуска сбора.
+        """
+        self.start()
+        if started is not None:
+            started()
+        try:
+            self._process.join(duration)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+        return self.result
+
+
+class AsyncioBackend:
+    """
+    Сбор данных задачей в текущем цикле событий asyncio (в GUI — цикл qasync).
+
+    Атрибуты:
+        db_name (str): Имя файла базы данных SQLite.
+        rate (float): Частота опроса в Гц.
+        probes (SystemProbes): Опросы системы.
+        verbose (bool): Печатать сводку циклов и итоговую статистику.
+        alerts (AlertEngine | None): Правила оповещений.
+        timings (StageTimings): Гистограммы этапов цикла; интерфейс добавляет в них этап gui_update.
+    """
+
+    name = "asyncio"
+
+    def __init__(self, db_name, rate=1.0, probes=None, verbose=True, alerts=None, timings=None):
+        self.db_name = db_name
+        self.rate = rate
+        self.probes = probes
+        self.verbose = verbose
+        self.alerts = alerts
+        self.timings = timings if timings is not None else StageTimings()
+        self.stop_event = None
+        self.task = None
+        self.result = None
+
+    def start(self, publish=None):
+        """
+        Создаёт задачу сбора данных; вызывается из работающего цикла событий.
+        """
+        import asyncio
+
+        if self.is_running():
+            return
+        self.stop_event = asyncio.Event()
+        self.task = asyncio.create_task(
+            run_collector_async(
+                publish,
+                self.db_name,
+                self.stop_event,
+                self.rate,
+                self.probes,
+                self.verbose,
+                self.alerts,
+                self.timings,
+            )
+        )
+
+    def is_running(self):
+        return self.task is not None and not self.task.done()
+
+    def stop(self, timeout=5):
+        """
+        Просит задачу сбора завершиться и ждёт её не дольше timeout секунд; задача отменяется,
+        только если за это время не завершилась сама (иначе она успевает сбросить буфер в базу).
+
+        Вызывается из работающего цикла событий (обработчик кнопки GUI), поэтому ожидание
+        идёт отдельной задачей, которая и возвращается (None, если сбор не запущен);
+        итоговая статистика сбора сохраняется в result.
+        """
+        import asyncio
+
+        if not self.is_running():
+            return None
+        self.stop_event.set()
+        return asyncio.ensure_future(self._finish(self.task, timeout))
+
+    async def _finish(self, task, timeout):
+        import asyncio
+
+        try:
+            self.result = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            task.cancel()
+            try:
+                self.result = await task
+            except asyncio.CancelledError:
+                pass
+        except Exception as e:
+            # Задачу сбора никто больше не ждёт — иначе ошибка пропала бы молча
+            print(f"Сбор данных завершился с ошибкой: {e!r}")
+        return self.result
+
+    def run_for(self, duration, started=None):
+        """
+        Запускает собственный цикл событий на duration секунд (None — до Ctrl+C).
+        Функция started (если задана) вызывается сразу после создания задачи сбора.
+        """
+        import asyncio
+
+        async def main():
+            self.stop_event = asyncio.Event()
+            task = asyncio.create_task(
+                run_collector_async(
+                    None,
+                    self.db_name,
+                    self.stop_event,
+                    self.rate,
+                    self.probes,
+                    self.verbose,
+                    self.alerts,
+                    self.timings,
+                )
+            )
+            if started is not None:
+                started()
+            try:
+                await asyncio.wait_for(asyncio.shield(task), duration)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.stop_event.set()
+            self.result = await task
+            return self.result
+
+        try:
+            return asyncio.run(main())
+        except KeyboardInterrupt:
+            return None
+
+
+# Доступные способы запуска сборщика
+BACKENDS = {backend.name: backend for backend in (ThreadBackend, ProcessBackend, AsyncioBackend)}
+
+
+def create_backend(name, db_name, rate=1.0, probes=None, verbose=True, alerts=None, timings=None):
+    """
+    Создаёт backend сборщика по имени (thread, process или asyncio).
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный backend: {name}, доступны: {', '.join(BACKENDS)}")
+    return BACKENDS[name](db_name, rate=rate, probes=probes, verbose=verbose, alerts=alerts, timings=timings)
+
+
+def parse_args(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m collector",
+        description="Сбор данных о производительности системы в SQLite без графического интерфейса.",
+    )
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="thread", help="способ запуска сборщика")
+    parser.add_argument("--rate", type=float, default=1.0, help="частота опроса в Гц (от 0.1 до 10)")
+    parser.add_argument("--duration", type=float, default=None, help="длительность сбора в секундах (по умолчанию — до Ctrl+C)")
+    parser.add_argument("--db", default="collector.db", help="файл базы данных SQLite")
+    parser.add_argument("--quiet", action="store_true", help="не печатать сводку циклов и итоговую статистику")
+    parser.add_argument(
+        "--extended",
+        action="store_true",
+        help="собирать загрузку ядер CPU, диск, сеть, среднюю загрузку и самые загруженные процессы",
+    )
+    parser.add_argument("--top-n", type=int, default=TOP_PROCESSES, help="количество сохраняемых процессов")
+    parser.add_argument("--cpu-budget", type=float, default=CPU_BUDGET, help="бюджет загрузки CPU сборщиком, %% одного ядра")
+    parser.add_argument("--ship-to", metavar="URL", help="отправлять отсчёты на сервер (например, http://127.0.0.1:5000)")
+    parser.add_argument("--host", help="имя хоста на сервере (по умолчанию — имя машины)")
+    parser.add_argument("--ship-interval", type=float, default=SHIP_INTERVAL, help="период отправки на сервер в секундах")
+    parser.add_argument(
+        "--raw-days",
+        type=float,
+        default=RAW_RETENTION_DAYS,
+        help="срок хранения исходных отсчётов в днях, старые сворачиваются в агрегаты (0 — хранить всё)",
+    )
+    parser.add_argument(
+        "--alert",
+        action="append",
+        type=parse_rule,
+        default=[],
+        metavar="RULE",
+        help="правило оповещения, например 'cpu>90', 'memory>85 for 30', 'cycle_time z>4' (можно несколько)",
+    )
+    parser.add_argument(
+        "--alert-webhook",
+        type=parse_webhook_url,
+        metavar="URL",
+        help="отправлять оповещения POST-запросом с JSON на URL (http или https)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=f"профилировать цикл сбора cProfile (как {PROFILE_ENV}=1), профили — в папку --profile-dir",
+    )
+    parser.add_argument("--profile-dir", help=f"папка для профилей (как {PROFILE_DIR_ENV}, по умолчанию profiles)")
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        help="отдавать время этапов цикла на 127.0.0.1:PORT (/metrics — Prometheus, /metrics.json — JSON)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Консольный запуск сборщика без PyQt5.
+    """
+    args = parse_args(argv)
+    # Флаги передаются через окружение, поэтому доходят и до процесса сбора backend'а process
+    if args.profile:
+        os.environ[PROFILE_ENV] = "1"
+    if args.profile_dir:
+        os.environ[PROFILE_DIR_ENV] = args.profile_dir
+    probes = SystemProbes(extended=args.extended, top_n=args.top_n, cpu_budget=args.cpu_budget)
+    sinks = [WebhookSink(args.alert_webhook)] if args.alert_webhook else []
+    alerts = AlertEngine(args.alert, sinks=sinks) if args.alert else None
+    timings = StageTimings(port=args.metrics_port)
+    backend = create_backend(
+        args.backend, args.db, rate=args.rate, probes=probes, verbose=not args.quiet, alerts=alerts, timings=timings
+    )
+    print(f"Сбор данных: backend {args.backend}, {args.rate} Гц, база {args.db}")
+    if args.metrics_port is not None:
+        print(f"Метрики сборщика: http://127.0.0.1:{args.metrics_port}/metrics")
+    agent = retention = None
+
+    def start_services():
+        # Фоновые службы запускаются после старта сбора: первый отсчёт их не ждёт, а процесс сбора
+        # backend'а process создаётся (fork) до появления их потоков и соединений SQLite
+        nonlocal agent, retention
+        # Агент читает локальную базу и отправляет новые отсчёты на сервер независимо от backend'а
+        if args.ship_to:
+            agent = Agent(args.db, args.ship_to, host=args.host, interval=args.ship_interval).start()
+        # Старые отсчёты удаляются в фоне, чтобы база не росла бесконечно
+        if args.raw_days > 0:
+            retention = Retention(args.db, raw_days=args.raw_days).start()
+
+    try:
+        backend.run_for(args.duration, started=start_services)
+    finally:
+        if retention is not None:
+            retention.stop()
+            if not args.quiet:
+                print(retention.report())
+        if agent is not None:
+            agent.stop()
+            print(agent.report())
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Для совместимости с Windows
+    main()
@@ -0,0 +1,80 @@
+# -*- mode: python ; coding: utf-8 -*-
+#
+# Облегчённая сборка консольного сборщика без интерфейса (python -m collector):
+#
+#     pyinstaller collector.spec
+#
+# В отличие от сборок приложений с интерфейсом, сюда не попадают Qt и Flask с шаблонами.
+# numpy остаётся: он нужен фоновому удалению старых отсчётов (retention), но загружается
+# только при первом удалении, а не при запуске. Сборка в папку (onedir) не распаковывает
+# архив во временную папку при каждом запуске, поэтому первый отсчёт появляется быстрее,
+# чем у сборки в один файл; UPX отключён, чтобы не тратить время на распаковку библиотек.
+
+# Модули, которые сборщику без интерфейса не нужны
+EXCLUDES = [
+    "PyQt5",
+    "qasync",
+    "flask",
+    "werkzeug",
+    "jinja2",
+    "plotly",
+    "GPUtil",
+    "tkinter",
+    "unittest",
+    "pydoc",
+    "doctest",
+    "lib2to3",
+    "setuptools",
+    "pkg_resources",
+    "distutils",
+    "IPython",
+    "matplotlib",
+]
+
+# Модули, импортируемые внутри функций (для backend'ов asyncio и process, отправки
+# на сервер и оповещений); PyInstaller находит их и так, список страхует от пропусков
+HIDDEN_IMPORTS = [
+    "asyncio",
+    "concurrent.futures",
+    "multiprocessing.shared_memory",
+    "urllib.request",
+    "http.server",
+    "tenacity",
+    "numpy",
+]
+
+a = Analysis(
+    ["collector.py"],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=HIDDEN_IMPORTS,
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=EXCLUDES,
+    noarchive=False,
+    optimize=1,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name="collector",
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=True,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    name="collector",
+)
@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from analytics import summary
+from archive import read_series
+from rollup_cache import file_state
+
+
+# Метрики, которые накладываются на общие графики сравнения
+COMPARE_METRICS = ("cpu", "memory", "gpu", "elapsed_time")
+
+# Максимальное количество сравниваемых файлов
+MAX_COMPARE_FILES = 8
+
+# Сколько сводок файлов хранится в памяти
+SUMMARY_CACHE_SIZE = 64
+
+# Интервал между отсчётами больше медианного во столько раз считается пропуском
+GAP_FACTOR = 2.0
+
+# Потоки загрузки: файлы читаются параллельно (SQLite и numpy отпускают GIL на больших операциях)
+_executor = ThreadPoolExecutor(max_workers=MAX_COMPARE_FILES, thread_name_prefix="compare")
+
+# Пул процессов для работы, которая упирается в GIL: сводки и построение агрегатов баз без кэша.
+# Создаётся при первом сравнении; spawn — чтобы не копировать потоки сервера через fork.
+_processes = None
+
+_summaries = OrderedDict()
+_summaries_lock = threading.Lock()
+
+
+def _process_pool():
+    global _processes
+    with _summaries_lock:
+        if _processes is None:
+            _processes = ProcessPoolExecutor(
+                max_workers=min(MAX_COMPARE_FILES, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _processes
+
+
+def summarize(db_path):
+    """
+    Считает сводку одной базы для таблицы сравнения.
+
+    Ряды читаются через archive.read_series: закрытые сегменты — из столбцового архива,
+    остальное — из SQLite.
+
+    Возвращает:
+        dict:
+            - start: время первого отсчёта в мкс (начало отсчёта относительного времени);
+            - samples, duration: количество отсчётов и длительность записи в секундах;
+            - cycle: сводка времени цикла в миллисекундах (среднее, p50, p95, p99 и др., см. analytics.summary);
+            - cpu: средняя загрузка CPU системы, %;
+            - collector_cpu: средняя загрузка CPU самим сборщиком, % (None, если база собрана без --extended);
+            - rate: фактическая частота опроса, Гц (по медианному интервалу);
+            - interval: сводка интервала между отсчётами в миллисекундах;
+            - gaps: количество интервалов длиннее GAP_FACTOR медианных.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        timestamps, cycle = read_series(conn, db_path, "elapsed_time")
+        _, cpu = read_series(conn, db_path, "cpu")
+        _, collector_cpu = read_series(conn, db_path, "collector_cpu")
+    finally:
+        conn.close()
+
+    intervals = np.diff(timestamps)
+    median = float(np.median(intervals)) if len(intervals) else 0.0
+    return {
+        "start": int(timestamps[0]) if len(timestamps) else 0,
+        "samples": len(timestamps),
+        "duration": float(timestamps[-1] - timestamps[0]) / 1e6 if len(timestamps) else 0.0,
+        "cycle": summary(cycle * 1000.0),
+        "cpu": float(np.nanmean(cpu)) if len(cpu) else None,
+        "collector_cpu": float(np.nanmean(collector_cpu)) if len(collector_cpu) else None,
+        "rate": 1e6 / median if median else None,
+        "interval": summary(intervals / 1000.0),
+        "gaps": int(np.count_nonzero(intervals > GAP_FACTOR * median)) if median else 0,
+    }
+
+
+def cached_summary(db_path):
+    """
+    Возвращает сводку базы из памяти или считает её.
+
+    Ключ — путь и версия файла вместе с журналом -wal (как у RollupCache): после
+    объединения новой загрузки или пачки агента сводка пересчитывается, даже если
+    строки ещё не перенесены из -wal в основной файл.
+    """
+    key = (os.path.abspath(db_path), *file_state(db_path))
+    with _summaries_lock:
+        summary = _summaries.get(key)
+        if summary is not None:
+            _summaries.move_to_end(key)
+            return summary
+    summary = _process_pool().submit(summarize, db_path).result()
+    with _summaries_lock:
+        _summaries[key] = summary
+        while len(_summaries) > SUMMARY_CACHE_SIZE:
+            _summaries.popitem(last=False)
+    return summary
+
+
+def summaries(db_paths):
+    """
+    Сводки нескольких баз, посчитанные параллельно в пуле процессов: общее время
+    примерно равно времени самой большой базы, а не сумме.
+    """
+    return list(_executor.map(cached_summary, db_paths))
+
+
+def prepare_rollups(cache, db_paths):
+    """
+    Строит недостающие агрегаты баз в RollupCache параллельно в пуле процессов;
+    базы, для которых кэш уже есть (хотя бы предыдущей версии), не ждут пересборки
+    (см. RollupCache.current).
+    """
+    list(_executor.map(lambda db_path: cache.current(db_path, executor=_process_pool()), db_paths))
+
+
+def relative_series(db_paths, load):
+    """
+    Загружает ряды нескольких баз параллельно и переводит их в относительное время.
+
+    Аргументы:
+        db_paths (list): Пути к базам.
+        load (callable): load(db_path) -> кортеж, первый элемент которого — время в мкс
+            (например, (x, y) ряда из кэша агрегатов или из архива и базы, уже прореженного).
+
+    Возвращает:
+        list: Для каждой базы результат load, в котором время заменено на секунды
+            от первого отсчёта этой базы.
+    """
+
+    def load_relative(db_path):
+        start = cached_summary(db_path)["start"]
+        x, *rest = load(db_path)
+        # Корзина агрегатов может начинаться раньше первого отсчёта — прижимаем к нулю
+        return (np.maximum(np.asarray(x, dtype=np.float64) - start, 0) / 1e6, *rest)
+
+    return list(_executor.map(load_relative, db_paths))
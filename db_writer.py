@@ -0,0 +1,273 @@
+import sqlite3
+import time
+
+from schema import GpuNameCache, ensure_schema, last_sample_id, parse_gpu_usage, to_epoch_us
+
+
+# Сколько секунд соединение ждёт освобождения базы (например, пока retention удаляет пачку отсчётов)
+BUSY_TIMEOUT = 30.0
+
+# Сколько отсчётов хранится в буфере, пока база недоступна; самые старые сверх этого отбрасываются
+MAX_PENDING = 10000
+
+
+class BatchedDatabaseWriter:
+    """
+    Долгоживущий писатель в базу данных SQLite.
+
+    Держит одно открытое соединение в режиме WAL, накапливает записи в буфере
+    и сбрасывает их одной транзакцией через executemany, когда набирается
+    batch_size строк или с момента последнего сброса прошло flush_interval секунд.
+    При закрытии оставшиеся строки обязательно записываются.
+
+    Если база занята дольше busy_timeout секунд (sqlite3.OperationalError), сброс не прерывает
+    сбор: строки остаются в буфере до следующего сброса, но не больше max_pending отсчётов
+    (самые старые отбрасываются), а неудача учитывается в статистике.
+
+    Данные пишутся в текущую схему (см. schema.py): время — целое число микросекунд,
+    загрузка каждого GPU — отдельная строка gpu_samples, дополнительные метрики
+    (если переданы) — строки cpu_cores, system_samples и process_samples. Идентификаторы строк
+    назначает сам писатель, поэтому на одну базу должен приходиться один писатель.
+
+    Соединение SQLite привязано к потоку, поэтому писатель нужно создавать
+    и использовать в том же потоке (процессе), где идёт сбор данных.
+
+    Атрибуты:
+        db_name (str): Имя файла базы данных SQLite.
+        batch_size (int): Количество строк, при котором буфер сбрасывается.
+        flush_interval (float): Максимальное время (сек.) хранения строк в буфере.
+        busy_timeout (float): Сколько секунд ждать, пока база занята другим соединением.
+        max_pending (int): Сколько отсчётов хранить в буфере, пока база недоступна.
+    """
+
+    INSERT_SQL = (
+        "INSERT INTO performance (id, timestamp, cpu_usage, memory_usage, elapsed_time) VALUES (?, ?, ?, ?, ?)"
+    )
+    INSERT_GPU_SQL = "INSERT INTO gpu_samples (sample_id, gpu_index, name_id, load, mem) VALUES (?, ?, ?, ?, ?)"
+    INSERT_CORES_SQL = "INSERT INTO cpu_cores (sample_id, core, usage) VALUES (?, ?, ?)"
+    INSERT_SYSTEM_SQL = (
+        "INSERT INTO system_samples (sample_id, disk_read, disk_write, net_sent, net_recv, "
+        "load1, load5, load15, collector_cpu) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    INSERT_PROCESS_SQL = (
+        "INSERT INTO process_samples (sample_id, rank, pid, name, cpu, rss, io_read, io_write) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    INSERT_STAGES_SQL = (
+        "INSERT OR REPLACE INTO stage_timings (stage, timestamp, count, mean, p50, p90, p99, max) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+
+    def __init__(self, db_name, batch_size=50, flush_interval=5.0, busy_timeout=BUSY_TIMEOUT, max_pending=MAX_PENDING):
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.busy_timeout = busy_timeout
+        self.max_pending = max_pending
+
+        self._conn = None
+        self._buffer = []
+        self._gpu_buffer = []
+        self._cores_buffer = []
+        self._system_buffer = []
+        self._process_buffer = []
+        self._names = None
+        self._next_id = 1
+        self._last_flush = time.monotonic()
+        # Последний сброс не удался: следующий — не раньше чем через flush_interval, а не на каждой записи
+        self._retry_pending = False
+
+        # Статистика для оценки пропускной способности
+        self._opened_at = None
+        self._rows_written = 0
+        self._commits = 0
+        self._flush_seconds = 0.0
+        self._failed_flushes = 0
+        self._dropped = 0
+
+    def open(self):
+        """
+        Создает таблицы (или обновляет базу v1), открывает соединение и включает режим WAL.
+        """
+        if self._conn is not None:
+            return self
+        ensure_schema(self.db_name)
+        self._conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # В режиме WAL synchronous=NORMAL безопасен и не делает fsync на каждый commit
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.commit()
+        # id продолжают последний записанный, даже если retention уже удалил все отсчёты
+        self._next_id = last_sample_id(self._conn) + 1
+        self._opened_at = time.monotonic()
+        self._last_flush = self._opened_at
+        return self
+
+    def write(self, cpu_usage, memory_usage, gpu_usage, elapsed_time, timestamp=None, extended=None):
+        """
+        Добавляет одну запись в буфер и при необходимости сбрасывает буфер в базу.
+
+        Аргументы:
+            cpu_usage (float): Загрузка процессора в процентах.
+            memory_usage (float): Использование оперативной памяти в процентах.
+            gpu_usage (list | str): Список пар (название, загрузка) или троек
+                (название, загрузка, память) либо "ГП не найден".
+            elapsed_time (float): Время выполнения цикла в секундах.
+            timestamp (int | str | datetime): Временная метка (микросекунды от начала
+                эпохи, строка ISO или datetime). По умолчанию — текущее время.
+            extended (dict | None): Дополнительные метрики от ExtendedSampler.sample()
+                (ядра CPU, диск, сеть, средняя загрузка, top-N процессов).
+        """
+        if self._conn is None:
+            self.open()
+        timestamp = time.time_ns() // 1000 if timestamp is None else to_epoch_us(timestamp)
+        sample_id = self._next_id
+        self._next_id += 1
+        self._buffer.append((sample_id, timestamp, cpu_usage, memory_usage, elapsed_time))
+        for gpu_index, (name, load, mem) in enumerate(parse_gpu_usage(gpu_usage)):
+            # Название заменяется идентификатором при сбросе, в той же транзакции, что и сами строки
+            self._gpu_buffer.append((sample_id, gpu_index, name, load, mem))
+        if extended is not None:
+            self._cores_buffer.extend((sample_id, core, usage) for core, usage in enumerate(extended["cores"]))
+            self._system_buffer.append((sample_id, *extended["system"]))
+            self._process_buffer.extend(
+                (sample_id, rank, *process) for rank, process in enumerate(extended["processes"])
+            )
+
+        if self._retry_pending:
+            self._trim_buffers()
+        full = len(self._buffer) >= self.batch_size and not self._retry_pending
+        if full or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Записывает все накопленные строки одной транзакцией.
+
+        Возвращает:
+            bool: True, если буфер записан (или был пуст); False, если база занята
+                  и строки остались в буфере до следующего сброса.
+        """
+        self._last_flush = time.monotonic()
+        if not self._buffer or self._conn is None:
+            return True
+        start = time.perf_counter()
+        try:
+            with self._conn:
+                self._conn.executemany(self.INSERT_SQL, self._buffer)
+                if self._gpu_buffer:
+                    if self._names is None:
+                        self._names = GpuNameCache(self._conn)
+                    gpu_rows = [
+                        (sample_id, gpu_index, self._names.get(name), load, mem)
+                        for sample_id, gpu_index, name, load, mem in self._gpu_buffer
+                    ]
+                    self._conn.executemany(self.INSERT_GPU_SQL, gpu_rows)
+                if self._system_buffer:
+                    self._conn.executemany(self.INSERT_CORES_SQL, self._cores_buffer)
+                    self._conn.executemany(self.INSERT_SYSTEM_SQL, self._system_buffer)
+                    self._conn.executemany(self.INSERT_PROCESS_SQL, self._process_buffer)
+        except sqlite3.OperationalError as e:
+            # Транзакция откатилась целиком — повторим её при следующем сбросе
+            self._failed_flushes += 1
+            self._retry_pending = True
+            # Новые названия GPU откатились вместе с транзакцией — кэш перечитается при следующем сбросе
+            self._names = None
+            self._trim_buffers()
+            print(
+                f"Не удалось записать {len(self._buffer)} отсчётов в {self.db_name}, повтор при следующем сбросе: {e}"
+            )
+            return False
+        self._retry_pending = False
+        self._flush_seconds += time.perf_counter() - start
+        self._rows_written += len(self._buffer)
+        self._commits += 1
+        self._buffer.clear()
+        self._gpu_buffer.clear()
+        self._cores_buffer.clear()
+        self._system_buffer.clear()
+        self._process_buffer.clear()
+        return True
+
+    def _trim_buffers(self):
+        """
+        Отбрасывает самые старые отсчёты буфера сверх max_pending вместе с их GPU и дополнительными метриками.
+        """
+        extra = len(self._buffer) - self.max_pending
+        if extra <= 0:
+            return
+        del self._buffer[:extra]
+        self._dropped += extra
+        first_id = self._buffer[0][0] if self._buffer else self._next_id
+        # Строки связанных таблиц идут в порядке id отсчёта, первым полем — sample_id
+        for buffer in (self._gpu_buffer, self._cores_buffer, self._system_buffer, self._process_buffer):
+            buffer[:] = [row for row in buffer if row[0] >= first_id]
+
+    def write_stage_timings(self, rows):
+        """
+        Сохраняет снимок времени этапов цикла (см. StageTimings.rows) отдельной транзакцией,
+        заменяя предыдущий снимок.
+        """
+        if self._conn is None or not rows:
+            return
+        timestamp = int(time.time() * 1_000_000)
+        try:
+            with self._conn:
+                self._conn.executemany(self.INSERT_STAGES_SQL, [(row[0], timestamp, *row[1:]) for row in rows])
+        except sqlite3.OperationalError:
+            # Снимок не обязателен: следующий заменит его целиком
+            self._failed_flushes += 1
+
+    def close(self):
+        """
+        Сбрасывает оставшиеся строки и закрывает соединение.
+        """
+        if self._conn is None:
+            return
+        try:
+            if not self.flush():
+                print(f"При закрытии {self.db_name} не записано отсчётов: {len(self._buffer)}")
+        finally:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self):
+        """
+        Возвращает статистику работы писателя.
+
+        Возвращает:
+            dict: Количество записанных строк и транзакций, строк в секунду,
+                  транзакций (fsync) в секунду, среднее время одного сброса,
+                  число неудачных сбросов (база занята) и отброшенных отсчётов.
+        """
+        uptime = time.monotonic() - self._opened_at if self._opened_at is not None else 0.0
+        return {
+            "rows_written": self._rows_written,
+            "commits": self._commits,
+            "pending": len(self._buffer),
+            "uptime": uptime,
+            "rows_per_sec": self._rows_written / uptime if uptime > 0 else 0.0,
+            # Каждая транзакция — не более одного fsync; в WAL + NORMAL их обычно ещё меньше
+            "fsyncs_per_sec": self._commits / uptime if uptime > 0 else 0.0,
+            "avg_flush_time": self._flush_seconds / self._commits if self._commits else 0.0,
+            "failed_flushes": self._failed_flushes,
+            "dropped": self._dropped,
+        }
+
+    def report(self):
+        """
+        Формирует строку со статистикой писателя для вывода в консоль.
+        """
+        s = self.stats()
+        return (
+            f"Запись в БД: {s['rows_written']} строк, {s['commits']} транзакций, "
+            f"{s['rows_per_sec']:.2f} строк/с, {s['fsyncs_per_sec']:.3f} fsync/с, "
+            f"средний сброс {s['avg_flush_time'] * 1000:.2f} мс, неудачных сбросов {s['failed_flushes']}, "
+            f"отброшено {s['dropped']}"
+        )
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
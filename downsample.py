@@ -0,0 +1,127 @@
+import numpy as np
+
+
+# Количество точек на график по умолчанию (примерно ширина графика в пикселях)
+DEFAULT_POINTS = 2000
+
+# Поддерживаемые методы прореживания
+METHODS = ("lttb", "minmax")
+
+
+def _clean(x, y):
+    """
+    Приводит ряды к float64 и убирает точки без значения (например, GPU отсутствует).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    mask = ~np.isnan(y)
+    if not mask.all():
+        x, y = x[mask], y[mask]
+    return x, y
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Выбирает индексы точек алгоритмом Largest-Triangle-Three-Buckets.
+
+    Ряд делится на threshold - 2 корзины; из каждой выбирается точка, образующая
+    треугольник наибольшей площади с выбранной точкой предыдущей корзины и средним
+    следующей. Первая и последняя точки сохраняются всегда. Внутри корзины расчёт
+    векторизован, поэтому время работы линейно по длине ряда.
+
+    Аргументы:
+        x (numpy.ndarray): Значения по оси X (возрастающие).
+        y (numpy.ndarray): Значения по оси Y.
+        threshold (int): Количество точек на выходе.
+
+    Возвращает:
+        numpy.ndarray: Отсортированные индексы выбранных точек.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Границы корзин для всех точек, кроме первой и последней
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Среднее следующей корзины (для последней корзины — последняя точка)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        area = np.abs((x[a] - avg_x) * (bucket_y - y[a]) - (x[a] - bucket_x) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def minmax_indices(x, y, threshold):
+    """
+    Выбирает индексы минимального и максимального значения в каждой корзине.
+
+    Сохраняет все пики, поэтому подходит для поиска всплесков нагрузки.
+
+    Аргументы:
+        x (numpy.ndarray): Значения по оси X (возрастающие).
+        y (numpy.ndarray): Значения по оси Y.
+        threshold (int): Количество точек на выходе (по две на корзину).
+
+    Возвращает:
+        numpy.ndarray: Отсортированные уникальные индексы выбранных точек.
+    """
+    n = len(x)
+    buckets = threshold // 2
+    if threshold >= n or buckets < 1:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    starts = edges[:-1]
+    # Значения минимумов и максимумов по корзинам считаются без цикла Python
+    minima = np.minimum.reduceat(y, starts)
+    maxima = np.maximum.reduceat(y, starts)
+    bucket_of = np.repeat(np.arange(buckets), np.diff(edges))
+    positions = np.arange(n)
+    # Первое вхождение минимума/максимума в каждой корзине
+    min_idx = np.full(buckets, n, dtype=np.int64)
+    max_idx = np.full(buckets, n, dtype=np.int64)
+    is_min = y == minima[bucket_of]
+    is_max = y == maxima[bucket_of]
+    np.minimum.at(min_idx, bucket_of[is_min], positions[is_min])
+    np.minimum.at(max_idx, bucket_of[is_max], positions[is_max])
+    return np.unique(np.concatenate([min_idx, max_idx]))
+
+
+def downsample(x, y, points=DEFAULT_POINTS, method="lttb"):
+    """
+    Прореживает ряд до заданного количества точек.
+
+    Аргументы:
+        x (array-like): Значения по оси X (например, время в микросекундах).
+        y (array-like): Значения по оси Y; None/NaN пропускаются.
+        points (int): Количество точек на выходе; 0 — без прореживания.
+        method (str): "lttb" или "minmax".
+
+    Возвращает:
+        tuple: Массивы (x, y) прореженного ряда.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Неизвестный метод прореживания: {method}")
+    x, y = _clean(x, y)
+    if not points or len(x) <= points:
+        return x, y
+    if method == "lttb":
+        indices = lttb_indices(x, y, points)
+    else:
+        indices = minmax_indices(x, y, points)
+    return x[indices], y[indices]
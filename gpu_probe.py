@@ -0,0 +1,229 @@
+import shutil
+import subprocess
+import threading
+import time
+
+
+# Значение, которое записывается вместо данных GPU, если GPU отсутствует
+NO_GPU = "ГП не найден"
+
+# Поля, которые запрашиваются у nvidia-smi в режиме цикла
+QUERY_FIELDS = "index,name,utilization.gpu,memory.used"
+
+
+class NullGpuProbe:
+    """
+    Опрос GPU для машин без GPU.
+
+    Отсутствие GPU определяется один раз при старте, после чего опрос
+    ничего не делает и сразу возвращает NO_GPU.
+    """
+
+    available = False
+
+    def read(self):
+        """
+        Возвращает:
+            str: Сообщение NO_GPU.
+        """
+        return NO_GPU
+
+    def readings(self):
+        """
+        Возвращает:
+            list: Пустой список подробных показаний.
+        """
+        return []
+
+    def close(self):
+        pass
+
+
+class NvidiaSmiGpuProbe:
+    """
+    Опрос GPU через один долгоживущий процесс nvidia-smi в режиме цикла.
+
+    Вместо запуска nvidia-smi на каждый опрос (как делает GPUtil.getGPUs) процесс
+    запускается один раз с ключом -lms и печатает показания с заданным периодом.
+    Фоновый поток читает вывод и хранит последние показания каждого GPU; read()
+    только возвращает кэш. Показания старше max_age считаются устаревшими.
+
+    Атрибуты:
+        executable (str): Путь к nvidia-smi.
+        interval (float): Период обновления показаний nvidia-smi в секундах.
+        max_age (float): Максимальный возраст показаний в секундах.
+    """
+
+    available = True
+
+    def __init__(self, executable="nvidia-smi", interval=0.5, max_age=None):
+        self.executable = executable
+        self.interval = interval
+        self.max_age = max_age if max_age is not None else max(3 * interval, 1.0)
+
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._ready = threading.Event()
+        self._process = None
+        self._reader = None
+        self._last_start = 0.0
+        self._closed = False
+        self._start()
+
+    def _start(self):
+        """
+        Запускает процесс nvidia-smi и поток чтения его вывода.
+        """
+        self._last_start = time.monotonic()
+        self._process = subprocess.Popen(
+            [
+                self.executable,
+                f"--query-gpu={QUERY_FIELDS}",
+                "--format=csv,noheader,nounits",
+                f"-lms={int(self.interval * 1000)}",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        self._reader = threading.Thread(target=self._read_loop, args=(self._process,), daemon=True)
+        self._reader.start()
+
+    def _read_loop(self, process):
+        """
+        Читает строки вывода nvidia-smi и обновляет кэш показаний.
+        """
+        for line in process.stdout:
+            reading = parse_query_line(line)
+            if reading is None:
+                continue
+            with self._lock:
+                self._latest[reading["index"]] = (reading, time.monotonic())
+            self._ready.set()
+
+    def wait_ready(self, timeout):
+        """
+        Ждёт первые показания от nvidia-smi.
+
+        Аргументы:
+            timeout (float): Максимальное время ожидания в секундах.
+
+        Возвращает:
+            bool: True, если показания получены.
+        """
+        return self._ready.wait(timeout)
+
+    def readings(self):
+        """
+        Возвращает свежие подробные показания GPU.
+
+        Возвращает:
+            list: Список словарей с ключами index, name, load, memory (None — поле не поддерживается),
+                  упорядоченный по индексу GPU.
+        """
+        now = time.monotonic()
+        with self._lock:
+            fresh = [reading for reading, seen in self._latest.values() if now - seen <= self.max_age]
+        if not fresh:
+            self._restart_if_dead()
+        return sorted(fresh, key=lambda reading: reading["index"])
+
+    def read(self):
+        """
+        Возвращает загрузку и память GPU в формате, который принимает schema.parse_gpu_usage.
+
+        Возвращает:
+            list | str: Список троек (название GPU, загрузка в процентах, занятая память в МиБ)
+                        либо NO_GPU, если свежих показаний нет.
+        """
+        fresh = self.readings()
+        if not fresh:
+            return NO_GPU
+        return [(reading["name"], reading["load"], reading["memory"]) for reading in fresh]
+
+    def _restart_if_dead(self):
+        """
+        Перезапускает nvidia-smi, если процесс завершился (не чаще раза в 5 секунд).
+        """
+        if self._closed or self._process.poll() is None:
+            return
+        if time.monotonic() - self._last_start < 5.0:
+            return
+        self._start()
+
+    def close(self):
+        """
+        Останавливает процесс nvidia-smi.
+        """
+        self._closed = True
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+
+
+def parse_query_line(line):
+    """
+    Разбирает одну строку вывода nvidia-smi --query-gpu в формате csv,noheader,nounits.
+
+    Аргументы:
+        line (str): Строка вида "0, NVIDIA GeForce RTX 3060 Ti, 19, 1024".
+
+    Возвращает:
+        dict | None: Показания GPU (load и memory равны None, если nvidia-smi их не сообщает)
+            или None, если строку не удалось разобрать.
+    """
+    parts = [part.strip() for part in line.split(",")]
+    if len(parts) < 4:
+        return None
+    try:
+        index = int(parts[0])
+    except ValueError:
+        return None
+    # Название GPU теоретически может содержать запятые
+    name = ", ".join(parts[1:-2])
+    return {"index": index, "name": name, "load": _parse_value(parts[-2]), "memory": _parse_value(parts[-1])}
+
+
+def _parse_value(text):
+    """
+    Число из вывода nvidia-smi или None для неподдерживаемого поля
+    ("[N/A]", "[Not Supported]"): показание GPU при этом не теряется.
+    """
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def detect_gpu_probe(executable="nvidia-smi", interval=0.5, max_age=None, timeout=2.0):
+    """
+    Один раз при старте определяет, есть ли в системе GPU NVIDIA, и создаёт подходящий опрос.
+
+    Если nvidia-smi не найден в PATH, завершается с ошибкой или не видит ни одного GPU,
+    возвращается NullGpuProbe, который не тратит времени на опрос.
+
+    Аргументы:
+        executable (str): Имя или путь к nvidia-smi.
+        interval (float): Период обновления показаний в секундах.
+        max_age (float): Максимальный возраст показаний в секундах.
+        timeout (float): Время ожидания ответа nvidia-smi при обнаружении.
+
+    Возвращает:
+        NvidiaSmiGpuProbe | NullGpuProbe: Объект опроса GPU.
+    """
+    path = shutil.which(executable)
+    if path is None:
+        return NullGpuProbe()
+    try:
+        result = subprocess.run([path, "-L"], capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.SubprocessError):
+        return NullGpuProbe()
+    if result.returncode != 0 or "GPU" not in result.stdout:
+        return NullGpuProbe()
+    probe = NvidiaSmiGpuProbe(path, interval=interval, max_age=max_age)
+    probe.wait_ready(timeout)
+    return probe
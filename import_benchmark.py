@@ -0,0 +1,275 @@
+"""
+Время запуска: стоимость импорта модулей и время до первого отсчёта сборщика.
+
+Каждый модуль импортируется в отдельном процессе `python -X importtime`, время импорта
+(кумулятивное, вместе со всеми зависимостями) сравнивается с бюджетом IMPORT_BUDGETS,
+а список загруженных модулей — со списком запрещённых FORBIDDEN_IMPORTS: тяжёлые
+модули (numpy, asyncio, Qt, Flask, клиенты HTTP) должны загружаться только там,
+где используется их функция. Время до первого отсчёта — от запуска `python -m collector`
+до первой строки журнала циклов.
+
+Если бюджет превышен или загружен запрещённый модуль, скрипт завершается с кодом 1,
+поэтому его можно запускать в CI:
+
+    python -m import_benchmark --repeat 5 --output import_benchmark.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+
+# Бюджет времени импорта модуля (вместе с зависимостями), мс
+IMPORT_BUDGETS = {
+    "collector": 120.0,
+    "agent": 100.0,
+    "retention": 60.0,
+    "main": 800.0,
+}
+
+# Модули, которые не должны загружаться при импорте (совпадение по имени пакета)
+HEADLESS_FORBIDDEN = (
+    "PyQt5", "qasync", "flask", "werkzeug", "jinja2", "numpy", "plotly", "GPUtil",
+    "asyncio", "tenacity", "urllib.request", "http.server", "pstats", "multiprocessing.shared_memory",
+)
+FORBIDDEN_IMPORTS = {
+    "collector": HEADLESS_FORBIDDEN,
+    "agent": HEADLESS_FORBIDDEN,
+    "retention": HEADLESS_FORBIDDEN,
+    "main": ("PyQt5", "qasync", "plotly", "GPUtil"),
+}
+
+# Бюджет времени до первого отсчёта сборщика, с
+FIRST_SAMPLE_BUDGET = 1.0
+
+# Сколько секунд ждать первого отсчёта, прежде чем считать запуск неудачным
+FIRST_SAMPLE_TIMEOUT = 30.0
+
+# Сколько модулей с наибольшим собственным временем импорта показывать
+TOP_MODULES = 10
+
+# Строка вывода -X importtime: собственное время, кумулятивное время (мкс), имя с отступом по глубине
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def parse_importtime(stderr, module):
+    """
+    Разбирает вывод -X importtime и выделяет импорт модуля module.
+
+    Возвращает:
+        tuple: (кумулятивное время импорта module в мкс, список (имя, собственное время в мкс)
+            модулей, загруженных при его импорте); (None, []), если module в выводе нет.
+    """
+    pending = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        own, cumulative, indent, name = match.groups()
+        pending.append((name, int(own)))
+        # Модули верхнего уровня (импортированные из -c) выводятся без отступа
+        if not indent:
+            if name == module:
+                return int(cumulative), pending
+            pending = []
+    return None, []
+
+
+def measure_import(module, python=sys.executable):
+    """
+    Импортирует module в новом процессе с -X importtime.
+
+    Возвращает:
+        dict: {"import_ms": время импорта, "self_ms": {модуль: собственное время, мс},
+            "modules": загруженные модули}.
+    """
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}, sys; print('\\n'.join(sys.modules))"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative, imported = parse_importtime(completed.stderr, module)
+    if cumulative is None:
+        raise RuntimeError(f"В выводе -X importtime нет модуля {module}")
+    return {
+        "import_ms": cumulative / 1000,
+        "self_ms": {name: own / 1000 for name, own in imported},
+        "modules": completed.stdout.split(),
+    }
+
+
+def forbidden_loaded(modules, forbidden):
+    """
+    Запрещённые модули (или их подмодули), оказавшиеся среди загруженных modules.
+    """
+    return sorted({name for name in forbidden for loaded in modules if loaded == name or loaded.startswith(name + ".")})
+
+
+def import_case(module, repeat, budget):
+    """
+    repeat раз измеряет импорт module и сравнивает медиану с бюджетом budget (мс).
+    """
+    runs = [measure_import(module) for _ in range(repeat)]
+    times = [run["import_ms"] for run in runs]
+    median = statistics.median(times)
+    last = runs[-1]
+    top = sorted(last["self_ms"].items(), key=lambda item: item[1], reverse=True)[:TOP_MODULES]
+    forbidden = forbidden_loaded(last["modules"], FORBIDDEN_IMPORTS.get(module, ()))
+    return {
+        "module": module,
+        "import_ms": median,
+        "import_ms_min": min(times),
+        "budget_ms": budget,
+        "modules_loaded": len(last["modules"]),
+        "forbidden": forbidden,
+        "top_self_ms": dict(top),
+        "ok": median <= budget and not forbidden,
+    }
+
+
+def time_to_first_sample(backend, workdir, rate=10.0, python=sys.executable):
+    """
+    Запускает `python -m collector` и измеряет время до первой строки журнала циклов.
+
+    Возвращает:
+        float: Время до первого отсчёта, с.
+    """
+    db_name = os.path.join(workdir, f"first-sample-{backend}.db")
+    command = [
+        python, "-u", "-m", "collector", "--backend", backend, "--rate", str(rate),
+        "--duration", "1", "--db", db_name,
+    ]
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    elapsed = None
+    try:
+        for line in process.stdout:
+            if '"event": "cycles"' in line:
+                elapsed = time.perf_counter() - started
+                break
+            if time.perf_counter() - started > FIRST_SAMPLE_TIMEOUT:
+                break
+        # Остаток вывода дочитывается, чтобы сборщик не заблокировался на записи в канал
+        process.communicate(timeout=FIRST_SAMPLE_TIMEOUT)
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+    if elapsed is None:
+        raise RuntimeError(f"Сборщик ({backend}) не выдал ни одного отсчёта")
+    return elapsed
+
+
+def first_sample_case(backend, repeat, budget, workdir):
+    times = [time_to_first_sample(backend, workdir) for _ in range(repeat)]
+    median = statistics.median(times)
+    return {
+        "backend": backend,
+        "first_sample_ms": median * 1000,
+        "first_sample_ms_min": min(times) * 1000,
+        "budget_ms": budget * 1000,
+        "ok": median <= budget,
+    }
+
+
+def format_report(imports, first_samples):
+    """
+    Формирует отчёт для вывода в консоль.
+    """
+    lines = ["Импорт (медиана / бюджет, мс):"]
+    for case in imports:
+        status = "ok" if case["ok"] else "ПРЕВЫШЕНИЕ"
+        lines.append(f"  {case['module']:<12} {case['import_ms']:8.1f} / {case['budget_ms']:<8g} {status}")
+        if case["forbidden"]:
+            lines.append(f"    загружены запрещённые модули: {', '.join(case['forbidden'])}")
+        slowest = ", ".join(f"{name} {ms:.1f}" for name, ms in list(case["top_self_ms"].items())[:5])
+        lines.append(f"    дольше всего: {slowest}")
+    if first_samples:
+        lines.append("Время до первого отсчёта (медиана / бюджет, мс):")
+        for case in first_samples:
+            status = "ok" if case["ok"] else "ПРЕВЫШЕНИЕ"
+            lines.append(f"  {case['backend']:<12} {case['first_sample_ms']:8.1f} / {case['budget_ms']:<8g} {status}")
+    return "\n".join(lines)
+
+
+def _budget(value):
+    module, _, budget = value.partition("=")
+    if not module or not budget:
+        raise argparse.ArgumentTypeError("ожидается МОДУЛЬ=МС")
+    return module, float(budget)
+
+
+def _list(value):
+    return [item for item in value.split(",") if item]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m import_benchmark",
+        description="Время импорта модулей и время до первого отсчёта сборщика с порогами регрессии.",
+    )
+    parser.add_argument("--modules", type=_list, default=list(IMPORT_BUDGETS), help="модули через запятую")
+    parser.add_argument(
+        "--budget",
+        type=_budget,
+        action="append",
+        default=[],
+        metavar="МОДУЛЬ=МС",
+        help="бюджет времени импорта модуля в мс (можно повторять)",
+    )
+    parser.add_argument(
+        "--backends", type=_list, default=["thread"], help="backend'ы для замера времени до первого отсчёта"
+    )
+    parser.add_argument(
+        "--first-sample-budget", type=float, default=FIRST_SAMPLE_BUDGET, help="бюджет времени до первого отсчёта, с"
+    )
+    parser.add_argument("--no-first-sample", action="store_true", help="не замерять время до первого отсчёта")
+    parser.add_argument("--repeat", type=int, default=5, help="количество повторов каждого замера")
+    parser.add_argument("--output", help="файл с результатами в формате JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    budgets = {**IMPORT_BUDGETS, **dict(args.budget)}
+    imports = [import_case(module, args.repeat, budgets.get(module, float("inf"))) for module in args.modules]
+    first_samples = []
+    if not args.no_first_sample:
+        with tempfile.TemporaryDirectory(prefix="logger-startup-") as workdir:
+            first_samples = [
+                first_sample_case(backend, args.repeat, args.first_sample_budget, workdir) for backend in args.backends
+            ]
+
+    print(format_report(imports, first_samples))
+    if args.output:
+        report = {
+            "created": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "imports": imports,
+            "first_sample": first_samples,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    if not all(case["ok"] for case in imports + first_samples):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+import gzip
+import json
+import os
+import sqlite3
+import zlib
+from collections import defaultdict
+
+from db_writer import BatchedDatabaseWriter
+from schema import GpuNameCache, ensure_schema, last_sample_id
+
+
+# Формат пачки отсчётов, которую агент отправляет на сервер: NDJSON, сжатый gzip
+BATCH_CONTENT_TYPE = "application/x-ndjson"
+BATCH_CONTENT_ENCODING = "gzip"
+
+# Ограничение размера пачки после распаковки (защита от «zip-бомбы»)
+MAX_BATCH_BYTES = 64 * 1024 * 1024
+
+# Количество значений в строке system_samples и process_samples (без sample_id и rank)
+SYSTEM_FIELDS = 8
+PROCESS_FIELDS = 6
+
+# Целые числа, которые помещаются в INTEGER SQLite
+_INT64 = (-(2**63), 2**63 - 1)
+
+# Отметка «до какого id источника данные уже приняты» для каждого источника хоста
+# (агента или загружаемого файла) и время этого отсчёта
+INGEST_STATE_SQL = """
+CREATE TABLE IF NOT EXISTS ingest_sources (
+    source TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL,
+    last_timestamp INTEGER
+)
+"""
+
+_UPDATE_SOURCE_SQL = """
+INSERT INTO ingest_sources (source, last_id, last_timestamp) VALUES (?, ?, ?)
+ON CONFLICT (source) DO UPDATE SET last_id = excluded.last_id, last_timestamp = excluded.last_timestamp
+"""
+
+# Объединение загруженной базы (src) с хранилищем: новые отсчёты получают id хранилища
+# подряд после последнего; отсчёт, время которого уже есть в хранилище, пропускается,
+# а из отсчётов загруженной базы с одинаковым временем переносится только первый
+_MERGE_IDS_SQL = """
+INSERT INTO temp.merge_ids (src_id, dst_id)
+SELECT MIN(s.id), ? + ROW_NUMBER() OVER (ORDER BY MIN(s.id))
+FROM src.performance AS s
+WHERE s.id > ? AND NOT EXISTS (SELECT 1 FROM main.performance AS p WHERE p.timestamp = s.timestamp)
+GROUP BY s.timestamp
+"""
+_MERGE_SQL = (
+    """
+    INSERT INTO main.performance (id, timestamp, cpu_usage, memory_usage, elapsed_time)
+    SELECT m.dst_id, s.timestamp, s.cpu_usage, s.memory_usage, s.elapsed_time
+    FROM temp.merge_ids AS m JOIN src.performance AS s ON s.id = m.src_id
+    """,
+    "INSERT OR IGNORE INTO main.gpu_names (name) SELECT name FROM src.gpu_names",
+    """
+    INSERT INTO main.gpu_samples (sample_id, gpu_index, name_id, load, mem)
+    SELECT m.dst_id, g.gpu_index, dn.id, g.load, g.mem
+    FROM temp.merge_ids AS m
+    JOIN src.gpu_samples AS g ON g.sample_id = m.src_id
+    JOIN src.gpu_names AS sn ON sn.id = g.name_id
+    JOIN main.gpu_names AS dn ON dn.name = sn.name
+    """,
+    """
+    INSERT INTO main.cpu_cores (sample_id, core, usage)
+    SELECT m.dst_id, c.core, c.usage
+    FROM temp.merge_ids AS m JOIN src.cpu_cores AS c ON c.sample_id = m.src_id
+    """,
+    """
+    INSERT INTO main.system_samples
+        (sample_id, disk_read, disk_write, net_sent, net_recv, load1, load5, load15, collector_cpu)
+    SELECT m.dst_id, s.disk_read, s.disk_write, s.net_sent, s.net_recv, s.load1, s.load5, s.load15, s.collector_cpu
+    FROM temp.merge_ids AS m JOIN src.system_samples AS s ON s.sample_id = m.src_id
+    """,
+    """
+    INSERT INTO main.process_samples (sample_id, rank, pid, name, cpu, rss, io_read, io_write)
+    SELECT m.dst_id, p.rank, p.pid, p.name, p.cpu, p.rss, p.io_read, p.io_write
+    FROM temp.merge_ids AS m JOIN src.process_samples AS p ON p.sample_id = m.src_id
+    """,
+)
+
+# Агрегаты отсчётов, удалённых в загруженной базе по сроку хранения (retention.py). Повторная загрузка
+# того же файла не должна удваивать count, поэтому корзина заменяется, только если в загруженной
+# базе в неё свёрнуто больше отсчётов (файл дописан и прорежен с прошлого раза)
+_MERGE_ROLLUPS_SQL = """
+INSERT INTO main.sample_rollups (resolution, bucket, metric, count, min, avg, max)
+SELECT resolution, bucket, metric, count, min, avg, max FROM src.sample_rollups WHERE true
+ON CONFLICT (resolution, bucket, metric) DO UPDATE SET
+    count = excluded.count, min = excluded.min, avg = excluded.avg, max = excluded.max
+WHERE excluded.count > sample_rollups.count
+"""
+
+_GPU_QUERY = """
+SELECT g.sample_id, n.name, g.load, g.mem
+FROM gpu_samples AS g
+JOIN gpu_names AS n ON n.id = g.name_id
+WHERE g.sample_id BETWEEN ? AND ?
+ORDER BY g.sample_id, g.gpu_index
+"""
+_CORES_QUERY = "SELECT sample_id, usage FROM cpu_cores WHERE sample_id BETWEEN ? AND ? ORDER BY sample_id, core"
+_SYSTEM_QUERY = """
+SELECT sample_id, disk_read, disk_write, net_sent, net_recv, load1, load5, load15, collector_cpu
+FROM system_samples
+WHERE sample_id BETWEEN ? AND ?
+"""
+_PROCESS_QUERY = """
+SELECT sample_id, pid, name, cpu, rss, io_read, io_write
+FROM process_samples
+WHERE sample_id BETWEEN ? AND ?
+ORDER BY sample_id, rank
+"""
+
+
+def read_records(conn, after_id, limit):
+    """
+    Читает отсчёты локальной базы с id больше after_id в формате пачки.
+
+    Аргументы:
+        conn (sqlite3.Connection): Соединение с базой текущей схемы.
+        after_id (int): Отсчёты с меньшим или равным id уже отправлены.
+        limit (int): Максимальное количество отсчётов.
+
+    Возвращает:
+        list: Словари отсчётов: id, timestamp (мкс), cpu_usage, memory_usage, elapsed_time,
+              gpu — список [название, загрузка, память] и, если есть, extended —
+              дополнительные метрики в формате ExtendedSampler.sample().
+    """
+    rows = conn.execute(
+        "SELECT id, timestamp, cpu_usage, memory_usage, elapsed_time FROM performance WHERE id > ? ORDER BY id LIMIT ?",
+        (after_id, limit),
+    ).fetchall()
+    if not rows:
+        return []
+    bounds = (rows[0][0], rows[-1][0])
+
+    gpu = defaultdict(list)
+    for sample_id, *values in conn.execute(_GPU_QUERY, bounds):
+        gpu[sample_id].append(values)
+    cores = defaultdict(list)
+    for sample_id, usage in conn.execute(_CORES_QUERY, bounds):
+        cores[sample_id].append(usage)
+    system = {row[0]: list(row[1:]) for row in conn.execute(_SYSTEM_QUERY, bounds)}
+    processes = defaultdict(list)
+    for sample_id, *values in conn.execute(_PROCESS_QUERY, bounds):
+        processes[sample_id].append(values)
+
+    records = []
+    for sample_id, timestamp, cpu_usage, memory_usage, elapsed_time in rows:
+        record = {
+            "id": sample_id,
+            "timestamp": timestamp,
+            "cpu_usage": cpu_usage,
+            "memory_usage": memory_usage,
+            "elapsed_time": elapsed_time,
+            "gpu": gpu.get(sample_id, []),
+        }
+        if sample_id in system:
+            record["extended"] = {
+                "cores": cores.get(sample_id, []),
+                "system": system[sample_id],
+                "processes": processes.get(sample_id, []),
+            }
+        records.append(record)
+    return records
+
+
+def encode_batch(records):
+    """
+    Кодирует пачку отсчётов в NDJSON, сжатый gzip.
+    """
+    text = "".join(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in records)
+    return gzip.compress(text.encode("utf-8"), compresslevel=6)
+
+
+def _gunzip(body, limit=MAX_BATCH_BYTES):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.decompress(body, limit)
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"Пачка больше {limit} байт после распаковки")
+    return data
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and _INT64[0] <= value <= _INT64[1]
+
+
+def _is_number(value):
+    return value is None or _is_int(value) or isinstance(value, float)
+
+
+def _check_values(values, count, what):
+    if not isinstance(values, list) or len(values) != count or not all(_is_number(value) for value in values):
+        raise ValueError(f"{what}: ожидается список из {count} чисел")
+
+
+def validate_record(record):
+    """
+    Проверяет форму отсчёта пачки (см. read_records), чтобы испорченный отсчёт отклонялся
+    до записи, а не приводил к ошибке SQLite.
+
+    Исключения:
+        ValueError: Поле отсутствует или имеет неверный тип.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("Отсчёт должен быть объектом JSON")
+    if not _is_int(record.get("id")) or not _is_int(record.get("timestamp")):
+        raise ValueError("У отсчёта нет целых полей id и timestamp")
+    for field in ("cpu_usage", "memory_usage", "elapsed_time"):
+        if not _is_number(record.get(field)):
+            raise ValueError(f"Поле {field} должно быть числом")
+    gpu = record.get("gpu", [])
+    if not isinstance(gpu, list):
+        raise ValueError("Поле gpu должно быть списком")
+    for item in gpu:
+        if not isinstance(item, list) or len(item) != 3 or not isinstance(item[0], str):
+            raise ValueError("GPU: ожидается [название, загрузка, память]")
+        _check_values(item[1:], 2, "GPU")
+    extended = record.get("extended")
+    if extended is None:
+        return
+    if not isinstance(extended, dict):
+        raise ValueError("Поле extended должно быть объектом")
+    cores = extended.get("cores")
+    if not isinstance(cores, list):
+        raise ValueError("extended.cores: ожидается список чисел")
+    _check_values(cores, len(cores), "extended.cores")
+    _check_values(extended.get("system"), SYSTEM_FIELDS, "extended.system")
+    processes = extended.get("processes")
+    if not isinstance(processes, list):
+        raise ValueError("extended.processes должно быть списком")
+    for process in processes:
+        if (
+            not isinstance(process, list)
+            or len(process) != PROCESS_FIELDS
+            or not _is_int(process[0])
+            or not (process[1] is None or isinstance(process[1], str))
+        ):
+            raise ValueError(f"extended.processes: ожидается [pid, имя, и ещё {PROCESS_FIELDS - 2} числа]")
+        _check_values(process[2:], PROCESS_FIELDS - 2, "extended.processes")
+
+
+def decode_batch(body, content_encoding=None):
+    """
+    Разбирает пачку отсчётов (NDJSON, сжатый gzip или без сжатия).
+
+    Исключения:
+        ValueError: Пачка повреждена или отсчёт не проходит validate_record().
+    """
+    if content_encoding == BATCH_CONTENT_ENCODING:
+        try:
+            body = _gunzip(body)
+        except zlib.error as e:
+            raise ValueError(f"Пачка не распаковывается: {e}") from e
+    records = []
+    for line in body.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        validate_record(record)
+        records.append(record)
+    return records
+
+
+def _connect(db_path):
+    ensure_schema(db_path)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.isolation_level = None
+    # Хранилище хоста читается страницей просмотра, пока агенты дописывают данные
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(INGEST_STATE_SQL)
+    return conn
+
+
+def last_ingested_id(db_path, source):
+    """
+    Возвращает id последнего принятого отсчёта источника (0, если данных ещё не было).
+    Хранилище неизвестного хоста не создаётся: оно появится с первой пачкой.
+    """
+    if not os.path.exists(db_path):
+        return 0
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT last_id FROM ingest_sources WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else 0
+    finally:
+        conn.close()
+
+
+def append_records(db_path, source, records):
+    """
+    Дописывает пачку отсчётов источника в хранилище хоста.
+
+    Отсчёты с id не больше отметки источника пропускаются, поэтому повторная отправка
+    той же пачки (например, после обрыва соединения до ответа сервера) не создаёт дублей;
+    повторы id внутри самой пачки тоже записываются один раз.
+    В хранилище отсчёты получают собственные id; отсчёты, GPU, дополнительные метрики
+    и новая отметка записываются одной транзакцией.
+
+    Аргументы:
+        db_path (str): Путь к базе хоста.
+        source (str): Идентификатор источника (локальной базы агента).
+        records (list): Отсчёты в формате read_records().
+
+    Возвращает:
+        tuple: (количество принятых отсчётов, новая отметка источника).
+    """
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT last_id FROM ingest_sources WHERE source = ?", (source,)).fetchone()
+            last_id = row[0] if row else 0
+            # Отсчёт с одним id мог попасть в пачку дважды — записывается один раз
+            unique = {record["id"]: record for record in records if record["id"] > last_id}
+            fresh = [unique[sample_id] for sample_id in sorted(unique)]
+            if fresh:
+                next_id = last_sample_id(conn) + 1
+                names = GpuNameCache(conn)
+                samples, gpu_rows, core_rows, system_rows, process_rows = [], [], [], [], []
+                for sample_id, record in enumerate(fresh, start=next_id):
+                    samples.append(
+                        (
+                            sample_id,
+                            record["timestamp"],
+                            record.get("cpu_usage"),
+                            record.get("memory_usage"),
+                            record.get("elapsed_time"),
+                        )
+                    )
+                    for gpu_index, (name, load, mem) in enumerate(record.get("gpu", [])):
+                        gpu_rows.append((sample_id, gpu_index, names.get(name), load, mem))
+                    extended = record.get("extended")
+                    if extended:
+                        core_rows.extend((sample_id, core, usage) for core, usage in enumerate(extended["cores"]))
+                        system_rows.append((sample_id, *extended["system"]))
+                        process_rows.extend(
+                            (sample_id, rank, *process) for rank, process in enumerate(extended["processes"])
+                        )
+                conn.executemany(BatchedDatabaseWriter.INSERT_SQL, samples)
+                conn.executemany(BatchedDatabaseWriter.INSERT_GPU_SQL, gpu_rows)
+                conn.executemany(BatchedDatabaseWriter.INSERT_CORES_SQL, core_rows)
+                conn.executemany(BatchedDatabaseWriter.INSERT_SYSTEM_SQL, system_rows)
+                conn.executemany(BatchedDatabaseWriter.INSERT_PROCESS_SQL, process_rows)
+                last_id = fresh[-1]["id"]
+                conn.execute(_UPDATE_SOURCE_SQL, (source, last_id, fresh[-1]["timestamp"]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(fresh), last_id
+    finally:
+        conn.close()
+
+
+def merge_database(db_path, source_path, source):
+    """
+    Добавляет в хранилище отсчёты загруженной базы, которых в нём ещё нет.
+
+    База источника подключается через ATTACH, а строки переносятся запросами
+    INSERT ... SELECT внутри SQLite, без чтения в Python. Дубли отбрасываются по времени
+    отсчёта (индекс performance_timestamp) — и уже бывшие в хранилище, и повторы внутри
+    самой загруженной базы. Агрегаты отсчётов, удалённых в загруженной базе по сроку
+    хранения (sample_rollups), переносятся тоже — целиком, их намного меньше, чем отсчётов.
+    Для каждого источника запоминается id и время последнего перенесённого отсчёта: если
+    загружен тот же файл, дописанный с прошлого раза (отсчёт с этим id на месте и время
+    совпадает), рассматриваются только строки с большими id, поэтому время объединения
+    зависит только от объёма новых данных. Иначе (другой файл под тем же именем)
+    проверяются все строки.
+
+    Аргументы:
+        db_path (str): Путь к хранилищу.
+        source_path (str): Путь к загруженной базе текущей схемы.
+        source (str): Идентификатор источника, например "upload:<имя файла>".
+
+    Возвращает:
+        int: Количество добавленных отсчётов.
+    """
+    conn = _connect(db_path)
+    try:
+        conn.execute("ATTACH DATABASE ? AS src", (source_path,))
+        conn.execute("CREATE TEMP TABLE merge_ids (src_id INTEGER PRIMARY KEY, dst_id INTEGER NOT NULL)")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            after = 0
+            mark = conn.execute(
+                "SELECT last_id, last_timestamp FROM ingest_sources WHERE source = ?", (source,)
+            ).fetchone()
+            if mark is not None:
+                row = conn.execute("SELECT timestamp FROM src.performance WHERE id = ?", (mark[0],)).fetchone()
+                if row is not None and row[0] == mark[1]:
+                    after = mark[0]
+            offset = last_sample_id(conn)
+            conn.execute(_MERGE_IDS_SQL, (offset, after))
+            added = conn.execute("SELECT COUNT(*) FROM temp.merge_ids").fetchone()[0]
+            if added:
+                for statement in _MERGE_SQL:
+                    conn.execute(statement)
+            conn.execute(_MERGE_ROLLUPS_SQL)
+            last = conn.execute("SELECT id, timestamp FROM src.performance ORDER BY id DESC LIMIT 1").fetchone()
+            if last is not None:
+                conn.execute(_UPDATE_SOURCE_SQL, (source, *last))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("DROP TABLE temp.merge_ids")
+        conn.execute("DETACH DATABASE src")
+        return added
+    finally:
+        conn.close()
@@ -0,0 +1,387 @@
+"""
+Самоизмерение сборщика: время этапов цикла в гистограммах фиксированного размера.
+
+Каждый цикл делится на этапы (опросы CPU, RAM и GPU, передача отсчёта интерфейсу,
+запись в базу, обновление интерфейса), длительность каждого этапа записывается
+в свою гистограмму. Гистограммы устроены как HDR: корзины логарифмические
+с линейным делением внутри каждой степени двойки, поэтому память постоянна
+(HISTOGRAM_SIZE счётчиков на этап), запись — O(1) без выделения памяти,
+а относительная погрешность процентилей не превышает 1 / 2**SUB_BITS.
+
+Статистика доступна локально по HTTP в текстовом формате Prometheus (/metrics)
+и в JSON (/metrics.json), сохраняется в базу (таблица stage_timings, её показывает
+страница просмотра) и раз в LOG_INTERVAL секунд печатается строкой JSON.
+"""
+
+import json
+import threading
+import time
+from array import array
+from datetime import datetime
+
+
+# Этапы цикла сборщика и их названия для отчётов и страницы просмотра
+STAGE_TITLES = {
+    "cpu": "Опрос CPU",
+    "memory": "Опрос RAM",
+    "gpu": "Опрос GPU",
+    "extended": "Дополнительные метрики",
+    "publish": "Передача отсчёта (интерфейсу, в очередь)",
+    "alerts": "Проверка оповещений",
+    "db_write": "Запись в базу",
+    "gui_update": "Обновление интерфейса",
+    "cycle": "Цикл целиком",
+}
+STAGES = tuple(STAGE_TITLES)
+
+# Точность гистограммы: каждая степень двойки делится на 2**SUB_BITS корзин
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+
+# Значения меньше 2 * SUB_COUNT наносекунд хранятся точно
+LINEAR_LIMIT = 2 * SUB_COUNT
+
+# Количество корзин: хватает на длительности до 2**43 нс (около 2,4 часа), большие попадают в последнюю
+HISTOGRAM_SIZE = 40 * SUB_COUNT
+
+# Процентили в отчётах и снимках
+STAGE_PERCENTILES = (50, 90, 99, 99.9)
+
+# Границы корзин (le) гистограммы Prometheus в секундах
+PROMETHEUS_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Минимальный интервал между строками журнала циклов, сек.
+LOG_INTERVAL = 10.0
+
+# Как часто снимок гистограмм сохраняется в базу, сек.
+SNAPSHOT_INTERVAL = 60.0
+
+
+def bucket_index(value):
+    """
+    Номер корзины гистограммы для значения в наносекундах.
+    """
+    if value < LINEAR_LIMIT:
+        return max(value, 0)
+    shift = value.bit_length() - SUB_BITS - 1
+    return min(((shift + 1) << SUB_BITS) + (value >> shift) - SUB_COUNT, HISTOGRAM_SIZE - 1)
+
+
+def bucket_bounds(index):
+    """
+    Наименьшее и наибольшее значение (нс), попадающие в корзину index.
+    """
+    if index < LINEAR_LIMIT:
+        return index, index
+    shift = (index >> SUB_BITS) - 1
+    lower = ((index & (SUB_COUNT - 1)) + SUB_COUNT) << shift
+    return lower, lower + (1 << shift) - 1
+
+
+class StageHistogram:
+    """
+    Гистограмма длительностей в наносекундах с памятью фиксированного размера.
+
+    Запись не потокобезопасна: каждый этап записывается одним потоком (сборщика,
+    записи в базу или интерфейса), а чтение для отчётов допускает расхождение
+    на один-два отсчёта.
+
+    Атрибуты:
+        counts (array): Количество значений в каждой корзине.
+        count (int): Всего записанных значений.
+        total (int): Сумма значений, нс.
+        max (int): Наибольшее значение, нс.
+    """
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * HISTOGRAM_SIZE))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        """
+        Добавляет длительность value (целые наносекунды, например разность perf_counter_ns).
+        """
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """
+        Процентиль q (0–100) в наносекундах: середина корзины, в которую он попадает,
+        но не больше наибольшего значения. None, если значений нет.
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, -(-self.count * q // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                lower, upper = bucket_bounds(index)
+                return min((lower + upper) / 2, self.max)
+        return self.max
+
+    def count_le(self, value):
+        """
+        Количество значений не больше value нс (с точностью до ширины корзины).
+        """
+        return sum(self.counts[: bucket_index(int(value)) + 1])
+
+    def stats(self):
+        """
+        Сводка гистограммы в секундах: count, mean, max и процентили STAGE_PERCENTILES.
+        """
+        result = {
+            "count": self.count,
+            "mean": self.total / self.count / 1e9 if self.count else None,
+            "max": self.max / 1e9 if self.count else None,
+        }
+        for q in STAGE_PERCENTILES:
+            value = self.percentile(q)
+            result[f"p{q:g}"] = value / 1e9 if value is not None else None
+        return result
+
+
+class _MetricsHandlerMixin:
+    timings = None
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = self.timings.prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(self.timings.snapshot(), ensure_ascii=False), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Запросы сборщика метрик раз в несколько секунд не засоряют консоль
+        pass
+
+
+def _metrics_server(timings, port):
+    """
+    Создаёт HTTP-сервер метрик. http.server импортируется здесь: без --metrics-port
+    сборщик его не загружает.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(_MetricsHandlerMixin, BaseHTTPRequestHandler):
+        pass
+
+    MetricsHandler.timings = timings
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    server.daemon_threads = True
+    return server
+
+
+class StageTimings:
+    """
+    Гистограммы этапов цикла сборщика и их экспорт.
+
+    Как и AlertEngine, до вызова open() объект не хранит потоков и может быть передан
+    в процесс сбора; HTTP-сервер (если задан port) запускается в том процессе,
+    где идёт сбор. Повторные open() после close() продолжают накопление.
+
+    Атрибуты:
+        port (int | None): Порт локального HTTP-сервера метрик (127.0.0.1); None — не запускать,
+            0 — любой свободный (фактический порт записывается в port после open()).
+        histograms (dict): Имя этапа -> StageHistogram.
+    """
+
+    def __init__(self, port=None):
+        self.port = port
+        self.histograms = {stage: StageHistogram() for stage in STAGES}
+        self.started = datetime.now()
+        self._server = None
+        self._thread = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_server"] = state["_thread"] = None
+        return state
+
+    def open(self):
+        """
+        Запускает HTTP-сервер метрик, если задан порт.
+        """
+        if self.port is not None and self._server is None:
+            self._server = _metrics_server(self, self.port)
+            self.port = self._server.server_address[1]
+            self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+            self._thread.start()
+        return self
+
+    def record(self, stage, value):
+        """
+        Добавляет длительность этапа stage в наносекундах.
+        """
+        self.histograms[stage].record(value)
+
+    def measure(self, stage):
+        """
+        Контекстный менеджер, измеряющий время блока как этап stage (для мест вне горячего цикла).
+        """
+        return _Measure(self.histograms[stage])
+
+    def snapshot(self):
+        """
+        Сводка всех этапов в секундах.
+
+        Возвращает:
+            dict: {"started": время создания (ISO), "stages": {этап: StageHistogram.stats()}}.
+        """
+        return {
+            "started": self.started.isoformat(),
+            "stages": {stage: histogram.stats() for stage, histogram in self.histograms.items()},
+        }
+
+    def prometheus(self):
+        """
+        Гистограммы этапов в текстовом формате Prometheus (collector_stage_seconds{stage=...}).
+        """
+        lines = [
+            "# HELP collector_stage_seconds Длительность этапов цикла сборщика.",
+            "# TYPE collector_stage_seconds histogram",
+        ]
+        for stage, histogram in self.histograms.items():
+            for le in PROMETHEUS_BUCKETS:
+                lines.append(
+                    f'collector_stage_seconds_bucket{{stage="{stage}",le="{le:g}"}} {histogram.count_le(le * 1e9)}'
+                )
+            lines.append(f'collector_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'collector_stage_seconds_sum{{stage="{stage}"}} {histogram.total / 1e9:.9f}')
+            lines.append(f'collector_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def rows(self):
+        """
+        Строки снимка для таблицы stage_timings: (stage, count, mean, p50, p90, p99, max),
+        только для этапов, у которых есть значения.
+        """
+        return [
+            (stage, s["count"], s["mean"], s["p50"], s["p90"], s["p99"], s["max"])
+            for stage, s in self.snapshot()["stages"].items()
+            if s["count"]
+        ]
+
+    def report(self):
+        """
+        Формирует строку со временем этапов (p50/p99) для вывода в консоль.
+        """
+        parts = []
+        for stage, histogram in self.histograms.items():
+            if histogram.count:
+                parts.append(
+                    f"{stage} {histogram.percentile(50) / 1e6:.3f}/{histogram.percentile(99) / 1e6:.3f}"
+                )
+        return "Этапы цикла (p50/p99, мс): " + (", ".join(parts) if parts else "нет данных")
+
+    def close(self):
+        """
+        Останавливает HTTP-сервер метрик.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+
+class _Measure:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.record(time.perf_counter_ns() - self.start)
+
+
+class CycleLog:
+    """
+    Журнал циклов с ограничением частоты: вместо строки на каждый цикл — не чаще
+    одной строки JSON в interval секунд со сводкой циклов с прошлой строки
+    (количество, наибольшее время цикла и отклонение от расписания) и p99 этапов.
+    Первый цикл записывается сразу, чтобы было видно, что сбор начался.
+
+    Атрибуты:
+        timings (StageTimings): Гистограммы этапов.
+        interval (float): Минимальный интервал между строками, сек.
+        emit (callable): Функция вывода строки (по умолчанию print).
+    """
+
+    def __init__(self, timings, interval=LOG_INTERVAL, emit=print):
+        self.timings = timings
+        self.interval = interval
+        self.emit = emit
+        self._last = None
+        self._reset()
+
+    def _reset(self):
+        self._cycles = 0
+        self._max_cycle = 0.0
+        self._max_jitter = 0.0
+
+    def log(self, data):
+        """
+        Учитывает отсчёт data (см. collector.make_sample) и при необходимости выводит строку.
+        """
+        self._cycles += 1
+        self._max_cycle = max(self._max_cycle, data["cycle_time"])
+        self._max_jitter = max(self._max_jitter, data["jitter"])
+        now = time.monotonic()
+        if self._last is not None and now - self._last < self.interval:
+            return
+        self._last = now
+        p99 = {
+            stage: round(histogram.percentile(99) / 1e6, 3)
+            for stage, histogram in self.timings.histograms.items()
+            if histogram.count
+        }
+        self.emit(
+            json.dumps(
+                {
+                    "event": "cycles",
+                    "time": data["timestamp"],
+                    "cycles": self._cycles,
+                    "cycle_ms_max": round(self._max_cycle * 1000, 3),
+                    "jitter_ms_max": round(self._max_jitter * 1000, 3),
+                    "stage_p99_ms": p99,
+                },
+                ensure_ascii=False,
+            )
+        )
+        self._reset()
+
+
+def read_stage_timings(conn):
+    """
+    Читает сохранённый в базе снимок времени этапов (таблица stage_timings).
+
+    Возвращает:
+        list: Словари {"stage", "title", "timestamp", "count", "mean", "p50", "p90", "p99", "max"}
+            в порядке STAGES (время — в секундах, timestamp — в мкс); пустой список, если снимка нет.
+    """
+    cursor = conn.execute("SELECT stage, timestamp, count, mean, p50, p90, p99, max FROM stage_timings")
+    columns = [description[0] for description in cursor.description]
+    rows = {row[0]: dict(zip(columns, row)) for row in cursor}
+    return [{**rows[stage], "title": STAGE_TITLES[stage]} for stage in STAGES if stage in rows]
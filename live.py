@@ -0,0 +1,219 @@
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from samples import NEXT_PAGE_QUERY, PREV_PAGE_QUERY
+from schema import from_epoch_us
+
+
+# Метрики, которые передаются на страницу онлайн-просмотра (в порядке столбцов NEXT_PAGE_QUERY после времени)
+LIVE_METRICS = ("cpu", "memory", "gpu", "elapsed_time")
+
+# Сколько последних отсчётов хранится в памяти и отдаётся новому зрителю
+LIVE_CAPACITY = 600
+
+# Период опроса базы, с (один запрос на базу, сколько бы ни было зрителей)
+POLL_INTERVAL = 0.5
+
+# Период комментария-пинга в потоке без новых данных, с (не даёт прокси закрыть соединение)
+HEARTBEAT_INTERVAL = 15.0
+
+# Сколько секунд опрос базы продолжается без зрителей, прежде чем поток остановится
+IDLE_TIMEOUT = 30.0
+
+
+def _point(row):
+    """
+    Строка NEXT_PAGE_QUERY -> (id, время ISO, cpu, memory, gpu, elapsed_time).
+    """
+    return (row[0], from_epoch_us(row[1]).isoformat(), *row[2:])
+
+
+class LiveTail:
+    """
+    Общий «хвост» базы для всех зрителей онлайн-просмотра.
+
+    Один поток раз в interval секунд читает новые отсчёты запросом по первичному ключу
+    (id > последнего прочитанного, LIMIT), хранит последние capacity отсчётов в памяти
+    и будит ожидающих зрителей. Каждый зритель помнит id последнего отправленного
+    ему отсчёта и получает из памяти только более новые, поэтому нагрузка на базу
+    не зависит от числа зрителей. Без зрителей поток останавливается через idle_timeout секунд.
+
+    Атрибуты:
+        db_path (str): Путь к базе данных.
+        capacity (int): Количество отсчётов в памяти.
+        interval (float): Период опроса базы в секундах.
+        idle_timeout (float): Время работы без зрителей в секундах.
+    """
+
+    def __init__(self, db_path, capacity=LIVE_CAPACITY, interval=POLL_INTERVAL, idle_timeout=IDLE_TIMEOUT):
+        self.db_path = db_path
+        self.capacity = capacity
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+
+        self._ids = []
+        self._points = []
+        self._last_id = None
+        self._cond = threading.Condition()
+        self._subscribers = 0
+        self._idle_since = time.monotonic()
+        self._thread = None
+
+        # Статистика
+        self.polls = 0
+
+    def _load(self, conn):
+        if self._last_id is None:
+            # Первый запрос: последние capacity отсчётов (по убыванию id)
+            rows = conn.execute(PREV_PAGE_QUERY, (2**63 - 1, self.capacity)).fetchall()[::-1]
+        else:
+            rows = conn.execute(NEXT_PAGE_QUERY, (self._last_id, self.capacity)).fetchall()
+        self.polls += 1
+        if self._last_id is None:
+            self._last_id = rows[-1][0] if rows else 0
+        if not rows:
+            return
+        points = [_point(row) for row in rows]
+        with self._cond:
+            self._ids.extend(point[0] for point in points)
+            self._points.extend(points)
+            # Обрезаем не на каждом опросе, а когда буфер вырос вдвое
+            if len(self._ids) > 2 * self.capacity:
+                del self._ids[: -self.capacity]
+                del self._points[: -self.capacity]
+            self._last_id = points[-1][0]
+            self._cond.notify_all()
+
+    def _run(self):
+        conn = None
+        try:
+            while True:
+                with self._cond:
+                    if not self._subscribers and time.monotonic() - self._idle_since > self.idle_timeout:
+                        self._thread = None
+                        return
+                try:
+                    if conn is None:
+                        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+                    self._load(conn)
+                except sqlite3.Error as e:
+                    # База временно занята или ещё создаётся — повторим на следующем опросе
+                    print(f"Не удалось прочитать новые отсчёты из {self.db_path}: {e}")
+                time.sleep(self.interval)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def subscribe(self):
+        """
+        Регистрирует зрителя и при необходимости запускает опрос базы.
+        """
+        with self._cond:
+            self._subscribers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"live:{self.db_path}", daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self):
+        with self._cond:
+            self._subscribers -= 1
+            if not self._subscribers:
+                self._idle_since = time.monotonic()
+
+    def wait(self, after_id, timeout):
+        """
+        Возвращает отсчёты с id больше after_id, при необходимости ожидая их до timeout секунд.
+
+        Аргументы:
+            after_id (int | None): id последнего отсчёта, уже отправленного зрителю;
+                None — отдать все отсчёты из памяти.
+            timeout (float): Максимальное время ожидания в секундах.
+
+        Возвращает:
+            list: Кортежи (id, время ISO, cpu, memory, gpu, elapsed_time); пустой — новых нет.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if after_id is None:
+                    if self._points:
+                        return self._points[-self.capacity :]
+                elif self._ids and self._ids[-1] > after_id:
+                    start = bisect.bisect_right(self._ids, after_id)
+                    if start == 0 and self._ids[0] > after_id + 1 and self._last_id is not None:
+                        # Зритель отстал больше, чем хранится в памяти: дочитываем из базы
+                        break
+                    return self._points[start:]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+        return self._backfill(after_id)
+
+    def _backfill(self, after_id):
+        """
+        Читает отсчёты после after_id из базы (для зрителя, переподключившегося после долгого перерыва).
+        """
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(NEXT_PAGE_QUERY, (after_id, self.capacity)).fetchall()
+        finally:
+            conn.close()
+        return [_point(row) for row in rows]
+
+
+_tails = {}
+_tails_lock = threading.Lock()
+
+
+def get_tail(db_path):
+    """
+    Возвращает общий LiveTail базы (один на файл на процесс сервера).
+    """
+    key = os.path.abspath(db_path)
+    with _tails_lock:
+        tail = _tails.get(key)
+        if tail is None:
+            tail = _tails[key] = LiveTail(db_path)
+        return tail
+
+
+def format_event(points):
+    """
+    Формирует событие Server-Sent Events с пачкой отсчётов в столбцовом виде:
+    {"x": [...], "cpu": [...], "memory": [...], "gpu": [...], "elapsed_time": [...]}.
+    Поле id события — id последнего отсчёта: браузер передаёт его в заголовке
+    Last-Event-ID при переподключении.
+    """
+    columns = list(zip(*points))
+    data = {"x": columns[1]}
+    data.update({metric: columns[i] for i, metric in enumerate(LIVE_METRICS, start=2)})
+    return f"id: {points[-1][0]}\nevent: samples\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def stream_events(tail, after_id=None, heartbeat=HEARTBEAT_INTERVAL):
+    """
+    Генератор потока Server-Sent Events для одного зрителя.
+
+    Аргументы:
+        tail (LiveTail): Общий хвост базы.
+        after_id (int | None): id последнего отсчёта, который у зрителя уже есть.
+        heartbeat (float): Период пинга без новых данных в секундах.
+    """
+    tail.subscribe()
+    try:
+        # Браузер переподключится через 2 с, если соединение оборвётся
+        yield "retry: 2000\n\n"
+        while True:
+            points = tail.wait(after_id, heartbeat)
+            if points:
+                after_id = points[-1][0]
+                yield format_event(points)
+            else:
+                yield ": ping\n\n"
+    finally:
+        tail.unsubscribe()
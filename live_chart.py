@@ -0,0 +1,160 @@
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from PyQt5.QtCore import QPointF, QRectF, Qt
+from PyQt5.QtGui import QColor, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import QWidget
+
+from downsample import downsample
+from shm_ring import WRITING
+
+
+# Сколько минут данных показывает график
+CHART_MINUTES = 5
+
+# Метрики на графике (все в процентах) и цвета их линий
+CHART_METRICS = ("cpu", "memory", "gpu")
+CHART_COLORS = {"cpu": "#4e9af1", "memory": "#f1a24e", "gpu": "#5ec46b"}
+CHART_LABELS = {"cpu": "CPU", "memory": "RAM", "gpu": "GPU"}
+
+
+class SampleRing:
+    """
+    Последние отсчёты для интерфейса в заранее выделенном кольцевом массиве numpy.
+
+    Сборщик передаёт каждый отсчёт в push() (вместо queue.put): запись занимает O(1)
+    и перезаписывает самый старый отсчёт, поэтому память не растёт, сколько бы
+    интерфейс ни простаивал. Интерфейс по таймеру берёт только последний отсчёт
+    (latest) и, если номер seq изменился, перерисовывает график по снимку кольца —
+    промежуточные отсчёты не форматируются, и стоимость обновления не зависит
+    от того, сколько отсчётов накопилось между тиками.
+
+    Атрибуты:
+        capacity (int): Количество хранимых отсчётов.
+        latest (dict | None): Последний отсчёт в формате collector.make_sample.
+        seq (int): Количество отсчётов, записанных за всё время.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        # Столбцы: время (с от начала эпохи) и метрики CHART_METRICS; NaN — нет значения
+        self._data = np.full((capacity, 1 + len(CHART_METRICS)), np.nan)
+        self._lock = threading.Lock()
+        self.latest = None
+        self.seq = 0
+
+    def push(self, sample):
+        """
+        Добавляет отсчёт сборщика (формат collector.make_sample).
+        Вызывается из потока или задачи сбора; безопасен для вызова из другого потока.
+        """
+        gpu_usage = sample["gpu_usage"]
+        # Загрузка GPU, которую nvidia-smi не сообщает ([N/A]), равна None
+        loads = [item[1] for item in gpu_usage if item[1] is not None] if isinstance(gpu_usage, list) else []
+        gpu = max(loads, default=np.nan)
+        row = (
+            datetime.fromisoformat(sample["timestamp"]).timestamp(),
+            sample["cpu_usage"],
+            sample["memory_usage"],
+            gpu,
+        )
+        with self._lock:
+            self._data[self.seq % self.capacity] = row
+            self.latest = sample
+            self.seq += 1
+
+    def push_records(self, records):
+        """
+        Добавляет пачку записей кольцевого буфера разделяемой памяти (shm_ring.RECORD_DTYPE)
+        одной векторной операцией; из пачки больше capacity сохраняются последние capacity.
+        """
+        # Запись, которую процесс сбора перезаписывает прямо сейчас, пропускается
+        records = records[records["seq"] != WRITING][-self.capacity :]
+        count = len(records)
+        if not count:
+            return
+        rows = np.empty((count, 1 + len(CHART_METRICS)))
+        rows[:, 0] = records["timestamp"] / 1_000_000
+        rows[:, 1] = records["cpu_usage"]
+        rows[:, 2] = records["memory_usage"]
+        loads = np.where(
+            np.arange(records["gpu_load"].shape[1]) < records["gpu_count"][:, None], records["gpu_load"], np.nan
+        )
+        with np.errstate(all="ignore"):
+            rows[:, 3] = np.fmax.reduce(loads, axis=1)
+        with self._lock:
+            slots = (self.seq + np.arange(count)) % self.capacity
+            self._data[slots] = rows
+            self.seq += count
+
+    def snapshot(self):
+        """
+        Возвращает копию хранимых отсчётов от старых к новым (массив N x (1 + метрики)).
+        """
+        with self._lock:
+            count = min(self.seq, self.capacity)
+            start = (self.seq - count) % self.capacity
+            return np.roll(self._data, -start, axis=0)[:count]
+
+
+class LiveChart(QWidget):
+    """
+    Прокручивающийся график загрузки CPU, RAM и GPU за последние minutes минут.
+
+    Рисуется через QPainter по снимку SampleRing; каждый ряд прореживается методом
+    minmax до двух точек на пиксель ширины (пики сохраняются), поэтому перерисовка
+    стоит не больше O(ширины окна) независимо от частоты опроса.
+
+    Атрибуты:
+        ring (SampleRing): Источник отсчётов.
+        minutes (float): Длина показываемого интервала в минутах.
+    """
+
+    def __init__(self, ring, minutes=CHART_MINUTES, parent=None):
+        super().__init__(parent)
+        self.ring = ring
+        self.minutes = minutes
+        self.setMinimumSize(360, 180)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), QColor("#212529"))
+        plot = QRectF(self.rect()).adjusted(44, 12, -8, -20)
+
+        # Сетка по 25 %
+        painter.setPen(QPen(QColor("#495057"), 1, Qt.DotLine))
+        for percent in (0, 25, 50, 75, 100):
+            y = plot.bottom() - plot.height() * percent / 100
+            painter.drawLine(QPointF(plot.left(), y), QPointF(plot.right(), y))
+            painter.drawText(QRectF(0, y - 8, 40, 16), Qt.AlignRight | Qt.AlignVCenter, f"{percent}%")
+
+        data = self.ring.snapshot()
+        right = data[-1, 0] if len(data) else time.time()
+        left = right - self.minutes * 60
+        data = data[data[:, 0] >= left]
+        span = right - left
+        points = max(2, int(plot.width()) * 2)
+
+        legend_x = plot.left()
+        for column, metric in enumerate(CHART_METRICS, start=1):
+            x, y = downsample(data[:, 0], data[:, column], points=points, method="minmax")
+            color = QColor(CHART_COLORS[metric])
+            if len(x) > 1:
+                xs = plot.left() + (x - left) / span * plot.width()
+                ys = plot.bottom() - np.clip(y, 0, 100) / 100 * plot.height()
+                painter.setPen(QPen(color, 1.5))
+                painter.drawPolyline(QPolygonF([QPointF(px, py) for px, py in zip(xs.tolist(), ys.tolist())]))
+            painter.setPen(color)
+            painter.drawText(QPointF(legend_x, self.height() - 5), CHART_LABELS[metric])
+            legend_x += 48
+
+        painter.setPen(QColor("#adb5bd"))
+        painter.drawText(
+            QRectF(plot.left(), plot.bottom() + 4, plot.width(), 16),
+            Qt.AlignRight | Qt.AlignVCenter,
+            f"последние {self.minutes:g} мин",
+        )
+        painter.end()
@@ -1,9 +1,37 @@
+import cProfile
+import importlib.metadata
+import importlib.util
 import os
 import sqlite3
-from flask import Flask, request, render_template, redirect, url_for, flash
+import tempfile
+import threading
+
+import numpy as np
+from flask import Flask, Response, g, request, render_template, redirect, send_file, url_for, flash, jsonify
 from werkzeug.utils import secure_filename
-import plotly.graph_objs as go
-import plotly.io as pio
+
+from analytics import HISTOGRAM_BINS, cached_describe
+from archive import compact_async, read_series
+from compare import COMPARE_METRICS, MAX_COMPARE_FILES, prepare_rollups, relative_series, summaries
+from downsample import DEFAULT_POINTS, METHODS, downsample
+from ingest import MAX_BATCH_BYTES, append_records, decode_batch, last_ingested_id, merge_database
+from instrumentation import read_stage_timings
+from live import LIVE_CAPACITY, LIVE_METRICS, get_tail, stream_events
+from profiling import (
+    DEFAULT_TOP,
+    PROFILE_KINDS,
+    SORT_KEYS,
+    hotspots,
+    list_profiles,
+    profile_dir,
+    profile_param_enabled,
+    profiling_enabled,
+    save_profile,
+)
+from rollup_cache import STATS, RollupCache
+from samples import COLUMNS, DEFAULT_PAGE_SIZE, EXPORT_FORMATS, MAX_PAGE_SIZE, export_lines, fetch_page, page_summary
+from schema import ensure_schema
+from series import METRIC_QUERIES, METRIC_TITLES, available_metrics, count_samples, parse_time, to_json_series
 
 # Создаём Flask-приложение
 app = Flask(__name__)
@@ -17,10 +45,69 @@ app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 # Разрешённые расширения файлов, которые можно загружать
 ALLOWED_EXTENSIONS = {"db"}
 
+# Сколько секунд браузер хранит plotly.js (адрес меняется вместе с версией пакета plotly)
+PLOTLY_JS_MAX_AGE = 365 * 24 * 3600
+
+# Папка для кэша агрегатов загруженных баз
+CACHE_FOLDER = "cache"
+
+app.config["CACHE_FOLDER"] = CACHE_FOLDER
+
 # Если папка для загрузок не существует, создаём её
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# Кэш агрегатов (1 с / 1 мин / 1 ч) для повторных просмотров загруженных баз
+rollup_cache = RollupCache(CACHE_FOLDER)
+
+# Профилировать все запросы (LOGGER_PROFILE=1)
+app.config["PROFILE_REQUESTS"] = profiling_enabled()
+# Профилировать отдельный запрос параметром ?profile=1 (LOGGER_PROFILE_PARAM=1); по умолчанию
+# выключено: профиль и его запись на диск стоят заметно дороже самого запроса
+app.config["PROFILE_PARAM"] = profile_param_enabled()
+
+# cProfile профилирует один запрос за раз: запросы, пришедшие во время профилирования, идут без него
+_profile_lock = threading.Lock()
+
+
+@app.before_request
+def start_request_profile():
+    """
+    Включает cProfile для запроса, если профилирование включено окружением или параметром profile
+    (параметр учитывается, только если он разрешён настройкой PROFILE_PARAM).
+    Без профилирования запрос платит одну проверку.
+    """
+    if app.config["PROFILE_REQUESTS"] or app.config["PROFILE_PARAM"] and request.args.get("profile") == "1":
+        if _profile_lock.acquire(blocking=False):
+            g.profile = cProfile.Profile()
+            g.profile.enable()
+
+
+@app.after_request
+def save_request_profile(response):
+    """
+    Сохраняет профиль запроса (если он снимался) и сообщает имя файла в заголовке X-Profile.
+    Для потоковых ответов (экспорт, онлайн-просмотр) профиль охватывает только подготовку ответа.
+    """
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profile.disable()
+        _profile_lock.release()
+        path = save_profile(profile, "request", f"{request.endpoint}-{request.path}")
+        response.headers["X-Profile"] = os.path.basename(path)
+    return response
+
+
+@app.teardown_request
+def stop_request_profile(exc):
+    """
+    Выключает профилировщик, если запрос завершился исключением до save_request_profile.
+    """
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profile.disable()
+        _profile_lock.release()
+
 
 def allowed_file(filename):
     """
@@ -35,6 +122,10 @@ def upload_file():
     """
     Обрабатывает загрузку файлов через веб-форму.
     Если файл загружен корректно, сохраняет его и перенаправляет на страницу просмотра данных.
+
+    Загруженная база не заменяет файл с тем же именем, а объединяется с ним
+    (merge_database): добавляются только отсчёты, которых ещё нет. Повторная загрузка
+    дописанного лога обрабатывает только новые строки.
     """
     if request.method == "POST":
         # Проверяем, есть ли файл в запросе
@@ -55,13 +146,28 @@ def upload_file():
             filename = secure_filename(file.filename)
             # Формируем полный путь к файлу
             file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-            # Сохраняем файл в папку UPLOAD_FOLDER
-            file.save(file_path)
+            # Сохраняем загрузку во временный файл рядом с хранилищем
+            fd, incoming = tempfile.mkstemp(suffix=".upload", dir=app.config["UPLOAD_FOLDER"])
+            os.close(fd)
+            try:
+                file.save(incoming)
+                # Переводим старые базы (v1) на текущую схему и дописываем новые отсчёты в хранилище
+                ensure_schema(incoming)
+                merge_database(file_path, incoming, source=f"upload:{filename}")
+            except sqlite3.DatabaseError as e:
+                flash(f"Ошибка при чтении базы данных: {e}")
+                return redirect(request.url)
+            finally:
+                os.remove(incoming)
+            # Закрытые сегменты сжимаются в архив, затем считаются агрегаты — всё в фоне,
+            # к моменту просмотра они обычно уже готовы
+            compact_async(file_path, then=rollup_cache.ensure_async)
             # Перенаправляем на страницу просмотра данных из файла
             return redirect(url_for("view_data", filename=filename))
 
-    # Если метод GET, отображаем форму загрузки файла
-    return render_template("upload.html")
+    # Если метод GET, отображаем форму загрузки файла и список загруженных баз для сравнения
+    files = sorted(name for name in os.listdir(app.config["UPLOAD_FOLDER"]) if allowed_file(name))
+    return render_template("upload.html", files=files, max_compare=MAX_COMPARE_FILES)
 
 
 @app.route("/view/<filename>")
@@ -69,9 +175,33 @@ def view_data(filename):
     """
     Загружает данные из выбранного файла базы данных (.db),
     извлекает таблицу "performance" и отображает её содержимое на веб-странице вместе с графиками.
+
+    Сами графики строятся в браузере: страница один раз загружает plotly.js и запрашивает
+    ряды через api_series, а при масштабировании догружает только видимый диапазон.
+
+    Таблица листается страницами по id (keyset pagination): на каждую страницу
+    читается только page_size строк, сколько бы строк ни было в базе.
+
+    Параметры запроса:
+    - points: количество точек на каждом графике (по умолчанию DEFAULT_POINTS, 0 — без прореживания).
+    - method: метод прореживания, "lttb" (по умолчанию) или "minmax".
+    - page_size: количество строк таблицы на странице (по умолчанию DEFAULT_PAGE_SIZE).
+    - after / before: id, после (перед) которого начинается страница таблицы.
     """
+    points = request.args.get("points", DEFAULT_POINTS, type=int)
+    method = request.args.get("method", "lttb")
+    if method not in METHODS or points is None or points < 0:
+        flash("Некорректные параметры прореживания")
+        return redirect(url_for("upload_file"))
+    page_size = request.args.get("page_size", DEFAULT_PAGE_SIZE, type=int)
+    after = request.args.get("after", type=int)
+    before = request.args.get("before", type=int)
+    if page_size is None or not 1 <= page_size <= MAX_PAGE_SIZE:
+        flash("Некорректный размер страницы")
+        return redirect(url_for("upload_file"))
+
     # Формируем полный путь к загруженному файлу
-    file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+    file_path = os.path.join(app.config["UPLOAD_FOLDER"], secure_filename(filename))
 
     # Проверяем, существует ли файл
     if not os.path.exists(file_path):
@@ -79,33 +209,36 @@ def view_data(filename):
         return redirect(url_for("upload_file"))
 
     try:
+        # Базы, загруженные до появления схемы v2, обновляются при первом просмотре
+        ensure_schema(file_path)
+
         # Подключаемся к базе данных SQLite
         conn = sqlite3.connect(file_path)
-        cursor = conn.cursor()
 
-        # Выполняем SQL-запрос для получения всех данных из таблицы "data"
-        cursor.execute("SELECT * FROM performance")
-        rows = cursor.fetchall()  # Получаем все строки результата
-        column_names = [description[0] for description in cursor.description]  # Названия столбцов таблицы
+        # Получаем одну страницу отсчётов вместе с загрузкой GPU
+        page = fetch_page(conn, after=after, before=before, page_size=page_size)
+        # Процессы и ядра CPU за отсчёты страницы (если база собрана с дополнительными метриками)
+        summary = {"processes": [], "cores": []}
+        if page["rows"]:
+            summary = page_summary(conn, page["rows"][0][0], page["rows"][-1][0])
+        metrics = available_metrics(conn)
         conn.close()  # Закрываем соединение с базой данных
 
-        # Извлекаем данные для построения графиков
-        timestamps = [row[1] for row in rows]  # Столбец с временными метками
-        cpu_usage = [row[2] for row in rows]  # Столбец с загрузкой CPU
-        memory_usage = [row[3] for row in rows]  # Столбец с загрузкой памяти
-        gpu_usage = [row[4] for row in rows]  # Столбец с загрузкой GPU
-        elapsed_time = [row[5] for row in rows]
-
-        # Создаём интерактивные графики с использованием Plotly
-        graphs = {
-            "cpu": create_graph(timestamps, cpu_usage, "Загрузка CPU (%)", "Время", "Загрузка (%)"),
-            "memory": create_graph(timestamps, memory_usage, "Загрузка памяти (%)", "Время", "Загрузка (%)"),
-            "gpu": create_graph(timestamps, gpu_usage, "Загрузка GPU (%)", "Время", "Загрузка (%)"),
-            "elapsed_time": create_graph(timestamps, elapsed_time, "Время выполнения (сек.)", "Время", "Время (сек.)"),
-        }
-
         # Формируем данные для передачи в шаблон
-        data = {"columns": column_names, "rows": rows, "graphs": graphs}
+        data = {
+            "filename": filename,
+            "columns": COLUMNS,
+            "rows": page["rows"],
+            "prev": page["prev"],
+            "next": page["next"],
+            "page_size": page_size,
+            "processes": summary["processes"],
+            "cores": summary["cores"],
+            "metrics": metrics,
+            "points": points,
+            "method": method,
+            "plotly_js_url": plotly_js_url(),
+        }
     except Exception as e:
         # В случае ошибки (например, если структура файла некорректна) выводим сообщение
         flash(f"Ошибка при чтении базы данных: {e}")
@@ -115,35 +248,524 @@ def view_data(filename):
     return render_template("view.html", data=data)
 
 
-def create_graph(x, y, title, x_label, y_label):
+@app.route("/export/<filename>")
+def export_data(filename):
+    """
+    Выгружает все отсчёты базы в формате CSV или NDJSON потоковым ответом.
+
+    Строки читаются из базы пачками и сразу отправляются клиенту, поэтому
+    память процесса не зависит от размера базы.
+
+    Параметры запроса:
+    - format: "csv" (по умолчанию) или "ndjson".
+    """
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        flash(f"Неизвестный формат экспорта: {fmt}")
+        return redirect(url_for("upload_file"))
+
+    file_path = os.path.join(app.config["UPLOAD_FOLDER"], secure_filename(filename))
+    if not os.path.exists(file_path):
+        flash("Файл не найден")
+        return redirect(url_for("upload_file"))
+    ensure_schema(file_path)
+
+    def generate():
+        # Соединение открывается внутри генератора: ответ читается уже после выхода из функции
+        conn = sqlite3.connect(file_path)
+        try:
+            yield from export_lines(conn, fmt)
+        finally:
+            conn.close()
+
+    download_name = f"{os.path.splitext(secure_filename(filename))[0]}.{fmt}"
+    return Response(
+        generate(),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={download_name}"},
+    )
+
+
+def load_series(file_path, metric, start=None, end=None, points=DEFAULT_POINTS, method="lttb", stat="avg"):
+    """
+    Читает ряд метрики и прореживает его до points точек.
+
+    Если в диапазон попадает больше points отсчётов, ряд берётся из кэша агрегатов
+    (rollup_cache) с самым мелким подходящим разрешением, иначе — исходные данные
+    из архива и базы; пока агрегаты изменившейся базы пересобираются в фоне, используются
+    агрегаты её предыдущей версии. Время, отсчёты которого удалены по сроку хранения, в обоих случаях
+    представлено минутными и часовыми агрегатами sample_rollups (см. archive.read_series).
+
+    Возвращает:
+        tuple: (x — время в мкс, y, total — число точек в диапазоне до прореживания,
+        resolution — длина корзины агрегатов в мкс, 0 — исходные отсчёты).
+    """
+    resolution = 0
+    rollup = None
+    conn = sqlite3.connect(file_path)
+    try:
+        # Кэш агрегатов нужен, только если отсчётов в диапазоне больше, чем точек (count_samples — по индексу)
+        if points and count_samples(conn, start, end) > points:
+            rollup = rollup_cache.query(file_path, metric, start, end, points, stat)
+        if rollup is not None and rollup["total"] > points:
+            x, y, total, resolution = rollup["x"], rollup["y"], rollup["total"], rollup["resolution"]
+        else:
+            # Отсчётов в диапазоне немного — отдаём исходные данные (архив + база)
+            x, y = read_series(conn, file_path, metric, start, end)
+            total = len(x)
+    finally:
+        conn.close()
+    x, y = downsample(x, y, points, method)
+    return x, y, total, resolution
+
+
+@app.route("/api/<filename>/series")
+def api_series(filename):
+    """
+    Возвращает ряд одной метрики в формате JSON для графиков на странице просмотра.
+
+    Параметры запроса:
+    - metric: cpu, memory, gpu, elapsed_time или дополнительная метрика (load1, disk_read,
+      disk_write, net_sent, net_recv, collector_cpu).
+    - from, to: границы диапазона времени (строка ISO или микросекунды от начала эпохи);
+      без них возвращается весь ряд.
+    - points: количество точек на выходе (по умолчанию DEFAULT_POINTS, 0 — без прореживания).
+    - method: метод прореживания, "lttb" (по умолчанию) или "minmax".
+    - stat: статистика корзины агрегатов (min, avg, max, p95), по умолчанию avg.
+
+    Если в диапазон попадает больше points отсчётов, ряд берётся из кэша агрегатов
+    (rollup_cache) с самым мелким подходящим разрешением, а не из исходной таблицы.
+
+    Ответ: {"metric", "title", "total" — число точек в диапазоне до прореживания,
+    "resolution" — длина корзины агрегатов в мкс (0 — исходные отсчёты), "x", "y"}.
+    """
+    metric = request.args.get("metric", "cpu")
+    points = request.args.get("points", DEFAULT_POINTS, type=int)
+    method = request.args.get("method", "lttb")
+    stat = request.args.get("stat", "avg")
+    if metric not in METRIC_QUERIES:
+        return jsonify({"error": f"Неизвестная метрика: {metric}"}), 400
+    if stat not in STATS:
+        return jsonify({"error": f"Неизвестная статистика: {stat}"}), 400
+    if method not in METHODS or points is None or points < 0:
+        return jsonify({"error": "Некорректные параметры прореживания"}), 400
+    try:
+        start = parse_time(request.args.get("from"))
+        end = parse_time(request.args.get("to"))
+    except ValueError:
+        return jsonify({"error": "Некорректные границы диапазона"}), 400
+
+    file_path = os.path.join(app.config["UPLOAD_FOLDER"], secure_filename(filename))
+    if not os.path.exists(file_path):
+        return jsonify({"error": "Файл не найден"}), 404
+
+    try:
+        ensure_schema(file_path)
+        x, y, total, resolution = load_series(file_path, metric, start, end, points, method, stat)
+    except sqlite3.DatabaseError as e:
+        return jsonify({"error": f"Ошибка при чтении базы данных: {e}"}), 400
+
+    return jsonify(
+        {
+            "metric": metric,
+            "title": METRIC_TITLES[metric],
+            "total": total,
+            "resolution": resolution,
+            **to_json_series(x, y),
+        }
+    )
+
+
+@app.route("/api/<filename>/summary")
+def api_summary(filename):
+    """
+    Возвращает сводку метрик базы за диапазон времени (analytics.cached_describe): количество,
+    среднее, стандартное отклонение, минимум, максимум, p50/p95/p99 и гистограмму.
+    Ряды читаются в массивы numpy (закрытые сегменты — из архива), расчёт векторизован.
+
+    Параметры запроса:
+    - metric: имя метрики, можно повторять; по умолчанию — все метрики базы.
+    - from, to: границы диапазона времени (как у api_series).
+    - bins: количество корзин гистограммы (по умолчанию HISTOGRAM_BINS).
+
+    Ответ: {"metrics": [{"metric", "title", "count", "mean", "std", "min", "max",
+    "p50", "p95", "p99", "histogram": {"counts", "edges"}}, ...]} в порядке запроса.
+    """
+    metrics = request.args.getlist("metric")
+    bins = request.args.get("bins", HISTOGRAM_BINS, type=int)
+    unknown = [metric for metric in metrics if metric not in METRIC_QUERIES]
+    if unknown:
+        return jsonify({"error": f"Неизвестная метрика: {unknown[0]}"}), 400
+    if bins is None or bins < 1:
+        return jsonify({"error": "Некорректное количество корзин"}), 400
+    try:
+        start = parse_time(request.args.get("from"))
+        end = parse_time(request.args.get("to"))
+    except ValueError:
+        return jsonify({"error": "Некорректные границы диапазона"}), 400
+
+    file_path = os.path.join(app.config["UPLOAD_FOLDER"], secure_filename(filename))
+    if not os.path.exists(file_path):
+        return jsonify({"error": "Файл не найден"}), 404
+
+    try:
+        ensure_schema(file_path)
+        if not metrics:
+            conn = sqlite3.connect(file_path)
+            try:
+                metrics = list(available_metrics(conn))
+            finally:
+                conn.close()
+        result = cached_describe(file_path, metrics, start, end, bins)
+    except sqlite3.DatabaseError as e:
+        return jsonify({"error": f"Ошибка при чтении базы данных: {e}"}), 400
+
+    return jsonify(
+        {"metrics": [{"metric": metric, "title": METRIC_TITLES[metric], **result[metric]} for metric in metrics]}
+    )
+
+
+@app.route("/api/<filename>/stages")
+def api_stages(filename):
+    """
+    Возвращает время этапов цикла сборщика, сохранённое в базе при записи (instrumentation.py):
+    количество циклов, среднее, p50, p90, p99 и максимум каждого этапа в секундах.
+
+    Ответ: {"stages": [{"stage", "title", "timestamp", "count", "mean", "p50", "p90", "p99", "max"}, ...]};
+    список пуст, если база записана без самоизмерения (старые версии сборщика, базы агента).
+    """
+    file_path = os.path.join(app.config["UPLOAD_FOLDER"], secure_filename(filename))
+    if not os.path.exists(file_path):
+        return jsonify({"error": "Файл не найден"}), 404
+
+    try:
+        ensure_schema(file_path)
+        conn = sqlite3.connect(f"file:{file_path}?mode=ro", uri=True)
+        try:
+            stages = read_stage_timings(conn)
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        return jsonify({"error": f"Ошибка при чтении базы данных: {e}"}), 400
+
+    return jsonify({"stages": stages})
+
+
+@app.route("/live/<filename>")
+def live_view(filename):
     """
-    Создаёт интерактивный график с использованием библиотеки Plotly.
+    Онлайн-просмотр базы, в которую продолжается запись (например, хранилище хоста,
+    куда агент отправляет отсчёты, или база сборщика в папке загрузок).
 
-    Параметры:
-    - x: значения по оси X (например, временные метки).
-    - y: значения по оси Y (например, данные о загрузке).
-    - title: заголовок графика.
-    - x_label: подпись оси X.
-    - y_label: подпись оси Y.
+    Страница один раз создаёт графики и подписывается на поток api_stream; новые точки
+    добавляются через Plotly.extendTraces без перерисовки графиков.
+    """
+    file_path = os.path.join(app.config["UPLOAD_FOLDER"], secure_filename(filename))
+    if not os.path.exists(file_path):
+        flash("Файл не найден")
+        return redirect(url_for("upload_file"))
+    data = {
+        "filename": secure_filename(filename),
+        "metrics": {metric: METRIC_TITLES[metric] for metric in LIVE_METRICS},
+        "max_points": LIVE_CAPACITY,
+        "plotly_js_url": plotly_js_url(),
+    }
+    return render_template("live.html", data=data)
 
-    Возвращает HTML-код графика.
+
+@app.route("/api/<filename>/stream")
+def api_stream(filename):
     """
-    # Создаём объект Figure
-    fig = go.Figure()
+    Поток новых отсчётов базы в формате Server-Sent Events (text/event-stream).
+
+    Все зрители одной базы получают данные из общего LiveTail: база опрашивается
+    одним запросом по первичному ключу раз в POLL_INTERVAL, а для каждого зрителя
+    запоминается только id последнего отправленного отсчёта.
 
-    # Добавляем данные в виде линии
-    fig.add_trace(go.Scatter(x=x, y=y, mode="lines", name=title))
+    Параметры запроса:
+    - after: id отсчёта, после которого начинать (по умолчанию — последние LIVE_CAPACITY отсчётов).
+      При переподключении браузер сам передаёт заголовок Last-Event-ID.
 
-    # Настраиваем оформление графика
-    fig.update_layout(
-        title=title,  # Заголовок графика
-        xaxis_title=x_label,  # Подпись оси X
-        yaxis_title=y_label,  # Подпись оси Y
-        template="plotly_dark",  # Тёмная тема оформления
+    События: "samples" с данными {"x", "cpu", "memory", "gpu", "elapsed_time"}.
+    """
+    file_path = os.path.join(app.config["UPLOAD_FOLDER"], secure_filename(filename))
+    if not os.path.exists(file_path):
+        return jsonify({"error": "Файл не найден"}), 404
+    after = request.headers.get("Last-Event-ID", type=int)
+    if after is None:
+        after = request.args.get("after", type=int)
+    try:
+        ensure_schema(file_path)
+    except sqlite3.DatabaseError as e:
+        return jsonify({"error": f"Ошибка при чтении базы данных: {e}"}), 400
+    return Response(
+        stream_events(get_tail(file_path), after),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    # Преобразуем график в HTML-код
-    return pio.to_html(fig, full_html=False)
+
+def compare_paths(filenames):
+    """
+    Проверяет список файлов для сравнения и возвращает пути к ним.
+
+    Исключения:
+        ValueError: Файлов меньше двух или больше MAX_COMPARE_FILES, либо файл не найден.
+    """
+    if not 2 <= len(filenames) <= MAX_COMPARE_FILES:
+        raise ValueError(f"Для сравнения выберите от 2 до {MAX_COMPARE_FILES} файлов")
+    paths = [os.path.join(app.config["UPLOAD_FOLDER"], name) for name in filenames]
+    for name, path in zip(filenames, paths):
+        if not os.path.exists(path):
+            raise ValueError(f"Файл не найден: {name}")
+    return paths
+
+
+@app.route("/compare")
+def compare_view():
+    """
+    Сравнение нескольких загруженных баз (например, threading, asyncio и multiprocessing).
+
+    Таблица сводок: время цикла (среднее, p50, p95, p99), загрузка CPU системой и самим
+    сборщиком, фактическая частота и равномерность опроса. Графики метрик всех баз
+    накладываются друг на друга в относительном времени (секунды от первого отсчёта каждой базы)
+    и запрашиваются через api_compare_series.
+
+    Параметры запроса:
+    - files: имя файла, повторяется для каждой базы (от 2 до MAX_COMPARE_FILES).
+    - points, method: как у view_data.
+    """
+    filenames = [secure_filename(name) for name in request.args.getlist("files")]
+    points = request.args.get("points", DEFAULT_POINTS, type=int)
+    method = request.args.get("method", "lttb")
+    if method not in METHODS or points is None or points < 0:
+        flash("Некорректные параметры прореживания")
+        return redirect(url_for("upload_file"))
+    try:
+        paths = compare_paths(filenames)
+        for path in paths:
+            ensure_schema(path)
+        # Сводки всех баз считаются параллельно и кэшируются до изменения файла
+        stats = summaries(paths)
+    except (ValueError, sqlite3.DatabaseError) as e:
+        flash(f"Ошибка при сравнении: {e}")
+        return redirect(url_for("upload_file"))
+
+    data = {
+        "files": list(zip(filenames, stats)),
+        "metrics": {metric: METRIC_TITLES[metric] for metric in COMPARE_METRICS},
+        "points": points,
+        "method": method,
+        "plotly_js_url": plotly_js_url(),
+    }
+    return render_template("compare.html", data=data)
+
+
+@app.route("/api/compare/series")
+def api_compare_series():
+    """
+    Возвращает ряды одной метрики нескольких баз в относительном времени.
+
+    Ряды баз загружаются параллельно тем же способом, что и в api_series
+    (из кэша агрегатов для длинных записей), поэтому сравнение N баз занимает
+    примерно столько же, сколько загрузка самой большой.
+
+    Параметры запроса:
+    - files: имя файла, повторяется для каждой базы.
+    - metric, points, method, stat: как у api_series.
+
+    Ответ: {"metric", "title", "series": [{"file", "total", "resolution",
+    "x" — секунды от первого отсчёта базы, "y"}, ...]}.
+    """
+    filenames = [secure_filename(name) for name in request.args.getlist("files")]
+    metric = request.args.get("metric", "cpu")
+    points = request.args.get("points", DEFAULT_POINTS, type=int)
+    method = request.args.get("method", "lttb")
+    stat = request.args.get("stat", "avg")
+    if metric not in METRIC_QUERIES:
+        return jsonify({"error": f"Неизвестная метрика: {metric}"}), 400
+    if stat not in STATS:
+        return jsonify({"error": f"Неизвестная статистика: {stat}"}), 400
+    if method not in METHODS or points is None or points < 0:
+        return jsonify({"error": "Некорректные параметры прореживания"}), 400
+    try:
+        paths = compare_paths(filenames)
+        for path in paths:
+            ensure_schema(path)
+        # Недостающие агрегаты всех баз строятся параллельно, затем ряды читаются из кэша
+        prepare_rollups(rollup_cache, paths)
+        series = relative_series(paths, lambda path: load_series(path, metric, None, None, points, method, stat))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except sqlite3.DatabaseError as e:
+        return jsonify({"error": f"Ошибка при чтении базы данных: {e}"}), 400
+
+    return jsonify(
+        {
+            "metric": metric,
+            "title": METRIC_TITLES[metric],
+            "series": [
+                {
+                    "file": name,
+                    "total": total,
+                    "resolution": resolution,
+                    "x": x.tolist(),
+                    "y": [None if np.isnan(value) else float(value) for value in y],
+                }
+                for name, (x, y, total, resolution) in zip(filenames, series)
+            ],
+        }
+    )
+
+
+def host_db_path(host):
+    """
+    Возвращает путь к хранилищу хоста (базе в папке загрузок) или None, если имя хоста недопустимо.
+
+    Хранилище — обычная база текущей схемы, поэтому она открывается страницей просмотра
+    как загруженный файл: /view/<host>.db.
+    """
+    if not host or secure_filename(host) != host:
+        return None
+    return os.path.join(app.config["UPLOAD_FOLDER"], f"{host}.db")
+
+
+def _plotly_js():
+    """
+    Путь к plotly.min.js установленного пакета plotly и версия пакета или (None, None).
+    Пакет не импортируется: файл находится по расположению пакета.
+    """
+    spec = importlib.util.find_spec("plotly")
+    if spec is None or not spec.submodule_search_locations:
+        return None, None
+    path = os.path.join(spec.submodule_search_locations[0], "package_data", "plotly.min.js")
+    if not os.path.exists(path):
+        return None, None
+    return path, importlib.metadata.version("plotly")
+
+
+PLOTLY_JS_PATH, PLOTLY_VERSION = _plotly_js()
+
+
+def plotly_js_url():
+    """
+    Адрес plotly.js для страниц с графиками: версия пакета в адресе сбрасывает кэш браузера
+    после обновления plotly.
+    """
+    return url_for("plotly_js", v=PLOTLY_VERSION)
+
+
+@app.route("/plotly.min.js")
+def plotly_js():
+    """
+    Отдаёт plotly.js из установленного пакета plotly, чтобы графики строились
+    и без доступа к интернету (в изолированной сети).
+    """
+    if PLOTLY_JS_PATH is None:
+        return "Пакет plotly не установлен", 404
+    return send_file(PLOTLY_JS_PATH, mimetype="text/javascript", max_age=PLOTLY_JS_MAX_AGE)
+
+
+@app.route("/api/ingest/<host>", methods=["GET", "POST"])
+def api_ingest(host):
+    """
+    Принимает пачки отсчётов от агентов (agent.py) и дописывает их в хранилище хоста.
+
+    Параметры запроса:
+    - source: идентификатор источника (локальной базы агента).
+
+    GET возвращает отметку источника {"host", "source", "last_id"} — id последнего
+    принятого отсчёта, с которого агент продолжает отправку (0 для нового хоста;
+    хранилище при этом не создаётся).
+
+    POST принимает пачку: NDJSON (Content-Type: application/x-ndjson), сжатый gzip
+    (Content-Encoding: gzip) или без сжатия. Отсчёты, которые уже были приняты,
+    пропускаются, поэтому повторная отправка пачки безопасна. Пачка с отсчётом неверной
+    формы отклоняется целиком с кодом 400, тело запроса больше MAX_BATCH_BYTES — с кодом 413:
+    агент не повторяет такую пачку, как при ошибках 5xx, а делит её.
+    Ответ: {"host", "source", "accepted" — количество новых отсчётов, "last_id"}.
+    """
+    source = request.args.get("source", "")
+    db_path = host_db_path(host)
+    if db_path is None:
+        return jsonify({"error": f"Недопустимое имя хоста: {host}"}), 400
+    if not source:
+        return jsonify({"error": "Не указан источник (source)"}), 400
+
+    try:
+        if request.method == "GET":
+            return jsonify({"host": host, "source": source, "last_id": last_ingested_id(db_path, source)})
+        # Тело читается в память целиком: пачка (и сжатая, и без сжатия) не больше MAX_BATCH_BYTES
+        if request.content_length is not None and request.content_length > MAX_BATCH_BYTES:
+            return jsonify({"error": f"Пачка больше {MAX_BATCH_BYTES} байт"}), 413
+        # Тело без Content-Length (chunked) читается не дальше лишнего байта за ограничением
+        request.max_content_length = MAX_BATCH_BYTES + 1
+        body = request.get_data()
+        if len(body) > MAX_BATCH_BYTES:
+            return jsonify({"error": f"Пачка больше {MAX_BATCH_BYTES} байт"}), 413
+        try:
+            records = decode_batch(body, request.headers.get("Content-Encoding"))
+        except ValueError as e:
+            return jsonify({"error": f"Некорректная пачка: {e}"}), 400
+        try:
+            accepted, last_id = append_records(db_path, source, records)
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({"error": f"Некорректный отсчёт: {e}"}), 400
+    except sqlite3.DatabaseError as e:
+        # Например, база занята дольше тайм-аута — агент повторит отправку
+        return jsonify({"error": f"Ошибка при записи в базу данных: {e}"}), 503
+    if accepted:
+        # Закрывшиеся сегменты хранилища копируются в архив
+        compact_async(db_path)
+    return jsonify({"host": host, "source": source, "accepted": accepted, "last_id": last_id})
+
+
+@app.route("/profiles")
+def profiles_view():
+    """
+    Отображает сохранённые профили (цикла сборщика и запросов) и top-N функций.
+
+    Параметры запроса:
+    - file: имя файла профиля; без него складываются все профили вида kind.
+    - kind: "collector" или "request" (по умолчанию — все профили).
+    - top: количество функций (по умолчанию DEFAULT_TOP).
+    - sort: "cumulative" (по умолчанию), "tottime" или "calls".
+    """
+    directory = profile_dir()
+    # Пустые значения формы означают «все»
+    selected = request.args.get("file") or None
+    kind = request.args.get("kind") or None
+    top = request.args.get("top", DEFAULT_TOP, type=int)
+    sort = request.args.get("sort", "cumulative")
+    if kind is not None and kind not in PROFILE_KINDS or sort not in SORT_KEYS or top is None or top < 1:
+        flash("Некорректные параметры профилей")
+        return redirect(url_for("upload_file"))
+
+    files = list_profiles(directory)
+    if selected is not None:
+        selected = secure_filename(selected)
+        if selected not in files:
+            flash("Профиль не найден")
+            return redirect(url_for("profiles_view"))
+        chosen = [selected]
+    else:
+        chosen = [name for name in files if kind is None or name.startswith(f"{kind}-")]
+
+    data = {
+        "files": files,
+        "selected": selected,
+        "kind": kind,
+        "kinds": PROFILE_KINDS,
+        "top": top,
+        "sort": sort,
+        "sorts": list(SORT_KEYS),
+        "directory": directory,
+        "enabled": app.config["PROFILE_REQUESTS"],
+        "param_enabled": app.config["PROFILE_PARAM"],
+        "profiles": len(chosen),
+        "hotspots": hotspots([os.path.join(directory, name) for name in chosen], top, sort) if chosen else None,
+    }
+    return render_template("profiles.html", data=data)
 
 
 # Запуск приложения
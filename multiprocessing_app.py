@@ -1,109 +1,18 @@
 import multiprocessing
-import psutil
-import GPUtil
-import sqlite3
-from datetime import datetime
 from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QVBoxLayout, QWidget, QLabel
 from PyQt5.QtCore import QTimer
 
+from collector import ProcessBackend
+from live_chart import CHART_MINUTES, LiveChart, SampleRing
+from retention import Retention
+from shm_ring import SharedRingBuffer
 
-# Настройка базы данных
-# Создаёт таблицу для хранения метрик производительности, если её ещё нет
-def setup_database(db_name):
-    """
-    Создает таблицу для хранения данных о производительности, если она еще не существует.
-
-    Аргументы:
-        db_name (str): Имя файла базы данных SQLite.
-    """
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS performance (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
-            cpu_usage REAL,
-            memory_usage REAL,
-            gpu_usage TEXT,
-            elapsed_time REAL
-        )
-        """
-    )
-    conn.commit()
-    conn.close()
-
-
-# Добавляет данные о производительности в базу данных SQLite
-def log_to_database(db_name, cpu_usage, memory_usage, gpu_usage, elapsed_time, commit=False):
-    """
-    Записывает данные о производительности в базу данных.
-
-    Аргументы:
-        db_name (str): Имя файла базы данных SQLite.
-        cpu_usage (float): Загрузка процессора в процентах.
-        memory_usage (float): Использование оперативной памяти в процентах.
-        gpu_usage (str): Информация о загрузке GPU.
-        elapsed_time (float): Время выполнения цикла в секундах.
-        commit (bool): Указывает, следует ли зафиксировать изменения в базе данных.
-    """
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    timestamp = datetime.now().isoformat()
-    cursor.execute(
-        "INSERT INTO performance (timestamp, cpu_usage, memory_usage, gpu_usage, elapsed_time) VALUES (?, ?, ?, ?, ?)",
-        (timestamp, cpu_usage, memory_usage, str(gpu_usage), elapsed_time),
-    )
-    if commit:
-        conn.commit()
-    conn.close()
-
-
-# Функция для сбора данных о производительности
-# Считывает загрузку ЦП, ОЗУ и GPU и сохраняет их в очередь и базу данных
-def collect_performance_data(queue, db_name):
-    """
-    Функция для сбора данных о производительности.
-    Считывает загрузку ЦП, ОЗУ и GPU и сохраняет их в очередь и базу данных.
-
-    Аргументы:
-    queue (multiprocessing.Queue): Очередь для хранения данных о производительности.
-    db_name (str): Имя файла базы данных SQLite.
-
-    Возвращаемое значение:
-    None.
-
-    Примечание:
-    Функция запускается в отдельном процессе и бесконечно считывает данные о производительности,
-    добавляя их в очередь и записывая в базу данных.
-    """
-    setup_database(db_name)
-    while True:
-        start_time = datetime.now()  # Начало измерения времени
 
-        cpu_usage = psutil.cpu_percent(interval=1)
-        memory_usage = psutil.virtual_memory().percent
-        gpus = GPUtil.getGPUs()
-        gpu_usage = [(gpu.name, gpu.load * 100) for gpu in gpus] if gpus else "ГП не найден"
+# Ёмкость кольцевого буфера в отсчётах (час данных при частоте 1 Гц)
+RING_CAPACITY = 3600
 
-        end_time = datetime.now()  # Конец измерения времени
-        elapsed_time = (end_time - start_time).total_seconds()  # Время выполнения одного цикла
-
-        data = {
-            "timestamp": datetime.now().isoformat(),
-            "cpu_usage": cpu_usage,
-            "memory_usage": memory_usage,
-            "gpu_usage": gpu_usage,
-            "cycle_time": elapsed_time,
-        }
-
-        # Добавление данных в очередь
-        queue.put(data)
-
-        # Запись в базу данных
-        log_to_database(db_name, cpu_usage, memory_usage, gpu_usage, elapsed_time, commit=True)
-
-        print(f"Время выполнения цикла: {elapsed_time:.4f} секунд")
+# Частота опроса в Гц (от 0.1 до 10)
+SAMPLE_RATE = 1.0
 
 
 # Основное приложение
@@ -125,15 +34,25 @@ class MultiprocessingLoggerApp(QMainWindow):
         """
         super().__init__()
         self.setWindowTitle("Логгер на основе Multiprocessing")
-        self.setGeometry(100, 100, 300, 200)
+        self.setGeometry(100, 100, 600, 400)
 
-        self.queue = multiprocessing.Queue()
-        self.logging_process = None
+        # Кольцевой буфер в разделяемой памяти для передачи отсчётов из процесса сбора
+        self.ring = SharedRingBuffer.create(capacity=RING_CAPACITY)
+        self.last_seq = 0
+        self.lost_samples = 0
         self.db_name = "multiprocessing_logger.db"
+        self.rate = SAMPLE_RATE
+        # Отсчёты для графика копируются из разделяемой памяти в кольцо интерфейса пачками
+        self.samples = SampleRing(int(CHART_MINUTES * 60 * self.rate))
+        # Сбор данных выполняет общее ядро в отдельном процессе, отсчёты приходят через кольцевой буфер
+        self.backend = ProcessBackend(self.db_name, rate=self.rate, ring_name=self.ring.name)
+        # Старые отсчёты сворачиваются в агрегаты и удаляются в фоновом потоке главного процесса
+        self.retention = Retention(self.db_name)
 
         # Элементы интерфейса
         self.label_status = QLabel("Логирование: выключено", self)
         self.label_data = QLabel("Данные: Нет данных", self)
+        self.chart = LiveChart(self.samples)
         self.button_start_log = QPushButton("Включить лог", self)
         self.button_stop_log = QPushButton("Отключить лог", self)
 
@@ -141,6 +60,7 @@ class MultiprocessingLoggerApp(QMainWindow):
         layout = QVBoxLayout()
         layout.addWidget(self.label_status)
         layout.addWidget(self.label_data)
+        layout.addWidget(self.chart)
         layout.addWidget(self.button_start_log)
         layout.addWidget(self.button_stop_log)
 
@@ -167,12 +87,10 @@ class MultiprocessingLoggerApp(QMainWindow):
         Returns:
         None.
         """
-        if self.logging_process is None or not self.logging_process.is_alive():
+        if not self.backend.is_running():
             self.label_status.setText("Логирование: включено")
-            self.logging_process = multiprocessing.Process(
-                target=collect_performance_data, args=(self.queue, self.db_name)
-            )
-            self.logging_process.start()
+            self.backend.start()
+            self.retention.start()
             self.timer.start(1000)  # Обновление интерфейса каждую секунду
 
     # Останавливает процесс логирования и обновляет статус интерфейса
@@ -186,17 +104,22 @@ class MultiprocessingLoggerApp(QMainWindow):
         Returns:
         None.
         """
-        if self.logging_process and self.logging_process.is_alive():
-            self.logging_process.terminate()
-            self.logging_process.join()
-        self.logging_process = None
+        # Процесс сначала просят завершиться самому, чтобы он успел сбросить буфер в базу
+        self.backend.stop(timeout=5)
+        self.retention.stop()
         self.label_status.setText("Логирование: выключено")
         self.timer.stop()
+        if self.backend.verbose:
+            print(self.backend.timings.report())
 
-    # Обновляет данные на пользовательском интерфейсе, получая их из очереди
+    # Обновляет данные на пользовательском интерфейсе, читая последний отсчёт из кольцевого буфера
     def update_ui(self):
         """
-        Метод для обновления данных на пользовательском интерфейсе, получая их из очереди.
+        Метод для обновления данных на пользовательском интерфейсе.
+        Копирует новые отсчёты кольцевого буфера (не больше, чем помещается на графике)
+        в кольцо графика одной векторной операцией и показывает только последний отсчёт;
+        по счётчику последовательности учитывает отсчёты, перезаписанные до того,
+        как интерфейс успел их прочитать. Если новых отсчётов нет, ничего не перерисовывается.
 
         Args:
         self: Объект класса MultiprocessingLoggerApp.
@@ -204,11 +127,42 @@ class MultiprocessingLoggerApp(QMainWindow):
         Returns:
         None.
         """
-        while not self.queue.empty():
-            data = self.queue.get()
+        segments, seq, lost = self.ring.read_since(self.last_seq, limit=self.samples.capacity)
+        if seq == self.last_seq:
+            return
+        self.last_seq = seq
+        self.lost_samples += lost
+        # Этап gui_update записывается в гистограммы процесса интерфейса (этапы сбора — в процессе сбора);
+        # график перерисовывается сразу (repaint), чтобы в этап входила и отрисовка
+        with self.backend.timings.measure("gui_update"):
+            for segment in segments:
+                self.samples.push_records(segment)
+            data = self.ring.newest()
+            if data is None:
+                return
+            gpu = ", ".join(f"{load:.0f}%" for load in data["gpu_load"]) or "ГП не найден"
             self.label_data.setText(
-                f"Данные: CPU {data['cpu_usage']}%, RAM {data['memory_usage']}%, GPU {data['gpu_usage']}"
+                f"Данные: CPU {data['cpu_usage']}%, RAM {data['memory_usage']}%, GPU {gpu}"
             )
+            self.chart.repaint()
+
+    # Останавливает логирование и освобождает разделяемую память при закрытии окна
+    def closeEvent(self, event):
+        """
+        Метод, вызываемый при закрытии окна: останавливает процесс логирования
+        и удаляет сегмент разделяемой памяти.
+
+        Args:
+        self: Объект класса MultiprocessingLoggerApp.
+        event (QCloseEvent): Событие закрытия окна.
+
+        Returns:
+        None.
+        """
+        self.stop_logging()
+        self.ring.close()
+        self.ring.unlink()
+        super().closeEvent(event)
 
 
 # Основной блок
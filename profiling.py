@@ -0,0 +1,206 @@
+"""
+Профилирование по запросу: cProfile для цикла сборщика и отдельных запросов веб-просмотра.
+
+Профилирование включается переменной окружения LOGGER_PROFILE=1 (флаг --profile сборщика
+выставляет её же, поэтому она доходит и до процесса сбора backend'а process) или для одного
+запроса веб-просмотра параметром ?profile=1 — только если владелец сервера разрешил это переменной
+LOGGER_PROFILE_PARAM=1 (иначе любой посетитель мог бы нагружать сервер профилированием). Профили сохраняются в папку LOGGER_PROFILE_DIR
+(по умолчанию profiles/) файлами pstats; хранится не больше MAX_PROFILES последних файлов
+каждого вида, старые удаляются. Страница /profiles веб-просмотра показывает top-N функций.
+
+Когда профилирование выключено, цикл сборщика и обработка запроса платят одну проверку
+(profiler is not None / if не выставлен флаг).
+"""
+
+import cProfile
+import os
+import re
+import time
+from datetime import datetime
+
+
+# Переменные окружения: включение профилирования и папка для профилей
+PROFILE_ENV = "LOGGER_PROFILE"
+PROFILE_DIR_ENV = "LOGGER_PROFILE_DIR"
+# Разрешение профилировать отдельные запросы веб-просмотра параметром ?profile=1
+PROFILE_PARAM_ENV = "LOGGER_PROFILE_PARAM"
+
+# Папка для профилей по умолчанию
+PROFILE_DIR = "profiles"
+
+# Сколько последних профилей каждого вида хранится
+MAX_PROFILES = 50
+
+# Длительность одного профиля цикла сборщика, сек.
+PROFILE_WINDOW = 60.0
+
+# Количество функций в сводке по умолчанию и допустимые сортировки
+DEFAULT_TOP = 30
+SORT_KEYS = {"cumulative": "cumtime", "tottime": "tottime", "calls": "ncalls"}
+
+# Виды профилей (первая часть имени файла)
+PROFILE_KINDS = ("collector", "request")
+
+
+def profiling_enabled():
+    """
+    Включено ли профилирование переменной окружения LOGGER_PROFILE.
+    """
+    return os.environ.get(PROFILE_ENV, "") not in ("", "0")
+
+
+def profile_param_enabled():
+    """
+    Разрешено ли переменной окружения LOGGER_PROFILE_PARAM профилировать запрос параметром ?profile=1.
+    """
+    return os.environ.get(PROFILE_PARAM_ENV, "") not in ("", "0")
+
+
+def profile_dir():
+    """
+    Папка для профилей (LOGGER_PROFILE_DIR или PROFILE_DIR).
+    """
+    return os.environ.get(PROFILE_DIR_ENV) or PROFILE_DIR
+
+
+def save_profile(profile, kind, label, directory=None, keep=MAX_PROFILES):
+    """
+    Сохраняет профиль в файл <kind>-<время>-<label>.prof и удаляет старые профили того же вида.
+
+    Аргументы:
+        profile (cProfile.Profile): Остановленный профилировщик.
+        kind (str): Вид профиля из PROFILE_KINDS.
+        label (str): Краткое описание (имя базы, адрес запроса); лишние символы заменяются на "_".
+        directory (str | None): Папка; по умолчанию profile_dir().
+        keep (int): Сколько последних профилей вида kind оставить.
+
+    Возвращает:
+        str: Путь к сохранённому файлу.
+    """
+    directory = directory or profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    label = re.sub(r"[^\w.-]+", "_", label).strip("_")[:60] or "profile"
+    name = f"{kind}-{datetime.now():%Y%m%d-%H%M%S-%f}-{label}.prof"
+    path = os.path.join(directory, name)
+    profile.dump_stats(path)
+    for old in list_profiles(directory, kind)[keep:]:
+        try:
+            os.remove(os.path.join(directory, old))
+        except OSError:
+            pass
+    return path
+
+
+def list_profiles(directory=None, kind=None):
+    """
+    Имена файлов профилей в папке, новые первыми (время входит в имя файла).
+    """
+    directory = directory or profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    prefix = f"{kind}-" if kind else ""
+    names = [
+        name
+        for name in os.listdir(directory)
+        if name.endswith(".prof") and name.startswith(prefix) and name.split("-", 1)[0] in PROFILE_KINDS
+    ]
+    return sorted(names, key=lambda name: name.split("-", 1)[1], reverse=True)
+
+
+def hotspots(paths, top=DEFAULT_TOP, sort="cumulative"):
+    """
+    Сводка top-N функций по одному или нескольким профилям (статистика складывается).
+
+    Аргументы:
+        paths (list): Пути к файлам профилей.
+        top (int): Количество функций.
+        sort (str): Ключ сортировки из SORT_KEYS.
+
+    Возвращает:
+        dict: {"total_time": суммарное время, "calls": число вызовов, "functions": [{"function",
+            "location", "ncalls", "primitive", "tottime", "cumtime", "percall"}, ...]}.
+    """
+    # pstats нужен только странице профилей, сборщик его не загружает
+    import pstats
+
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Неизвестная сортировка: {sort}")
+    stats = pstats.Stats(*paths)
+    rows = []
+    for (filename, line, function), (primitive, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append(
+            {
+                "function": function,
+                "location": f"{filename}:{line}" if line else filename,
+                "ncalls": ncalls,
+                "primitive": primitive,
+                "tottime": tottime,
+                "cumtime": cumtime,
+                "percall": cumtime / ncalls if ncalls else 0.0,
+            }
+        )
+    rows.sort(key=lambda row: row[SORT_KEYS[sort]], reverse=True)
+    return {"total_time": stats.total_tt, "calls": stats.total_calls, "functions": rows[:top]}
+
+
+class CycleProfiler:
+    """
+    Профилирование цикла сборщика окнами по window секунд: профиль каждого окна
+    сохраняется отдельным файлом (с наибольшим временем цикла в окне в имени),
+    поэтому всплеск времени цикла можно найти и разобрать по времени.
+
+    cProfile профилирует поток, в котором вызван start(), — поток цикла сбора
+    (для asyncio — поток цикла событий).
+
+    Атрибуты:
+        label (str): Подпись профилей (например, имя базы).
+        window (float): Длительность одного профиля, сек.
+        directory (str): Папка для профилей.
+    """
+
+    def __init__(self, label, window=PROFILE_WINDOW, directory=None):
+        self.label = label
+        self.window = window
+        self.directory = directory or profile_dir()
+        self.saved = 0
+        self._profile = None
+        self._window_end = 0.0
+        self._max_cycle = 0.0
+
+    @classmethod
+    def from_env(cls, label):
+        """
+        CycleProfiler, если профилирование включено переменной окружения, иначе None.
+        """
+        return cls(label) if profiling_enabled() else None
+
+    def start(self):
+        self._profile = cProfile.Profile()
+        self._window_end = time.monotonic() + self.window
+        self._max_cycle = 0.0
+        self._profile.enable()
+        return self
+
+    def tick(self, cycle_time):
+        """
+        Вызывается в конце каждого цикла: учитывает время цикла и по окончании окна
+        сохраняет профиль и начинает следующий.
+        """
+        self._max_cycle = max(self._max_cycle, cycle_time)
+        if time.monotonic() >= self._window_end:
+            self.stop()
+            self.start()
+
+    def stop(self):
+        """
+        Останавливает профилировщик и сохраняет профиль текущего окна.
+        """
+        if self._profile is None:
+            return
+        self._profile.disable()
+        save_profile(self._profile, "collector", f"{self.label}-max{self._max_cycle * 1000:.1f}ms", self.directory)
+        self.saved += 1
+        self._profile = None
+
+    def report(self):
+        return f"Профилирование: сохранено профилей {self.saved} в {self.directory}"
@@ -0,0 +1,313 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+from schema import EXTENDED_METRICS, UPDATE_ID_MARK_SQL, ensure_schema
+
+
+# Сколько дней хранятся исходные отсчёты и минутные агрегаты; часовые агрегаты хранятся всегда
+RAW_RETENTION_DAYS = 7.0
+MINUTE_RETENTION_DAYS = 90.0
+
+# Разрешения агрегатов удаляемых отсчётов, мкс: минута и час
+MINUTE_US = 60_000_000
+HOUR_US = 3_600_000_000
+
+# Период проверки базы, с
+RETENTION_INTERVAL = 60.0
+
+# Отсчётов, удаляемых одной транзакцией, и пауза между транзакциями, с: сборщик
+# успевает записать свои данные между пачками
+RETENTION_BATCH = 2000
+RETENTION_PAUSE = 0.05
+
+# Страниц, возвращаемых файловой системе за один вызов PRAGMA incremental_vacuum
+VACUUM_PAGES = 1000
+
+DAY_US = 86_400_000_000
+
+# Метрики отсчёта в порядке столбцов _BATCH_QUERY (после id и времени)
+_METRICS = ("cpu", "memory", "elapsed_time", "gpu", *EXTENDED_METRICS)
+
+# Самые старые отсчёты до границы хранения вместе со всеми метриками
+_BATCH_QUERY = f"""
+SELECT p.id, p.timestamp, p.cpu_usage, p.memory_usage, p.elapsed_time,
+       (SELECT MAX(g.load) FROM gpu_samples AS g WHERE g.sample_id = p.id),
+       {", ".join(f"s.{metric}" for metric in EXTENDED_METRICS)}
+FROM performance AS p
+LEFT JOIN system_samples AS s ON s.sample_id = p.id
+WHERE p.timestamp < ?
+ORDER BY p.timestamp
+LIMIT ?
+"""
+
+# Корзина может собираться из нескольких пачек: агрегаты объединяются с уже записанными
+_UPSERT_ROLLUP_SQL = """
+INSERT INTO sample_rollups (resolution, bucket, metric, count, min, avg, max) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (resolution, bucket, metric) DO UPDATE SET
+    avg = (avg * count + excluded.avg * excluded.count) / (count + excluded.count),
+    count = count + excluded.count,
+    min = MIN(min, excluded.min),
+    max = MAX(max, excluded.max)
+"""
+
+# Таблицы, в которых хранятся данные удаляемых отсчётов
+_SAMPLE_TABLES = (
+    ("gpu_samples", "sample_id"),
+    ("cpu_cores", "sample_id"),
+    ("system_samples", "sample_id"),
+    ("process_samples", "sample_id"),
+    ("performance", "id"),
+)
+
+
+class Retention:
+    """
+    Срок хранения данных сборщика: фоновое прореживание базы.
+
+    Раз в interval секунд отсчёты старше raw_days дней сворачиваются в минутные
+    и часовые агрегаты (min/avg/max, таблица sample_rollups) и удаляются вместе
+    с GPU и дополнительными метриками, а также из столбцового архива (archive.prune_archive).
+    Удаление идёт пачками по batch_size отсчётов, каждая пачка — короткая отдельная
+    транзакция, поэтому сборщик, пишущий в ту же базу, ждёт не дольше одной пачки.
+    Минутные агрегаты старше minute_days дней удаляются, часовые хранятся всегда. Освободившиеся страницы возвращаются
+    файловой системе через PRAGMA incremental_vacuum (для баз, созданных с
+    auto_vacuum = INCREMENTAL; старые базы переводятся на него командой
+    python -m retention --vacuum).
+
+    Работает в своём потоке со своим соединением и не блокирует цикл сбора.
+
+    Атрибуты:
+        db_name (str): Файл базы данных SQLite.
+        raw_days (float): Срок хранения исходных отсчётов в днях.
+        minute_days (float): Срок хранения минутных агрегатов в днях.
+        interval (float): Период проверки в секундах.
+        batch_size (int): Отсчётов в одной транзакции удаления.
+    """
+
+    def __init__(
+        self,
+        db_name,
+        raw_days=RAW_RETENTION_DAYS,
+        minute_days=MINUTE_RETENTION_DAYS,
+        interval=RETENTION_INTERVAL,
+        batch_size=RETENTION_BATCH,
+    ):
+        self.db_name = db_name
+        self.raw_days = raw_days
+        self.minute_days = minute_days
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Статистика прореживания
+        self.passes = 0
+        self.samples_removed = 0
+        self.rollups_removed = 0
+        self.pages_freed = 0
+        self.segments_pruned = 0
+        self.busy_time = 0.0
+        self.failures = 0
+
+    def _remove_batch(self, conn, cutoff):
+        """
+        Сворачивает в агрегаты и удаляет одну пачку самых старых отсчётов.
+
+        Возвращает:
+            int: Количество удалённых отсчётов.
+        """
+        # numpy и агрегаты загружаются при первой пачке в фоновом потоке, а не при импорте:
+        # сборщик начинает опрос, не дожидаясь их
+        import numpy as np
+
+        from rollup_cache import compute_rollup
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(_BATCH_QUERY, (cutoff, self.batch_size)).fetchall()
+            if rows:
+                data = np.array([row[1:] for row in rows], dtype=np.float64)
+                timestamps = data[:, 0]
+                rollups = []
+                for column, metric in enumerate(_METRICS, start=1):
+                    for resolution in (MINUTE_US, HOUR_US):
+                        rollup = compute_rollup(timestamps, data[:, column], resolution)
+                        rollups.extend(
+                            zip(
+                                [resolution] * len(rollup["bucket"]),
+                                rollup["bucket"].astype(np.int64).tolist(),
+                                [metric] * len(rollup["bucket"]),
+                                rollup["count"].tolist(),
+                                rollup["min"].tolist(),
+                                rollup["avg"].tolist(),
+                                rollup["max"].tolist(),
+                            )
+                        )
+                conn.executemany(_UPSERT_ROLLUP_SQL, rollups)
+
+                # Отметка сохраняет наибольший id: после удаления всех отсчётов новые не начнутся с 1
+                conn.execute(UPDATE_ID_MARK_SQL, (max(row[0] for row in rows),))
+                conn.execute("DELETE FROM temp.retention_ids")
+                conn.executemany("INSERT INTO temp.retention_ids (id) VALUES (?)", ((row[0],) for row in rows))
+                for table, column in _SAMPLE_TABLES:
+                    conn.execute(f"DELETE FROM {table} WHERE {column} IN (SELECT id FROM temp.retention_ids)")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def _vacuum(self, conn):
+        """
+        Возвращает свободные страницы файловой системе порциями по VACUUM_PAGES.
+        """
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+        freed = 0
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free and not self._stop_event.is_set():
+            # executescript выполняет прагму до конца (execute освобождает только одну страницу)
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES})")
+            left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if left >= free:
+                break
+            freed += free - left
+            free = left
+            self._stop_event.wait(RETENTION_PAUSE)
+        return freed
+
+    def prune(self, now=None):
+        """
+        Выполняет одну проверку: сворачивает и удаляет старые отсчёты,
+        удаляет старые минутные агрегаты и освобождает место в файле.
+
+        Аргументы:
+            now (int | None): Текущее время в микросекундах (по умолчанию — системное).
+
+        Возвращает:
+            int: Количество удалённых отсчётов.
+        """
+        if not os.path.exists(self.db_name):
+            return 0
+        started = time.perf_counter()
+        now = int(time.time() * 1_000_000) if now is None else now
+        # Граница выравнивается по часу: часовые корзины собираются из отсчётов целиком
+        cutoff = (now - int(self.raw_days * DAY_US)) // HOUR_US * HOUR_US
+
+        ensure_schema(self.db_name)
+        conn = sqlite3.connect(self.db_name, timeout=30)
+        conn.isolation_level = None
+        removed = 0
+        try:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS retention_ids (id INTEGER PRIMARY KEY)")
+            while not self._stop_event.is_set():
+                count = self._remove_batch(conn, cutoff)
+                removed += count
+                if count < self.batch_size:
+                    break
+                self._stop_event.wait(RETENTION_PAUSE)
+
+            rollups = conn.execute(
+                "DELETE FROM sample_rollups WHERE resolution = ? AND bucket < ?",
+                (MINUTE_US, now - int(self.minute_days * DAY_US)),
+            ).rowcount
+            # Удалённые отсчёты убираются и из столбцового архива, если он есть (archive.py)
+            from archive import prune_archive
+
+            self.segments_pruned += prune_archive(conn, self.db_name, cutoff)
+            self.pages_freed += self._vacuum(conn)
+        finally:
+            conn.close()
+
+        self.passes += 1
+        self.samples_removed += removed
+        self.rollups_removed += rollups
+        self.busy_time += time.perf_counter() - started
+        return removed
+
+    def _prune_quietly(self):
+        try:
+            self.prune()
+        except (OSError, sqlite3.Error) as e:
+            # База занята дольше тайм-аута — попробуем на следующей проверке
+            self.failures += 1
+            print(f"Не удалось удалить старые отсчёты из {self.db_name}: {e}")
+
+    def _run(self):
+        self._prune_quietly()
+        while not self._stop_event.wait(self.interval):
+            self._prune_quietly()
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Останавливает фоновую проверку (текущая пачка дописывается до конца).
+        """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def report(self):
+        """
+        Формирует строку со статистикой прореживания для вывода в консоль.
+        """
+        return (
+            f"Срок хранения {self.db_name}: {self.raw_days:g} дн., удалено отсчётов {self.samples_removed}, "
+            f"минутных агрегатов {self.rollups_removed}, сегментов архива {self.segments_pruned}, "
+            f"освобождено страниц {self.pages_freed} "
+            f"за {self.passes} проверок ({self.busy_time:.2f} с), неудачных {self.failures}"
+        )
+
+
+def enable_incremental_vacuum(db_name):
+    """
+    Переводит существующую базу на auto_vacuum = INCREMENTAL.
+
+    Требует полного VACUUM (база переписывается целиком и на это время блокируется),
+    поэтому выполняется вручную, когда сборщик не запущен.
+    """
+    conn = sqlite3.connect(db_name)
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Удаление старых отсчётов со сворачиванием в агрегаты")
+    parser.add_argument("db", nargs="+", help="базы данных сборщика")
+    parser.add_argument("--raw-days", type=float, default=RAW_RETENTION_DAYS, help="срок хранения отсчётов, дн.")
+    parser.add_argument(
+        "--minute-days", type=float, default=MINUTE_RETENTION_DAYS, help="срок хранения минутных агрегатов, дн."
+    )
+    parser.add_argument(
+        "--vacuum", action="store_true", help="перевести базу на инкрементальную очистку (полный VACUUM)"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    for db_name in args.db:
+        if args.vacuum:
+            enable_incremental_vacuum(db_name)
+        retention = Retention(db_name, raw_days=args.raw_days, minute_days=args.minute_days)
+        retention.prune()
+        print(retention.report())
+
+
+if __name__ == "__main__":
+    main()
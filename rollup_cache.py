@@ -0,0 +1,434 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from archive import read_series
+from series import MAX_TIME, METRIC_QUERIES, MIN_TIME
+
+
+# Разрешения агрегатов в микросекундах: 1 секунда, 1 минута, 1 час
+RESOLUTIONS = (1_000_000, 60_000_000, 3_600_000_000)
+
+# Статистики, которые хранятся для каждой корзины
+STATS = ("min", "avg", "max", "p95")
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    metric TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    min REAL,
+    avg REAL,
+    max REAL,
+    p95 REAL,
+    PRIMARY KEY (metric, resolution, bucket)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS resolutions (
+    metric TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    PRIMARY KEY (metric, resolution)
+) WITHOUT ROWID
+"""
+
+# Разрешение сохраняется, только если сокращает число точек хотя бы во столько раз
+# (например, секундные агрегаты для данных с частотой 1 Гц ничего не дают)
+MIN_REDUCTION = 2
+
+# Не чаще раза в столько секунд агрегаты изменившейся базы пересобираются в фоне (хранилища хостов
+# меняются с каждой пачкой агента — до этого запросы обслуживаются предыдущей версией агрегатов)
+REBUILD_INTERVAL = 30.0
+
+# Разрешение выбирается с запасом точек, дальше ряд прореживается до points (LTTB/minmax)
+OVERSAMPLE = 4
+
+
+def file_state(db_path):
+    """
+    Версия файла базы для ключей кэшей: размер и время изменения самого файла и его журнала -wal.
+
+    В режиме WAL новые строки остаются в файле -wal до контрольной точки (а пока открыто
+    хотя бы одно соединение, например живой поток, она может не наступать долго),
+    поэтому по одному основному файлу изменение не видно.
+
+    Возвращает:
+        tuple: (размер, время изменения в нс, размер -wal, время изменения -wal в нс);
+            для отсутствующего -wal — нули.
+    """
+    stat = os.stat(db_path)
+    try:
+        wal = os.stat(db_path + "-wal")
+        wal_state = (wal.st_size, wal.st_mtime_ns)
+    except FileNotFoundError:
+        wal_state = (0, 0)
+    return (stat.st_size, stat.st_mtime_ns, *wal_state)
+
+
+def compute_rollup(timestamps, values, resolution):
+    """
+    Вычисляет агрегаты ряда по корзинам фиксированной длины.
+
+    Расчёт полностью векторизован: корзины находятся по смене номера корзины,
+    min/max/сумма считаются через reduceat, а p95 — по значениям, отсортированным
+    внутри корзин одним lexsort.
+
+    Аргументы:
+        timestamps (numpy.ndarray): Время в микросекундах, по возрастанию.
+        values (numpy.ndarray): Значения метрики.
+        resolution (int): Длина корзины в микросекундах.
+
+    Возвращает:
+        dict: Массивы bucket (начало корзины в мкс), count, min, avg, max, p95.
+    """
+    mask = ~np.isnan(values)
+    timestamps, values = timestamps[mask], values[mask]
+    if len(values) == 0:
+        return {name: np.empty(0) for name in ("bucket", "count", *STATS)}
+
+    buckets = (timestamps // resolution).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(buckets)])
+
+    # Внутри каждой корзины сортируем значения, чтобы взять 95-й процентиль по индексу
+    sorted_values = values[np.lexsort((values, buckets))]
+    p95_positions = starts + np.ceil(0.95 * counts).astype(np.int64) - 1
+
+    return {
+        "bucket": buckets[starts] * resolution,
+        "count": counts,
+        "min": np.minimum.reduceat(values, starts),
+        "avg": np.add.reduceat(values, starts) / counts,
+        "max": np.maximum.reduceat(values, starts),
+        "p95": sorted_values[p95_positions],
+    }
+
+
+def build_rollups(db_path, rollup_path):
+    """
+    Строит файл агрегатов для базы данных схемы v2.
+
+    Файл сначала пишется под временным именем и затем атомарно переименовывается,
+    поэтому читатели никогда не видят недостроенный кэш. Разрешения, которые почти
+    не сокращают число точек, не сохраняются. Закрытые сегменты читаются из столбцового
+    архива (archive.py), если он уже построен.
+
+    Аргументы:
+        db_path (str): Путь к базе данных с отсчётами.
+        rollup_path (str): Путь к создаваемому файлу агрегатов.
+    """
+    tmp_path = f"{rollup_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    target = sqlite3.connect(tmp_path)
+    try:
+        target.executescript(ROLLUP_SCHEMA)
+        with target:
+            for metric in METRIC_QUERIES:
+                timestamps, values = read_series(source, db_path, metric)
+                for resolution in RESOLUTIONS:
+                    rollup = compute_rollup(timestamps, values, resolution)
+                    if len(rollup["bucket"]) * MIN_REDUCTION > len(values):
+                        continue
+                    target.execute("INSERT INTO resolutions (metric, resolution) VALUES (?, ?)", (metric, resolution))
+                    target.executemany(
+                        "INSERT INTO rollups (metric, resolution, bucket, count, min, avg, max, p95) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        zip(
+                            [metric] * len(rollup["bucket"]),
+                            [resolution] * len(rollup["bucket"]),
+                            rollup["bucket"].tolist(),
+                            rollup["count"].tolist(),
+                            rollup["min"].tolist(),
+                            rollup["avg"].tolist(),
+                            rollup["max"].tolist(),
+                            rollup["p95"].tolist(),
+                        ),
+                    )
+    finally:
+        source.close()
+        target.close()
+    os.replace(tmp_path, rollup_path)
+
+
+class RollupCache:
+    """
+    Кэш заранее посчитанных агрегатов (1 с / 1 мин / 1 ч: min/avg/max/p95) для загруженных баз.
+
+    Агрегаты считаются после загрузки (или при первом просмотре) и хранятся в отдельном
+    файле SQLite. Ключ кэша — путь, размер и время изменения файла (и его -wal). Если файл
+    изменился (объединение загрузки, пачка агента), запросы не ждут пересборки: они
+    обслуживаются агрегатами предыдущей версии, а новые строятся в фоновом потоке не чаще
+    раза в rebuild_interval секунд; после сборки агрегаты старой версии удаляются.
+
+    Вытеснение:
+    - на диске — по давности использования, пока суммарный размер файлов больше max_disk_bytes;
+    - в памяти — LRU результатов запросов, суммарно не больше max_memory_bytes.
+
+    Атрибуты:
+        cache_dir (str): Папка для файлов агрегатов.
+        max_disk_bytes (int): Ограничение суммарного размера файлов на диске.
+        max_memory_bytes (int): Ограничение размера результатов в памяти.
+        rebuild_interval (float): Минимальный период фоновой пересборки агрегатов одной базы, с.
+    """
+
+    def __init__(
+        self,
+        cache_dir,
+        max_disk_bytes=512 * 1024 * 1024,
+        max_memory_bytes=64 * 1024 * 1024,
+        rebuild_interval=REBUILD_INTERVAL,
+    ):
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.rebuild_interval = rebuild_interval
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        # Фоновые пересборки: идущие сейчас и время запуска последней для каждой базы
+        self._refreshing = set()
+        self._refreshed = {}
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+
+    @staticmethod
+    def _path_key(db_path):
+        return hashlib.sha1(os.path.abspath(db_path).encode()).hexdigest()[:16]
+
+    def rollup_path(self, db_path):
+        """
+        Возвращает путь к файлу агрегатов для текущей версии базы.
+        """
+        state = hashlib.sha1(":".join(map(str, file_state(db_path))).encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{self._path_key(db_path)}-{state}.rollup.db")
+
+    def ensure(self, db_path, executor=None):
+        """
+        Возвращает путь к файлу агрегатов, при необходимости построив его.
+
+        Одновременные запросы к одной базе строят агрегаты только один раз.
+
+        Аргументы:
+            db_path (str): Путь к базе данных.
+            executor (concurrent.futures.Executor | None): Где строить агрегаты; например,
+                пул процессов, чтобы несколько баз строились параллельно, не деля GIL.
+                По умолчанию — в текущем потоке.
+        """
+        rollup_path = self.rollup_path(db_path)
+        if os.path.exists(rollup_path):
+            os.utime(rollup_path)  # Время использования для вытеснения
+            return rollup_path
+        with self._lock:
+            build_lock = self._build_locks.setdefault(rollup_path, threading.Lock())
+        with build_lock:
+            if not os.path.exists(rollup_path):
+                if executor is None:
+                    build_rollups(db_path, rollup_path)
+                else:
+                    executor.submit(build_rollups, db_path, rollup_path).result()
+                # Старая версия удаляется только после сборки: до этого ею обслуживаются запросы
+                self._remove_stale(db_path, rollup_path)
+                self._evict_disk(keep=rollup_path)
+        with self._lock:
+            self._build_locks.pop(rollup_path, None)
+        return rollup_path
+
+    def current(self, db_path, executor=None):
+        """
+        Возвращает путь к файлу агрегатов, не дожидаясь пересборки изменившейся базы.
+
+        Если агрегаты текущей версии уже есть — возвращает их. Если есть только агрегаты
+        предыдущей версии — возвращает их и запускает фоновую пересборку (refresh_async).
+        Агрегаты строятся в текущем потоке (ensure) только для базы, у которой их ещё нет совсем.
+        """
+        rollup_path = self.rollup_path(db_path)
+        if os.path.exists(rollup_path):
+            os.utime(rollup_path)  # Время использования для вытеснения
+            return rollup_path
+        stale_path = self._stale_path(db_path)
+        if stale_path is None:
+            return self.ensure(db_path, executor)
+        self.refresh_async(db_path)
+        return stale_path
+
+    def _stale_path(self, db_path):
+        """
+        Самый свежий файл агрегатов предыдущих версий базы или None.
+        """
+        prefix = self._path_key(db_path) + "-"
+        stale = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix) and name.endswith(".rollup.db"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stale.append((os.stat(path).st_mtime, path))
+                except FileNotFoundError:
+                    continue  # Удалён фоновой сборкой
+        return max(stale)[1] if stale else None
+
+    def refresh_async(self, db_path):
+        """
+        Пересобирает агрегаты изменившейся базы в фоновом потоке, если пересборка этой базы
+        сейчас не идёт и с запуска предыдущей прошло не меньше rebuild_interval секунд.
+        """
+        key = os.path.abspath(db_path)
+        now = time.monotonic()
+        with self._lock:
+            last = self._refreshed.get(key)
+            if key in self._refreshing or last is not None and now - last < self.rebuild_interval:
+                return None
+            self._refreshing.add(key)
+            self._refreshed[key] = now
+        thread = threading.Thread(target=self._refresh, args=(db_path, key), daemon=True)
+        thread.start()
+        return thread
+
+    def _refresh(self, db_path, key):
+        try:
+            self._ensure_quietly(db_path)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def ensure_async(self, db_path):
+        """
+        Строит агрегаты в фоновом потоке (например, сразу после загрузки файла).
+        """
+        thread = threading.Thread(target=self._ensure_quietly, args=(db_path,), daemon=True)
+        thread.start()
+        return thread
+
+    def _ensure_quietly(self, db_path):
+        try:
+            self.ensure(db_path)
+        except (OSError, sqlite3.DatabaseError) as e:
+            print(f"Не удалось построить агрегаты для {db_path}: {e}")
+
+    def _remove_stale(self, db_path, rollup_path):
+        """
+        Удаляет агрегаты предыдущих версий того же файла (недостроенные .tmp других сборок не трогает).
+        """
+        prefix = self._path_key(db_path) + "-"
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(prefix) and name.endswith(".rollup.db") and path != rollup_path:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # Уже удалён параллельной сборкой
+        with self._lock:
+            for key in [key for key in self._memory if key[0].startswith(os.path.join(self.cache_dir, prefix))]:
+                self._memory_bytes -= self._memory.pop(key)[1]
+
+    def _evict_disk(self, keep):
+        """
+        Удаляет давно не использованные файлы агрегатов, пока кэш больше max_disk_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".rollup.db"):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            if path != keep:
+                os.remove(path)
+                total -= size
+
+    def query(self, db_path, metric, start=None, end=None, points=None, stat="avg"):
+        """
+        Возвращает ряд метрики из агрегатов с самым мелким разрешением,
+        при котором в диапазон попадает не больше points * OVERSAMPLE корзин.
+        Если для метрики нет ни одного разрешения (отсчётов мало), возвращает None.
+
+        Аргументы:
+            db_path (str): Путь к базе данных.
+            metric (str): Имя метрики.
+            start (int): Начало диапазона в микросекундах.
+            end (int): Конец диапазона в микросекундах.
+            points (int): Желаемое количество точек; 0 или None — самое мелкое разрешение.
+            stat (str): Статистика корзины: min, avg, max или p95.
+
+        Возвращает:
+            dict | None: Массивы x (начала корзин, мкс) и y, разрешение корзины в мкс
+                  и total — количество исходных отсчётов в диапазоне.
+        """
+        if stat not in STATS:
+            raise ValueError(f"Неизвестная статистика: {stat}")
+        rollup_path = self.current(db_path)
+        start = MIN_TIME if start is None else start
+        end = MAX_TIME if end is None else end
+
+        key = (rollup_path, metric, start, end, points, stat)
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                return cached[0]
+
+        try:
+            conn = sqlite3.connect(f"file:{rollup_path}?mode=ro", uri=True)
+        except sqlite3.OperationalError:
+            if os.path.exists(rollup_path):
+                raise
+            # Предыдущую версию только что удалила фоновая сборка — берём новую
+            return self.query(db_path, metric, start, end, points, stat)
+        try:
+            available = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT resolution FROM resolutions WHERE metric = ? ORDER BY resolution", (metric,)
+                )
+            ]
+            if not available:
+                return None
+            resolution = available[-1]
+            if points:
+                for candidate in available:
+                    buckets = conn.execute(
+                        "SELECT COUNT(*) FROM rollups WHERE metric = ? AND resolution = ? AND bucket BETWEEN ? AND ?",
+                        (metric, candidate, max(MIN_TIME, start - candidate + 1), end),
+                    ).fetchone()[0]
+                    if buckets <= points * OVERSAMPLE:
+                        resolution = candidate
+                        break
+            else:
+                resolution = available[0]
+            # Корзина попадает в диапазон, если пересекается с ним
+            rows = conn.execute(
+                f"SELECT bucket, count, {stat} FROM rollups "
+                "WHERE metric = ? AND resolution = ? AND bucket BETWEEN ? AND ? ORDER BY bucket",
+                (metric, resolution, max(MIN_TIME, start - resolution + 1), end),
+            ).fetchall()
+        finally:
+            conn.close()
+
+        data = np.array(rows, dtype=np.float64).reshape(-1, 3)
+        result = {"x": data[:, 0], "y": data[:, 2], "resolution": resolution, "total": int(data[:, 1].sum())}
+        self._remember(key, result, data.nbytes)
+        return result
+
+    def _remember(self, key, result, size):
+        """
+        Сохраняет результат запроса в памяти, вытесняя самые давние результаты.
+        """
+        if size > self.max_memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = (result, size)
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, (_, evicted_size) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted_size
@@ -0,0 +1,171 @@
+import csv
+import io
+import json
+
+from schema import from_epoch_us
+
+
+# Названия столбцов таблицы отсчётов на странице просмотра и при экспорте
+COLUMNS = ("id", "timestamp", "cpu_usage", "memory_usage", "gpu_usage", "elapsed_time")
+
+# Отсчёты вместе с максимальной загрузкой GPU (по всем GPU отсчёта).
+# Условие по id и LIMIT позволяют читать таблицу страницами по первичному ключу.
+_SAMPLES_SELECT = """
+SELECT p.id, p.timestamp, p.cpu_usage, p.memory_usage, MAX(g.load) AS gpu_usage, p.elapsed_time
+FROM performance AS p
+LEFT JOIN gpu_samples AS g ON g.sample_id = p.id
+WHERE p.id {op} ?
+GROUP BY p.id
+ORDER BY p.id {order}
+LIMIT ?
+"""
+NEXT_PAGE_QUERY = _SAMPLES_SELECT.format(op=">", order="ASC")
+PREV_PAGE_QUERY = _SAMPLES_SELECT.format(op="<", order="DESC")
+
+# Самые загруженные процессы среди отсчётов с id в диапазоне (по суммарной загрузке CPU)
+TOP_PROCESSES_QUERY = """
+SELECT pid, name, COUNT(*), AVG(cpu), MAX(cpu), MAX(rss), AVG(io_read), AVG(io_write)
+FROM process_samples
+WHERE sample_id BETWEEN ? AND ?
+GROUP BY pid, name
+ORDER BY SUM(cpu) DESC
+LIMIT ?
+"""
+
+# Средняя и максимальная загрузка каждого ядра CPU среди отсчётов с id в диапазоне
+CORES_QUERY = """
+SELECT core, AVG(usage), MAX(usage)
+FROM cpu_cores
+WHERE sample_id BETWEEN ? AND ?
+GROUP BY core
+ORDER BY core
+"""
+
+# Количество процессов в сводке на странице просмотра
+SUMMARY_PROCESSES = 10
+
+# Размер страницы таблицы по умолчанию и максимальный
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 1000
+
+# Количество строк, читаемых из курсора за один раз при экспорте
+EXPORT_BATCH_SIZE = 1000
+
+# Форматы экспорта и их MIME-типы
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _readable(row):
+    """
+    Переводит время отсчёта в строку ISO для отображения и экспорта.
+    """
+    return (row[0], from_epoch_us(row[1]).isoformat(), *row[2:])
+
+
+def fetch_page(conn, after=None, before=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Возвращает одну страницу отсчётов с навигацией по ключу (keyset pagination).
+
+    Страница выбирается по условию id > after (следующая) или id < before (предыдущая)
+    с LIMIT, поэтому читается только page_size + 1 строк независимо от размера базы.
+
+    Аргументы:
+        conn (sqlite3.Connection): Соединение с базой схемы v2.
+        after (int): Показать строки после этого id.
+        before (int): Показать строки перед этим id.
+        page_size (int): Количество строк на странице.
+
+    Возвращает:
+        dict: rows — строки страницы, prev/next — курсоры соседних страниц (или None).
+    """
+    if before is not None:
+        rows = conn.execute(PREV_PAGE_QUERY, (before, page_size + 1)).fetchall()
+        has_more_before = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_more_after = True
+    else:
+        rows = conn.execute(NEXT_PAGE_QUERY, (after if after is not None else -1, page_size + 1)).fetchall()
+        has_more_after = len(rows) > page_size
+        rows = rows[:page_size]
+        has_more_before = after is not None
+    if not rows:
+        return {"rows": [], "prev": None, "next": None}
+    return {
+        "rows": [_readable(row) for row in rows],
+        "prev": rows[0][0] if has_more_before else None,
+        "next": rows[-1][0] if has_more_after else None,
+    }
+
+
+def page_summary(conn, first_id, last_id, limit=SUMMARY_PROCESSES):
+    """
+    Сводка дополнительных метрик для отсчётов страницы: самые загруженные процессы
+    и загрузка ядер CPU. Запросы идут по первичному ключу (sample_id), поэтому
+    читаются только строки отсчётов страницы.
+
+    Аргументы:
+        conn (sqlite3.Connection): Соединение с базой текущей схемы.
+        first_id (int): id первого отсчёта страницы.
+        last_id (int): id последнего отсчёта страницы.
+        limit (int): Количество процессов в сводке.
+
+    Возвращает:
+        dict: processes — строки (pid, название, отсчётов, CPU ср./макс. %, RSS макс.,
+              чтение и запись байт/с), cores — строки (ядро, загрузка ср./макс. %).
+    """
+    return {
+        "processes": conn.execute(TOP_PROCESSES_QUERY, (first_id, last_id, limit)).fetchall(),
+        "cores": conn.execute(CORES_QUERY, (first_id, last_id)).fetchall(),
+    }
+
+
+def iter_samples(conn, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Перебирает все отсчёты базы, читая курсор пачками.
+
+    Каждая пачка запрашивается отдельным запросом по id, поэтому в памяти
+    одновременно находится не больше batch_size строк.
+
+    Аргументы:
+        conn (sqlite3.Connection): Соединение с базой схемы v2.
+        batch_size (int): Количество строк в пачке.
+
+    Возвращает:
+        generator: Строки отсчётов (время — строка ISO).
+    """
+    last_id = -1
+    while True:
+        rows = conn.execute(NEXT_PAGE_QUERY, (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield _readable(row)
+        last_id = rows[-1][0]
+
+
+def export_lines(conn, fmt):
+    """
+    Формирует экспорт базы построчно в формате CSV или NDJSON.
+
+    Аргументы:
+        conn (sqlite3.Connection): Соединение с базой схемы v2.
+        fmt (str): "csv" или "ndjson".
+
+    Возвращает:
+        generator: Фрагменты текста экспорта (целые строки).
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        for row in iter_samples(conn):
+            writer.writerow(row)
+            # Отдаём накопленный текст, не давая буферу расти
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for row in iter_samples(conn):
+            yield json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n"
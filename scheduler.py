@@ -0,0 +1,154 @@
+import time
+from collections import deque
+
+
+# Допустимый диапазон частоты опроса, Гц
+MIN_RATE = 0.1
+MAX_RATE = 10.0
+
+
+class FixedRateScheduler:
+    """
+    Планировщик циклов сбора данных с фиксированной частотой без накопления сдвига.
+
+    Дедлайны считаются от момента старта по монотонным часам (start + k * period),
+    а не как «пауза после работы», поэтому время опроса и записи не сдвигает
+    последующие отсчёты. Для каждого такта записывается дрожание (насколько позже
+    дедлайна цикл реально проснулся). Если цикл не успел к одному или нескольким
+    дедлайнам, они засчитываются как пропущенные, и планировщик переходит к ближайшему
+    будущему дедлайну, не пытаясь «догнать» пропущенные такты пачкой.
+
+    Атрибуты:
+        rate (float): Частота опроса в Гц (от MIN_RATE до MAX_RATE).
+        period (float): Период между отсчётами в секундах.
+        ticks (int): Количество выполненных тактов.
+        missed (int): Количество пропущенных дедлайнов.
+    """
+
+    def __init__(self, rate=1.0, clock=time.monotonic, history=1024):
+        if not MIN_RATE <= rate <= MAX_RATE:
+            raise ValueError(f"Частота опроса должна быть от {MIN_RATE} до {MAX_RATE} Гц, получено {rate}")
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.clock = clock
+        self.ticks = 0
+        self.missed = 0
+        self._jitter = deque(maxlen=history)
+        self._max_jitter = 0.0
+        self._next_deadline = None
+
+    def start(self):
+        """
+        Задаёт точку отсчёта: первый такт наступает сразу.
+        """
+        self._next_deadline = self.clock()
+        return self
+
+    def delay(self):
+        """
+        Возвращает время в секундах до следующего дедлайна (0, если он уже наступил).
+        """
+        if self._next_deadline is None:
+            self.start()
+        return max(0.0, self._next_deadline - self.clock())
+
+    def wait(self, stop_event=None):
+        """
+        Блокирующе ждёт следующий дедлайн.
+
+        Аргументы:
+            stop_event (threading.Event | multiprocessing.Event): Событие остановки;
+                ожидание прерывается сразу, как только оно установлено.
+
+        Возвращает:
+            bool: True — пора выполнять такт, False — установлено событие остановки.
+        """
+        delay = self.delay()
+        if stop_event is not None:
+            if stop_event.wait(delay) if delay > 0 else stop_event.is_set():
+                return False
+        elif delay > 0:
+            time.sleep(delay)
+        self._tick()
+        return True
+
+    async def wait_async(self, stop_event=None):
+        """
+        Асинхронно ждёт следующий дедлайн (не блокирует цикл событий).
+
+        Аргументы:
+            stop_event (asyncio.Event): Событие остановки; ожидание прерывается сразу,
+                как только оно установлено.
+
+        Возвращает:
+            bool: True — пора выполнять такт, False — установлено событие остановки.
+        """
+        # asyncio нужен только backend'у asyncio, синхронные сборщики его не загружают
+        import asyncio
+
+        delay = self.delay()
+        if stop_event is not None:
+            if stop_event.is_set():
+                return False
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), delay)
+                    return False
+                except asyncio.TimeoutError:
+                    pass
+        elif delay > 0:
+            await asyncio.sleep(delay)
+        self._tick()
+        return True
+
+    def _tick(self):
+        """
+        Фиксирует такт: дрожание, пропущенные дедлайны и следующий дедлайн.
+        """
+        deadline = self._next_deadline
+        now = self.clock()
+        jitter = max(0.0, now - deadline)
+        self._jitter.append(jitter)
+        self._max_jitter = max(self._max_jitter, jitter)
+        self.ticks += 1
+
+        # Дедлайны, которые прошли, пока цикл был занят, считаются пропущенными
+        skipped = int(jitter // self.period)
+        self.missed += skipped
+        self._next_deadline = deadline + (skipped + 1) * self.period
+
+    @property
+    def last_jitter(self):
+        """
+        Дрожание последнего такта в секундах.
+        """
+        return self._jitter[-1] if self._jitter else 0.0
+
+    def stats(self):
+        """
+        Возвращает статистику планировщика.
+
+        Возвращает:
+            dict: Частота, количество тактов и пропусков, среднее, p99
+                  (по последним тактам) и максимальное дрожание в секундах.
+        """
+        recent = sorted(self._jitter)
+        return {
+            "rate": self.rate,
+            "ticks": self.ticks,
+            "missed": self.missed,
+            "jitter_mean": sum(recent) / len(recent) if recent else 0.0,
+            "jitter_p99": recent[min(len(recent) - 1, int(0.99 * len(recent)))] if recent else 0.0,
+            "jitter_max": self._max_jitter,
+        }
+
+    def report(self):
+        """
+        Формирует строку со статистикой планировщика для вывода в консоль.
+        """
+        s = self.stats()
+        return (
+            f"Планировщик: {s['rate']} Гц, {s['ticks']} тактов, пропущено {s['missed']}, "
+            f"дрожание: среднее {s['jitter_mean'] * 1000:.2f} мс, p99 {s['jitter_p99'] * 1000:.2f} мс, "
+            f"макс. {s['jitter_max'] * 1000:.2f} мс"
+        )
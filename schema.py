@@ -0,0 +1,341 @@
+import ast
+import sqlite3
+from datetime import datetime
+
+
+# Текущая версия схемы (хранится в PRAGMA user_version)
+SCHEMA_VERSION = 7
+
+# Схема v2: время — целое число микросекунд от начала эпохи, GPU — в отдельной таблице
+SCHEMA_V2 = """
+CREATE TABLE IF NOT EXISTS performance (
+    id INTEGER PRIMARY KEY,
+    timestamp INTEGER NOT NULL,
+    cpu_usage REAL,
+    memory_usage REAL,
+    elapsed_time REAL
+);
+CREATE INDEX IF NOT EXISTS performance_timestamp ON performance (timestamp);
+CREATE TABLE IF NOT EXISTS gpu_names (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS gpu_samples (
+    sample_id INTEGER NOT NULL,
+    gpu_index INTEGER NOT NULL,
+    name_id INTEGER NOT NULL,
+    load REAL,
+    mem REAL,
+    PRIMARY KEY (sample_id, gpu_index)
+) WITHOUT ROWID;
+"""
+
+# Схема v3: дополнительные метрики (необязательные) — загрузка ядер CPU, диск, сеть,
+# средняя загрузка системы и самые загруженные процессы. Таблицы только добавляются,
+# поэтому база v2 переводится на v3 без переноса данных.
+SCHEMA_V3 = """
+CREATE TABLE IF NOT EXISTS cpu_cores (
+    sample_id INTEGER NOT NULL,
+    core INTEGER NOT NULL,
+    usage REAL,
+    PRIMARY KEY (sample_id, core)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS system_samples (
+    sample_id INTEGER PRIMARY KEY,
+    disk_read REAL,
+    disk_write REAL,
+    net_sent REAL,
+    net_recv REAL,
+    load1 REAL,
+    load5 REAL,
+    load15 REAL,
+    collector_cpu REAL
+);
+CREATE TABLE IF NOT EXISTS process_samples (
+    sample_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    pid INTEGER NOT NULL,
+    name TEXT,
+    cpu REAL,
+    rss INTEGER,
+    io_read REAL,
+    io_write REAL,
+    PRIMARY KEY (sample_id, rank)
+) WITHOUT ROWID;
+"""
+
+# Дополнительные метрики схемы v3 — столбцы system_samples, которые показываются как ряды
+# (есть только в базах, собранных с --extended)
+EXTENDED_METRICS = ("load1", "disk_read", "disk_write", "net_sent", "net_recv", "collector_cpu")
+
+# Схема v4: минутные и часовые агрегаты (min/avg/max) отсчётов, удалённых по сроку хранения
+# (см. retention.py). metric — имя метрики из series.METRIC_QUERIES, bucket — начало корзины в мкс.
+SCHEMA_V4 = """
+CREATE TABLE IF NOT EXISTS sample_rollups (
+    resolution INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    min REAL,
+    avg REAL,
+    max REAL,
+    PRIMARY KEY (resolution, bucket, metric)
+) WITHOUT ROWID;
+"""
+
+# Схема v5: сработавшие оповещения (см. alerts.py)
+SCHEMA_V5 = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    timestamp INTEGER NOT NULL,
+    rule TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL,
+    message TEXT
+);
+"""
+
+# Схема v6: последний снимок времени этапов цикла сборщика в секундах (см. instrumentation.py)
+SCHEMA_V6 = """
+CREATE TABLE IF NOT EXISTS stage_timings (
+    stage TEXT PRIMARY KEY,
+    timestamp INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    mean REAL,
+    p50 REAL,
+    p90 REAL,
+    p99 REAL,
+    max REAL
+);
+"""
+
+# Схема v7: наибольший id удалённого отсчёта. У performance.id нет AUTOINCREMENT, поэтому
+# после удаления всех строк (retention.py) MAX(id) начался бы снова с 1, а агент и возобновление
+# живого потока (Last-Event-ID) рассчитывают на возрастающие id.
+SCHEMA_V7 = """
+CREATE TABLE IF NOT EXISTS sample_id_mark (
+    slot INTEGER PRIMARY KEY CHECK (slot = 0),
+    last_id INTEGER NOT NULL
+);
+"""
+
+# Отметка поднимается до id удаляемых отсчётов и никогда не опускается
+UPDATE_ID_MARK_SQL = """
+INSERT INTO sample_id_mark (slot, last_id) VALUES (0, ?)
+ON CONFLICT (slot) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)
+"""
+
+
+def to_epoch_us(value):
+    """
+    Приводит временную метку к целому числу микросекунд от начала эпохи.
+
+    Аргументы:
+        value (int | float | str | datetime): Метка времени: микросекунды,
+            секунды (float), строка ISO или datetime. Строки и datetime без
+            часового пояса считаются локальным временем, как и в схеме v1.
+
+    Возвращает:
+        int: Микросекунды от начала эпохи.
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value * 1_000_000)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp() * 1_000_000)
+
+
+def from_epoch_us(value):
+    """
+    Преобразует микросекунды от начала эпохи в локальный datetime.
+    """
+    return datetime.fromtimestamp(value / 1_000_000)
+
+
+def parse_gpu_usage(value):
+    """
+    Разбирает значение GPU из схемы v1 или от опроса GPU.
+
+    Аргументы:
+        value (list | str | None): Список пар (название, загрузка) или троек
+            (название, загрузка, память), его str() из схемы v1 либо "ГП не найден".
+
+    Возвращает:
+        list: Список кортежей (название, загрузка, память); память может быть None.
+    """
+    if isinstance(value, str):
+        if not value.startswith("["):
+            return []
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return []
+    if not value:
+        return []
+    parsed = []
+    for item in value:
+        if isinstance(item, dict):
+            parsed.append((item["name"], item["load"], item.get("memory")))
+        else:
+            name, load, *rest = item
+            parsed.append((name, load, rest[0] if rest else None))
+    return parsed
+
+
+def last_sample_id(conn, database="main"):
+    """
+    Наибольший id отсчёта, когда-либо записанного в базу: MAX(id) таблицы performance
+    или отметка sample_id_mark, если отсчёты с большими id уже удалены.
+
+    Аргументы:
+        conn (sqlite3.Connection): Соединение с базой текущей схемы.
+        database (str): Имя базы в соединении (main или подключённая через ATTACH).
+
+    Возвращает:
+        int: Последний id (0, если отсчётов ещё не было); новые отсчёты получают id больше него.
+    """
+    return conn.execute(
+        f"SELECT MAX(COALESCE((SELECT MAX(id) FROM {database}.performance), 0), "
+        f"COALESCE((SELECT last_id FROM {database}.sample_id_mark), 0))"
+    ).fetchone()[0]
+
+
+def schema_version(conn):
+    """
+    Определяет версию схемы базы данных.
+
+    Возвращает:
+        int: 0 — таблицы performance нет, 1 — старая схема, 2 и выше — номер версии.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version:
+        return version
+    columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(performance)")}
+    if not columns:
+        return 0
+    # Базы v1 не выставляли user_version, но хранили время и GPU в виде текста
+    if "gpu_usage" in columns or columns.get("timestamp", "").upper() == "TEXT":
+        return 1
+    return 2
+
+
+class GpuNameCache:
+    """
+    Кэш идентификаторов названий GPU (интернирование строк в таблице gpu_names).
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._ids = {name: name_id for name_id, name in conn.execute("SELECT id, name FROM gpu_names")}
+
+    def get(self, name):
+        """
+        Возвращает идентификатор названия GPU, добавляя название в таблицу при необходимости.
+        """
+        name_id = self._ids.get(name)
+        if name_id is None:
+            self._conn.execute("INSERT OR IGNORE INTO gpu_names (name) VALUES (?)", (name,))
+            name_id = self._conn.execute("SELECT id FROM gpu_names WHERE name = ?", (name,)).fetchone()[0]
+            self._ids[name] = name_id
+        return name_id
+
+
+def _create_tables(conn):
+    """
+    Создаёт таблицы текущей схемы в текущей транзакции.
+    """
+    for statement in (SCHEMA_V2 + SCHEMA_V3 + SCHEMA_V4 + SCHEMA_V5 + SCHEMA_V6 + SCHEMA_V7).split(";"):
+        if statement.strip():
+            conn.execute(statement)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def create_schema(conn):
+    """
+    Создаёт таблицы текущей схемы и выставляет номер версии.
+    """
+    with conn:
+        _create_tables(conn)
+
+
+def _upgrade_v1(conn, batch_size=5000):
+    """
+    Переносит данные из таблицы performance схемы v1 в текущую схему.
+
+    Строки читаются курсором и переносятся пачками, поэтому память не зависит
+    от размера базы. Идентификаторы строк сохраняются. Всё обновление выполняется
+    одной транзакцией: при ошибке база остаётся в схеме v1.
+    """
+    conn.isolation_level = None
+    conn.execute("BEGIN")
+    try:
+        conn.execute("ALTER TABLE performance RENAME TO performance_v1")
+        _create_tables(conn)
+        names = GpuNameCache(conn)
+        source = conn.cursor()
+        source.execute(
+            "SELECT id, timestamp, cpu_usage, memory_usage, gpu_usage, elapsed_time FROM performance_v1 ORDER BY id"
+        )
+        while True:
+            rows = source.fetchmany(batch_size)
+            if not rows:
+                break
+            samples = []
+            gpu_rows = []
+            for row_id, timestamp, cpu_usage, memory_usage, gpu_usage, elapsed_time in rows:
+                samples.append((row_id, to_epoch_us(timestamp), cpu_usage, memory_usage, elapsed_time))
+                for gpu_index, (name, load, mem) in enumerate(parse_gpu_usage(gpu_usage)):
+                    gpu_rows.append((row_id, gpu_index, names.get(name), load, mem))
+            conn.executemany(
+                "INSERT INTO performance (id, timestamp, cpu_usage, memory_usage, elapsed_time) VALUES (?, ?, ?, ?, ?)",
+                samples,
+            )
+            conn.executemany(
+                "INSERT INTO gpu_samples (sample_id, gpu_index, name_id, load, mem) VALUES (?, ?, ?, ?, ?)",
+                gpu_rows,
+            )
+        conn.execute("DROP TABLE performance_v1")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    # Освобождаем место, занятое старой таблицей; заодно база переходит на инкрементальную очистку
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def ensure_schema(db_name):
+    """
+    Подготавливает базу данных к работе с текущей схемой.
+
+    Пустая база получает таблицы текущей схемы, база v1 (например, старые файлы
+    из uploads/) переводится на неё с сохранением всех строк, в базы v2–v6 добавляются
+    недостающие таблицы (дополнительные метрики v3, агрегаты v4, оповещения v5,
+    время этапов сборщика v6, отметка последнего id v7).
+
+    Новые базы создаются с PRAGMA auto_vacuum = INCREMENTAL, чтобы место после удаления
+    старых отсчётов (retention.py) можно было вернуть без полного VACUUM.
+
+    Аргументы:
+        db_name (str): Имя файла базы данных SQLite.
+
+    Возвращает:
+        int: Версия схемы до обновления (0–7).
+    """
+    conn = sqlite3.connect(db_name)
+    try:
+        version = schema_version(conn)
+        if version == 0:
+            # Режим очистки задаётся до создания первой таблицы
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            create_schema(conn)
+        elif version == 1:
+            _upgrade_v1(conn)
+        elif version < SCHEMA_VERSION:
+            # Новые таблицы только добавляются, существующие данные не меняются
+            create_schema(conn)
+        return version
+    finally:
+        conn.close()
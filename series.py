@@ -0,0 +1,201 @@
+import numpy as np
+
+from schema import EXTENDED_METRICS, from_epoch_us, to_epoch_us
+
+
+# Запросы для каждой метрики: время (мкс) и значение в заданном диапазоне времени.
+# Условие по timestamp использует индекс performance_timestamp.
+METRIC_QUERIES = {
+    "cpu": "SELECT timestamp, cpu_usage FROM performance WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp",
+    "memory": "SELECT timestamp, memory_usage FROM performance WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp",
+    "elapsed_time": (
+        "SELECT timestamp, elapsed_time FROM performance WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp"
+    ),
+    # Для отсчёта с несколькими GPU берётся максимальная загрузка
+    "gpu": """
+        SELECT p.timestamp, MAX(g.load)
+        FROM performance AS p
+        JOIN gpu_samples AS g ON g.sample_id = p.id
+        WHERE p.timestamp BETWEEN ? AND ?
+        GROUP BY p.id
+        ORDER BY p.timestamp
+    """,
+}
+
+_SYSTEM_QUERY = """
+    SELECT p.timestamp, s.{column}
+    FROM performance AS p
+    JOIN system_samples AS s ON s.sample_id = p.id
+    WHERE p.timestamp BETWEEN ? AND ?
+    ORDER BY p.timestamp
+"""
+METRIC_QUERIES.update({metric: _SYSTEM_QUERY.format(column=metric) for metric in EXTENDED_METRICS})
+
+# Подписи графиков для каждой метрики
+METRIC_TITLES = {
+    "cpu": "Загрузка CPU (%)",
+    "memory": "Загрузка памяти (%)",
+    "gpu": "Загрузка GPU (%)",
+    "elapsed_time": "Время выполнения (сек.)",
+    "load1": "Средняя загрузка системы (1 мин)",
+    "disk_read": "Чтение с диска (байт/с)",
+    "disk_write": "Запись на диск (байт/с)",
+    "net_sent": "Отправлено по сети (байт/с)",
+    "net_recv": "Получено по сети (байт/с)",
+    "collector_cpu": "Загрузка CPU сборщиком (%)",
+}
+
+# Границы диапазона по умолчанию (всё время)
+MIN_TIME = -(2**63)
+MAX_TIME = 2**63 - 1
+
+# Размер пачки при чтении строк из курсора
+FETCH_SIZE = 10000
+
+
+def parse_time(value):
+    """
+    Разбирает границу диапазона времени из параметра запроса.
+
+    Аргументы:
+        value (str | None): Строка ISO (как её отдаёт Plotly при масштабировании)
+            или число микросекунд от начала эпохи.
+
+    Возвращает:
+        int | None: Микросекунды от начала эпохи или None, если граница не задана.
+    """
+    if value is None or value == "":
+        return None
+    if value.lstrip("-").isdigit():
+        return int(value)
+    return to_epoch_us(value)
+
+
+def available_metrics(conn):
+    """
+    Возвращает подписи метрик, которые есть в базе: дополнительные метрики
+    показываются, только если база собрана с ними.
+
+    Аргументы:
+        conn (sqlite3.Connection): Соединение с базой текущей схемы.
+
+    Возвращает:
+        dict: Имя метрики -> подпись графика.
+    """
+    extended = conn.execute("SELECT 1 FROM system_samples LIMIT 1").fetchone() is not None
+    return {
+        metric: title for metric, title in METRIC_TITLES.items() if extended or metric not in EXTENDED_METRICS
+    }
+
+
+def count_samples(conn, start=None, end=None):
+    """
+    Количество отсчётов в диапазоне времени (считается по индексу performance_timestamp).
+    Ни у одной метрики не бывает больше одного значения на отсчёт, поэтому это
+    верхняя граница длины любого ряда в диапазоне.
+    """
+    return conn.execute(
+        "SELECT COUNT(*) FROM performance WHERE timestamp BETWEEN ? AND ?",
+        (MIN_TIME if start is None else start, MAX_TIME if end is None else end),
+    ).fetchone()[0]
+
+
+def read_into(cursor, out, chunk=FETCH_SIZE):
+    """
+    Читает строки курсора пачками прямо в срезы заранее выделенного массива out
+    (NULL становится NaN). Строки сверх размера массива (например, дописанные сборщиком
+    после подсчёта) не читаются.
+
+    Возвращает:
+        int: Количество прочитанных строк.
+    """
+    filled = 0
+    while filled < len(out):
+        rows = cursor.fetchmany(min(chunk, len(out) - filled))
+        if not rows:
+            break
+        out[filled : filled + len(rows)] = rows
+        filled += len(rows)
+    return filled
+
+
+def fetch_series(conn, metric, start=None, end=None):
+    """
+    Читает ряд одной метрики в заданном диапазоне времени в массивы numpy.
+
+    Массив выделяется один раз по числу отсчётов в диапазоне, и пачки строк из курсора
+    записываются прямо в него — без списка всех строк и без склеивания пачек.
+
+    Аргументы:
+        conn (sqlite3.Connection): Соединение с базой схемы v2.
+        metric (str): Имя метрики из METRIC_QUERIES.
+        start (int): Начало диапазона в микросекундах (включительно).
+        end (int): Конец диапазона в микросекундах (включительно).
+
+    Возвращает:
+        tuple: Массивы (время в мкс, значения).
+    """
+    bounds = (MIN_TIME if start is None else start, MAX_TIME if end is None else end)
+    data = np.empty((count_samples(conn, *bounds), 2), dtype=np.float64)
+    filled = read_into(conn.execute(METRIC_QUERIES[metric], bounds), data)
+    return data[:filled, 0], data[:filled, 1]
+
+
+def fetch_rollups(conn, metric, start=None, end=None):
+    """
+    Читает ряд метрики из агрегатов sample_rollups — за время, отсчёты которого уже удалены
+    по сроку хранения (retention.py); значение точки — среднее корзины, время — её начало.
+
+    Берутся только корзины, которые целиком раньше самого старого оставшегося отсчёта,
+    поэтому агрегаты не накладываются на исходные данные. Из разрешений берётся самое мелкое,
+    а более крупное — только раньше первой мелкой корзины (минутные агрегаты хранятся
+    меньше часовых).
+
+    Аргументы:
+        conn (sqlite3.Connection): Соединение с базой текущей схемы.
+        metric (str): Имя метрики из METRIC_QUERIES.
+        start (int): Начало диапазона в микросекундах (корзина должна пересекаться с диапазоном).
+        end (int): Конец диапазона в микросекундах (включительно).
+
+    Возвращает:
+        tuple: Массивы (время в мкс, значения); пустые, если агрегатов нет.
+    """
+    start = MIN_TIME if start is None else start
+    end = MAX_TIME if end is None else end
+    # Отдельный запрос: MIN по индексу performance_timestamp читает одну строку
+    oldest = conn.execute("SELECT MIN(timestamp) FROM performance").fetchone()[0]
+    limit = MAX_TIME if oldest is None else oldest
+    parts = []
+    # Разрешения перебираются от мелкого к крупному поиском по первичному ключу (resolution, bucket, metric)
+    resolution = conn.execute("SELECT MIN(resolution) FROM sample_rollups").fetchone()[0]
+    while resolution is not None:
+        first_bucket = conn.execute(
+            "SELECT MIN(bucket) FROM sample_rollups WHERE resolution = ? AND metric = ?", (resolution, metric)
+        ).fetchone()[0]
+        if first_bucket is not None:
+            rows = conn.execute(
+                "SELECT bucket, avg FROM sample_rollups "
+                "WHERE resolution = ? AND bucket BETWEEN ? AND ? AND metric = ? ORDER BY bucket",
+                (resolution, max(MIN_TIME, start - resolution + 1), min(end, limit - resolution), metric),
+            ).fetchall()
+            parts.append(np.array(rows, dtype=np.float64).reshape(-1, 2))
+            # Более крупные корзины нужны только раньше первой корзины этого разрешения
+            limit = min(limit, first_bucket)
+        resolution = conn.execute(
+            "SELECT MIN(resolution) FROM sample_rollups WHERE resolution > ?", (resolution,)
+        ).fetchone()[0]
+    if not parts:
+        return np.empty(0), np.empty(0)
+    data = np.concatenate(parts[::-1])
+    return data[:, 0], data[:, 1]
+
+
+def to_json_series(x, y):
+    """
+    Готовит ряд к отправке в браузер: время — строки ISO в локальном времени,
+    пропущенные значения — null.
+    """
+    return {
+        "x": [from_epoch_us(value).isoformat() for value in x],
+        "y": [None if np.isnan(value) else float(value) for value in y],
+    }
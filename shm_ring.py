@@ -0,0 +1,233 @@
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# Максимальное число GPU, загрузка которых хранится в одной записи
+GPU_SLOTS = 4
+
+# Признак того, что запись в ячейке в данный момент перезаписывается
+WRITING = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+# Заголовок кольцевого буфера: счётчик записанных отсчётов и ёмкость
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "<u4"),
+        ("capacity", "<u4"),
+        ("write_seq", "<u8"),
+        ("reserved", "<u8", (6,)),
+    ]
+)
+
+# Фиксированная запись одного отсчёта
+RECORD_DTYPE = np.dtype(
+    [
+        ("seq", "<u8"),
+        ("timestamp", "<i8"),  # Время в микросекундах от начала эпохи
+        ("cpu_usage", "<f8"),
+        ("memory_usage", "<f8"),
+        ("cycle_time", "<f8"),
+        ("gpu_count", "<u4"),
+        ("gpu_load", "<f4", (GPU_SLOTS,)),
+    ],
+    align=True,
+)
+
+MAGIC = 0x52494E47  # "RING"
+
+
+class SharedRingBuffer:
+    """
+    Кольцевой буфер отсчётов в разделяемой памяти (multiprocessing.shared_memory).
+
+    Процесс-производитель записывает отсчёты фиксированного формата RECORD_DTYPE,
+    процесс интерфейса читает последние N отсчётов через представления numpy прямо
+    в разделяемой памяти, без pickle и без копирования. Буфер никогда не растёт:
+    при переполнении самые старые отсчёты перезаписываются, а по счётчику
+    последовательности читатель точно знает, сколько отсчётов он пропустил.
+
+    Каждая запись хранит свой номер seq. Перед перезаписью ячейки производитель
+    помечает её как WRITING и выставляет номер только после записи данных,
+    поэтому читатель отличает целую запись от недописанной.
+
+    Атрибуты:
+        name (str): Имя сегмента разделяемой памяти.
+        capacity (int): Количество записей в буфере.
+    """
+
+    def __init__(self, shm, owner):
+        self._shm = shm
+        self._owner = owner
+        self._header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+        if self._header["magic"] != MAGIC:
+            raise ValueError(f"Сегмент {shm.name} не является кольцевым буфером")
+        self.capacity = int(self._header["capacity"])
+        self._records = np.ndarray(
+            (self.capacity,), dtype=RECORD_DTYPE, buffer=shm.buf, offset=HEADER_DTYPE.itemsize
+        )
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @classmethod
+    def create(cls, capacity=3600, name=None):
+        """
+        Создаёт новый сегмент разделяемой памяти под кольцевой буфер.
+
+        Аргументы:
+            capacity (int): Количество записей в буфере.
+            name (str): Имя сегмента. По умолчанию выбирается системой.
+
+        Возвращает:
+            SharedRingBuffer: Буфер-владелец сегмента.
+        """
+        size = HEADER_DTYPE.itemsize + capacity * RECORD_DTYPE.itemsize
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+        header["magic"] = MAGIC
+        header["capacity"] = capacity
+        header["write_seq"] = 0
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Подключается к существующему кольцевому буферу по имени сегмента.
+
+        Аргументы:
+            name (str): Имя сегмента разделяемой памяти.
+
+        Возвращает:
+            SharedRingBuffer: Буфер, подключённый к сегменту.
+        """
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def write_seq(self):
+        """
+        Количество отсчётов, записанных в буфер за всё время.
+        """
+        return int(self._header["write_seq"])
+
+    def push(self, cpu_usage, memory_usage, gpu_loads, cycle_time, timestamp=None):
+        """
+        Записывает один отсчёт, при необходимости перезаписывая самый старый.
+
+        Аргументы:
+            cpu_usage (float): Загрузка процессора в процентах.
+            memory_usage (float): Использование оперативной памяти в процентах.
+            gpu_loads (list): Загрузка каждого GPU в процентах (не более GPU_SLOTS).
+            cycle_time (float): Время выполнения цикла в секундах.
+            timestamp (int): Время в микросекундах от начала эпохи. По умолчанию — текущее.
+        """
+        seq = self.write_seq
+        record = self._records[seq % self.capacity]
+        record["seq"] = WRITING
+        record["timestamp"] = timestamp if timestamp is not None else time.time_ns() // 1000
+        record["cpu_usage"] = cpu_usage
+        record["memory_usage"] = memory_usage
+        record["cycle_time"] = cycle_time
+        gpu_loads = list(gpu_loads)[:GPU_SLOTS]
+        record["gpu_count"] = len(gpu_loads)
+        record["gpu_load"][: len(gpu_loads)] = gpu_loads
+        record["seq"] = seq + 1
+        self._header["write_seq"] = seq + 1
+
+    def latest(self, n):
+        """
+        Возвращает последние n записей в порядке от старых к новым.
+
+        Результат — один или два (если данные переходят через конец буфера)
+        среза numpy, которые указывают прямо в разделяемую память. Они остаются
+        валидными, пока производитель не перезапишет эти ячейки; при необходимости
+        целостность проверяется через is_intact().
+
+        Аргументы:
+            n (int): Количество записей.
+
+        Возвращает:
+            list: Список срезов RECORD_DTYPE (без копирования данных).
+        """
+        end = self.write_seq
+        n = min(n, end, self.capacity)
+        if n <= 0:
+            return []
+        start_slot = (end - n) % self.capacity
+        end_slot = end % self.capacity
+        if start_slot < end_slot:
+            return [self._records[start_slot:end_slot]]
+        return [self._records[start_slot:], self._records[:end_slot]]
+
+    def read_since(self, last_seq, limit=None):
+        """
+        Возвращает записи, появившиеся после last_seq, и число пропущенных записей.
+
+        Аргументы:
+            last_seq (int): Номер последней уже прочитанной записи (write_seq на момент чтения).
+            limit (int): Максимальное количество возвращаемых записей (самые новые).
+
+        Возвращает:
+            tuple: (список срезов, новый last_seq, количество перезаписанных записей).
+        """
+        end = self.write_seq
+        available = end - last_seq
+        lost = max(0, available - self.capacity)
+        count = available - lost
+        if limit is not None:
+            count = min(count, limit)
+        return self.latest(count), end, lost
+
+    def newest(self):
+        """
+        Возвращает последний целый отсчёт в виде словаря или None, если данных нет.
+        """
+        for _ in range(3):
+            segments = self.latest(1)
+            if not segments:
+                return None
+            record = segments[-1][-1]
+            expected = int(record["seq"])
+            sample = {
+                "timestamp": int(record["timestamp"]),
+                "cpu_usage": float(record["cpu_usage"]),
+                "memory_usage": float(record["memory_usage"]),
+                "cycle_time": float(record["cycle_time"]),
+                "gpu_load": [float(load) for load in record["gpu_load"][: int(record["gpu_count"])]],
+            }
+            # Если запись успели перезаписать во время чтения, пробуем ещё раз
+            if expected != WRITING and int(record["seq"]) == expected:
+                return sample
+        return None
+
+    @staticmethod
+    def is_intact(segment, first_seq):
+        """
+        Проверяет, что записи среза не были перезаписаны производителем.
+
+        Аргументы:
+            segment (numpy.ndarray): Срез, полученный из latest().
+            first_seq (int): Ожидаемый номер первой записи среза.
+
+        Возвращает:
+            bool: True, если номера записей идут подряд начиная с first_seq.
+        """
+        expected = np.arange(first_seq, first_seq + len(segment), dtype=np.uint64)
+        return bool(np.array_equal(segment["seq"], expected))
+
+    def close(self):
+        """
+        Освобождает представления и отключается от сегмента.
+        """
+        self._records = None
+        self._header = None
+        self._shm.close()
+
+    def unlink(self):
+        """
+        Удаляет сегмент разделяемой памяти (вызывается только владельцем).
+        """
+        if self._owner:
+            self._shm.unlink()
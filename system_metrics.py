@@ -0,0 +1,224 @@
+import math
+import os
+import time
+
+import psutil
+
+
+# Количество самых загруженных процессов, сохраняемых в каждом отсчёте
+TOP_PROCESSES = 10
+
+# Бюджет собственной загрузки CPU сборщиком, % одного ядра
+CPU_BUDGET = 2.0
+
+# Сглаживание оценки стоимости опроса процессов (доля нового замера)
+COST_SMOOTHING = 0.3
+
+# Поля процесса, читаемые process_iter за один проход (внутри — oneshot()).
+# io_counters есть не на всех платформах (например, его нет в macOS).
+PROCESS_ATTRS = ["name", "cpu_times", "memory_info"] + (
+    ["io_counters"] if hasattr(psutil.Process, "io_counters") else []
+)
+
+
+class ProcessSampler:
+    """
+    Самые загруженные процессы (top-N по CPU) с RSS и скоростью ввода-вывода.
+
+    Процессы перебираются через psutil.process_iter(attrs=...): psutil хранит объекты
+    Process между вызовами и читает все поля процесса внутри oneshot() (на Linux —
+    один проход по /proc/<pid>/stat). Загрузка CPU и ввод-вывод считаются по разнице
+    счётчиков с предыдущим тактом, которые хранятся по объекту Process, поэтому
+    повторно использованный pid не смешивается с завершившимся процессом.
+    Нет прав на чтение полей чужого процесса — значение поля None.
+
+    Атрибуты:
+        top_n (int): Количество сохраняемых процессов.
+    """
+
+    def __init__(self, top_n=TOP_PROCESSES):
+        self.top_n = top_n
+        self._previous = {}
+        self._last_time = None
+
+    def sample(self):
+        """
+        Возвращает top-N процессов за время с предыдущего вызова.
+
+        Возвращает:
+            list: Кортежи (pid, название, CPU %, RSS в байтах, чтение байт/с, запись байт/с),
+                  по убыванию загрузки CPU. Первый вызов только запоминает счётчики.
+        """
+        now = time.monotonic()
+        elapsed = now - self._last_time if self._last_time is not None else None
+        current = {}
+        rows = []
+        for proc in psutil.process_iter(PROCESS_ATTRS, ad_value=None):
+            info = proc.info
+            cpu_times = info["cpu_times"]
+            io = info.get("io_counters")
+            counters = (
+                cpu_times.user + cpu_times.system if cpu_times is not None else None,
+                io.read_bytes if io is not None else None,
+                io.write_bytes if io is not None else None,
+            )
+            current[proc] = counters
+            previous = self._previous.get(proc)
+            if previous is None or not elapsed:
+                continue
+            rates = [
+                (new - old) / elapsed if new is not None and old is not None else None
+                for new, old in zip(counters, previous)
+            ]
+            memory = info["memory_info"]
+            rows.append(
+                (
+                    proc.pid,
+                    info["name"],
+                    rates[0] * 100 if rates[0] is not None else None,
+                    memory.rss if memory is not None else None,
+                    rates[1],
+                    rates[2],
+                )
+            )
+        # Счётчики завершившихся процессов не храним
+        self._previous = current
+        self._last_time = now
+        rows.sort(key=lambda row: row[2] or 0.0, reverse=True)
+        return rows[: self.top_n]
+
+
+class ExtendedSampler:
+    """
+    Дополнительные метрики: загрузка каждого ядра CPU, скорость диска и сети,
+    средняя загрузка системы, top-N процессов и собственная загрузка CPU сборщиком.
+
+    Все счётчики psutil читаются без ожидания (interval=None) и пересчитываются
+    в скорости по разнице с предыдущим тактом. Самая дорогая часть — перебор
+    процессов — укладывается в бюджет cpu_budget: если его стоимость за такт
+    превышает долю бюджета, процессы опрашиваются не на каждом такте, а через
+    process_every тактов.
+
+    Атрибуты:
+        top_n (int): Количество сохраняемых процессов (0 — процессы не опрашиваются).
+        cpu_budget (float): Допустимая загрузка CPU сборщиком, % одного ядра.
+        process_every (int): Процессы опрашиваются на каждом process_every-м такте.
+    """
+
+    def __init__(self, top_n=TOP_PROCESSES, cpu_budget=CPU_BUDGET):
+        self.top_n = top_n
+        self.cpu_budget = cpu_budget
+        self.process_every = 1
+        self._processes = ProcessSampler(top_n) if top_n else None
+        self._process_cost = 0.0
+        self._ticks = 0
+        self._own = None
+        self._last = None
+        self._started = None
+
+    @staticmethod
+    def _counters():
+        disk = psutil.disk_io_counters()
+        net = psutil.net_io_counters()
+        return (
+            disk.read_bytes if disk is not None else None,
+            disk.write_bytes if disk is not None else None,
+            net.bytes_sent if net is not None else None,
+            net.bytes_recv if net is not None else None,
+        )
+
+    def _own_cpu(self):
+        times = self._own.cpu_times()
+        return times.user + times.system
+
+    def open(self):
+        """
+        Запоминает начальные значения счётчиков.
+        """
+        self._own = psutil.Process(os.getpid())
+        psutil.cpu_percent(interval=None, percpu=True)
+        self._last = (time.monotonic(), self._counters(), self._own_cpu())
+        self._started = self._last
+        if self._processes is not None:
+            self._processes.sample()
+        return self
+
+    def sample(self):
+        """
+        Снимает дополнительные метрики одного такта.
+
+        Возвращает:
+            dict: cores — загрузка каждого ядра в %, system — кортеж (чтение и запись
+                  диска, отправка и приём сети в байт/с, load1, load5, load15,
+                  загрузка CPU сборщиком в %), processes — top-N процессов
+                  (пустой список на тактах, где процессы не опрашивались).
+        """
+        if self._last is None:
+            self.open()
+        self._ticks += 1
+        now = time.monotonic()
+        cores = psutil.cpu_percent(interval=None, percpu=True)
+        counters = self._counters()
+
+        processes = []
+        if self._processes is not None and self._ticks % self.process_every == 0:
+            start = time.thread_time()
+            processes = self._processes.sample()
+            self._adapt(time.thread_time() - start, now - self._last[0])
+
+        own_cpu = self._own_cpu()
+        last_time, last_counters, last_own_cpu = self._last
+        elapsed = now - last_time
+        rates = [
+            (new - old) / elapsed if elapsed > 0 and new is not None and old is not None else None
+            for new, old in zip(counters, last_counters)
+        ]
+        collector_cpu = 100 * (own_cpu - last_own_cpu) / elapsed if elapsed > 0 else None
+        self._last = (now, counters, own_cpu)
+        return {
+            "cores": cores,
+            "system": (*rates, *psutil.getloadavg(), collector_cpu),
+            "processes": processes,
+        }
+
+    def stats(self):
+        """
+        Возвращает собственную стоимость сбора данных.
+
+        Возвращает:
+            dict: Средняя загрузка CPU процессом сборщика (% одного ядра) с момента open(),
+                  бюджет, сглаженная стоимость одного опроса процессов (сек.) и process_every.
+        """
+        collector_cpu = 0.0
+        if self._started is not None and self._last is not None:
+            elapsed = self._last[0] - self._started[0]
+            if elapsed > 0:
+                collector_cpu = 100 * (self._last[2] - self._started[2]) / elapsed
+        return {
+            "collector_cpu": collector_cpu,
+            "cpu_budget": self.cpu_budget,
+            "process_cost": self._process_cost,
+            "process_every": self.process_every,
+        }
+
+    def report(self):
+        """
+        Формирует строку с собственной стоимостью сбора для вывода в консоль.
+        """
+        s = self.stats()
+        status = "в пределах бюджета" if s["collector_cpu"] <= s["cpu_budget"] else "бюджет превышен"
+        return (
+            f"Нагрузка сборщика: CPU {s['collector_cpu']:.2f}% при бюджете {s['cpu_budget']:.2f}% ({status}), "
+            f"опрос процессов {s['process_cost'] * 1000:.2f} мс каждые {s['process_every']} такт(а)"
+        )
+
+    def _adapt(self, cost, period):
+        """
+        Подбирает частоту опроса процессов так, чтобы их стоимость укладывалась
+        в половину бюджета CPU (вторая половина — остальные опросы и запись в базу).
+        """
+        if period <= 0:
+            return
+        self._process_cost += COST_SMOOTHING * (cost - self._process_cost)
+        allowed = self.cpu_budget / 100 / 2 * period
+        self.process_every = max(1, math.ceil(self._process_cost / allowed)) if allowed > 0 else 1
@@ -0,0 +1,104 @@
+import sqlite3
+
+import pytest
+
+from alerts import AlertEngine, AnomalyRule, ThresholdRule, parse_rule
+from schema import ensure_schema
+
+
+def feed(rule, points):
+    """
+    Передаёт правилу пары (время, значение) и возвращает времена срабатываний.
+    """
+    return [now for now, value in points if rule.update(now, value) is not None]
+
+
+def sample(cpu, gpu_usage="ГП не найден", timestamp="2024-01-01T00:00:00"):
+    return {"timestamp": timestamp, "cpu_usage": cpu, "memory_usage": 50.0, "gpu_usage": gpu_usage, "cycle_time": 0.01}
+
+
+def test_threshold_fires_once_after_sustained_period():
+    rule = ThresholdRule("cpu", 90, for_seconds=30)
+    points = [(t, 95) for t in range(0, 50, 10)] + [(50, 80)] + [(t, 95) for t in range(60, 110, 10)]
+    # Первое срабатывание — через 30 с, повторное — только после возврата в норму и ещё 30 с
+    assert feed(rule, points) == [30, 90]
+
+
+def test_threshold_below():
+    rule = ThresholdRule("memory", 10, above=False)
+    assert feed(rule, [(0, 20), (1, 5), (2, 4), (3, 15), (4, 1)]) == [1, 4]
+
+
+def test_anomaly_ewma_statistics():
+    rule = AnomalyRule("cpu", alpha=0.5, warmup=100)
+    for now, value in enumerate([0.0, 2.0, 2.0]):
+        rule.update(now, value)
+    # mean: 0 -> 1 -> 1.5; var: 0 -> 0.5 * (0 + 2 * 1) = 1 -> 0.5 * (1 + 1 * 0.5) = 0.75
+    assert rule.mean == pytest.approx(1.5)
+    assert rule.var == pytest.approx(0.75)
+
+
+def test_anomaly_fires_on_spike_after_warmup():
+    rule = AnomalyRule("cycle_time", z=4, alpha=0.1, warmup=20)
+    noise = [(now, 10.0 + (0.5 if now % 2 else -0.5)) for now in range(50)]
+    assert feed(rule, noise) == []
+    # Всплеск срабатывает один раз, пока значение не вернётся к норме
+    assert feed(rule, [(50, 30.0), (51, 30.0)]) == [50]
+
+
+def test_anomaly_ignores_values_during_warmup():
+    rule = AnomalyRule("cpu", warmup=5)
+    assert feed(rule, [(0, 1.0), (1, 1.0), (2, 1000.0)]) == []
+
+
+def test_constant_series_uses_min_std():
+    rule = AnomalyRule("cpu", z=4, warmup=5, min_std=1.0)
+    assert feed(rule, [(now, 5.0) for now in range(10)] + [(10, 8.0), (11, 10.0)]) == [11]
+
+
+@pytest.mark.parametrize(
+    "text, kind, attrs",
+    [
+        ("cpu>90", ThresholdRule, {"metric": "cpu", "value": 90.0, "above": True, "for_seconds": 0.0}),
+        ("memory < 5 for 30s", ThresholdRule, {"metric": "memory", "value": 5.0, "above": False, "for_seconds": 30}),
+        ("cycle_time z>3.5", AnomalyRule, {"metric": "cycle_time", "z": 3.5}),
+    ],
+)
+def test_parse_rule(text, kind, attrs):
+    rule = parse_rule(text)
+    assert isinstance(rule, kind)
+    assert {name: getattr(rule, name) for name in attrs} == attrs
+    assert rule.name == text
+
+
+@pytest.mark.parametrize("text", ["cpu", "disk>5", "cpu>>5", "cpu z>"])
+def test_parse_rule_rejects(text):
+    with pytest.raises(ValueError):
+        parse_rule(text)
+
+
+def test_engine_delivers_to_database_and_sinks(tmp_path):
+    db_path = str(tmp_path / "log.db")
+    ensure_schema(db_path)
+    delivered = []
+    engine = AlertEngine([parse_rule("cpu>90"), parse_rule("gpu>50")], sinks=[delivered.append]).open(db_path)
+    try:
+        assert engine.evaluate(sample(50.0), now=0) == []
+        # GPU без загрузки ([N/A]) пропускается, порог cpu срабатывает
+        fired = engine.evaluate(sample(95.0, gpu_usage=[("A", None, 1.0)]), now=1)
+        assert [alert["rule"] for alert in fired] == ["cpu>90"]
+        assert [alert["rule"] for alert in engine.evaluate(sample(50.0, gpu_usage=[("A", 60.0, 1.0)]), now=2)] == [
+            "gpu>50"
+        ]
+    finally:
+        engine.close()
+    assert [alert["rule"] for alert in delivered] == ["cpu>90", "gpu>50"]
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT rule, value FROM alerts ORDER BY id").fetchall() == [
+            ("cpu>90", 95.0),
+            ("gpu>50", 60.0),
+        ]
+    finally:
+        conn.close()
+    assert engine.stats()["delivered"] == 2
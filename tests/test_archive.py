@@ -0,0 +1,77 @@
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+from archive import archive_path, compact, load_manifest, read_segment, read_series, write_segment
+from db_writer import BatchedDatabaseWriter
+from series import fetch_series
+
+
+# Короткие сегменты, чтобы несколько из них закрылись за минуту отсчётов
+SEGMENT = 10_000_000
+T0 = 1_700_000_000_000_000
+
+
+def write_samples(db_path, seconds, cpu=None):
+    with BatchedDatabaseWriter(db_path) as writer:
+        for second in seconds:
+            value = float(second if cpu is None else cpu)
+            writer.write(value, 50.0, [("Fake GPU", value / 2, 1024.0)], 0.01, timestamp=T0 + second * 1_000_000)
+
+
+def read_both(db_path, metric, start=None, end=None):
+    conn = sqlite3.connect(db_path)
+    try:
+        return read_series(conn, db_path, metric, start, end), fetch_series(conn, metric, start, end)
+    finally:
+        conn.close()
+
+
+def test_read_segment_slices_inclusive_range(tmp_path):
+    path = str(tmp_path / "0.seg")
+    timestamps = np.arange(0, 100, 10)
+    write_segment(path, 0, 100, timestamps, {"cpu": timestamps / 10, "gpu": np.where(timestamps < 50, np.nan, 1.0)})
+    x, y = read_segment(path, "cpu", 20, 50)
+    assert x.tolist() == [20, 30, 40, 50]
+    assert y.tolist() == [2, 3, 4, 5]
+    # Отсчёты без строки GPU (NaN) в ряд не попадают
+    assert read_segment(path, "gpu")[0].tolist() == [50, 60, 70, 80, 90]
+    assert read_segment(path, "load1")[0].size == 0
+
+
+def test_compact_keeps_open_segment_in_database(tmp_path):
+    db_path = str(tmp_path / "log.db")
+    write_samples(db_path, range(35))
+    assert compact(db_path, segment=SEGMENT) == 3
+    manifest = load_manifest(archive_path(db_path))
+    # Сегмент с самым новым отсчётом ещё открыт
+    assert manifest["until"] == (T0 + 34 * 1_000_000) // SEGMENT * SEGMENT
+    assert len([name for name in os.listdir(archive_path(db_path)) if name.endswith(".seg")]) == 3
+
+
+@pytest.mark.parametrize("metric", ["cpu", "gpu"])
+@pytest.mark.parametrize(
+    "bounds",
+    [(None, None), (T0 + 5_000_000, T0 + 25_000_000), (T0 + 12_500_000, T0 + 40_000_000), (T0 + 31_000_000, None)],
+)
+def test_read_series_matches_database(tmp_path, metric, bounds):
+    db_path = str(tmp_path / "log.db")
+    write_samples(db_path, range(35))
+    compact(db_path, segment=SEGMENT)
+    (x, y), (expected_x, expected_y) = read_both(db_path, metric, *bounds)
+    assert x.tolist() == expected_x.tolist()
+    assert y.tolist() == expected_y.tolist()
+
+
+def test_recompact_rebuilds_segment_with_late_rows(tmp_path):
+    db_path = str(tmp_path / "log.db")
+    write_samples(db_path, range(0, 35, 2))
+    compact(db_path, segment=SEGMENT)
+    # Отсчёты, дописанные в уже сжатый сегмент (например, объединением загрузки)
+    write_samples(db_path, [3, 5], cpu=99.0)
+    assert compact(db_path, segment=SEGMENT) == 1
+    (x, y), (expected_x, expected_y) = read_both(db_path, "cpu")
+    assert sorted(x.tolist()) == sorted(expected_x.tolist())
+    assert y[np.isin(x, [T0 + 3_000_000, T0 + 5_000_000])].tolist() == [99.0, 99.0]
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from downsample import downsample, lttb_indices, minmax_indices
+
+
+def series(n=10_000, seed=1):
+    rng = np.random.default_rng(seed)
+    x = np.arange(n, dtype=np.float64)
+    y = rng.normal(50.0, 5.0, n)
+    # Короткие всплески, которые прореживание не должно терять
+    y[1234] = 500.0
+    y[8765] = -400.0
+    return x, y
+
+
+def test_lttb_keeps_ends_and_spikes():
+    x, y = series()
+    indices = lttb_indices(x, y, 200)
+    assert len(indices) == 200
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert np.all(np.diff(indices) > 0)
+    assert {1234, 8765} <= set(indices.tolist())
+
+
+def test_minmax_keeps_bucket_extremes():
+    x, y = series()
+    indices = minmax_indices(x, y, 200)
+    assert len(indices) <= 200
+    assert np.all(np.diff(indices) > 0)
+    # В каждой из 100 корзин сохранены минимум и максимум
+    for bucket in np.array_split(np.arange(len(x)), 100):
+        assert bucket[np.argmin(y[bucket])] in indices
+        assert bucket[np.argmax(y[bucket])] in indices
+
+
+@pytest.mark.parametrize(
+    "select, threshold", [(lttb_indices, 10), (lttb_indices, 2), (minmax_indices, 50), (minmax_indices, 1)]
+)
+def test_short_series_or_tiny_threshold_keeps_all(select, threshold):
+    x = np.arange(10, dtype=np.float64)
+    assert select(x, x, threshold).tolist() == list(range(10))
+
+
+def test_downsample_drops_missing_values():
+    x = [1, 2, 3, 4]
+    y = [1.0, None, np.nan, 4.0]
+    assert [values.tolist() for values in downsample(x, y, points=10)] == [[1, 4], [1.0, 4.0]]
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_downsample_respects_points(method):
+    x, y = series()
+    dx, dy = downsample(x, y, points=500, method=method)
+    assert len(dx) <= 500
+    assert dy.max() == 500.0 and dy.min() == -400.0
+    assert len(downsample(x, y, points=0, method=method)[0]) == len(x)
+
+
+def test_downsample_rejects_unknown_method():
+    with pytest.raises(ValueError):
+        downsample([1, 2], [1, 2], method="mean")
@@ -0,0 +1,89 @@
+import os
+import stat
+import sys
+import textwrap
+import time
+
+import pytest
+
+from gpu_probe import NO_GPU, NullGpuProbe, NvidiaSmiGpuProbe, detect_gpu_probe, parse_query_line
+
+
+# Поддельный nvidia-smi: на -L перечисляет GPU, в режиме цикла печатает показания, пока его не остановят
+FAKE_NVIDIA_SMI = """\
+    #!{python}
+    import sys
+    import time
+
+    if "-L" in sys.argv:
+        if {gpus}:
+            print("GPU 0: Fake GPU (UUID: GPU-00000000)")
+            print("GPU 1: Fake, GPU (UUID: GPU-00000001)")
+        sys.exit({code})
+    while True:
+        print("0, Fake GPU, 42, 1024", flush=True)
+        print("1, Fake, GPU, [N/A], 2048", flush=True)
+        time.sleep(0.05)
+"""
+
+
+def install_fake(directory, monkeypatch, gpus=True, code=0):
+    """
+    Кладёт поддельный nvidia-smi в directory и оставляет в PATH только эту папку.
+    """
+    path = directory / "nvidia-smi"
+    path.write_text(textwrap.dedent(FAKE_NVIDIA_SMI.format(python=sys.executable, gpus=gpus, code=code)))
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("PATH", str(directory))
+    return path
+
+
+@pytest.mark.skipif(os.name != "posix", reason="поддельный nvidia-smi — скрипт с shebang")
+def test_detect_reads_fake_nvidia_smi(tmp_path, monkeypatch):
+    install_fake(tmp_path, monkeypatch)
+    probe = detect_gpu_probe(interval=0.05, timeout=5.0)
+    try:
+        assert isinstance(probe, NvidiaSmiGpuProbe)
+        # wait_ready ждёт первую строку — вторая строка того же опроса приходит следом
+        deadline = time.monotonic() + 5.0
+        while len(probe.readings()) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # У второго GPU загрузка [N/A], но показание памяти не теряется
+        assert probe.read() == [("Fake GPU", 42.0, 1024.0), ("Fake, GPU", None, 2048.0)]
+        assert probe.readings()[1] == {"index": 1, "name": "Fake, GPU", "load": None, "memory": 2048.0}
+    finally:
+        probe.close()
+    assert probe._process.poll() is not None
+
+
+def test_detect_without_nvidia_smi(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    probe = detect_gpu_probe()
+    assert isinstance(probe, NullGpuProbe)
+    assert probe.read() == NO_GPU
+    assert probe.readings() == []
+
+
+@pytest.mark.skipif(os.name != "posix", reason="поддельный nvidia-smi — скрипт с shebang")
+@pytest.mark.parametrize("gpus, code", [(False, 0), (True, 9)])
+def test_detect_falls_back_when_no_gpu_listed(tmp_path, monkeypatch, gpus, code):
+    install_fake(tmp_path, monkeypatch, gpus=gpus, code=code)
+    assert isinstance(detect_gpu_probe(timeout=5.0), NullGpuProbe)
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        (
+            "0, NVIDIA GeForce RTX 3060 Ti, 19, 1024\n",
+            {"index": 0, "name": "NVIDIA GeForce RTX 3060 Ti", "load": 19.0, "memory": 1024.0},
+        ),
+        ("2, Fake, GPU, 5, 7", {"index": 2, "name": "Fake, GPU", "load": 5.0, "memory": 7.0}),
+        ("1, Tesla T4, [N/A], 300", {"index": 1, "name": "Tesla T4", "load": None, "memory": 300.0}),
+        ("3, GRID K520, [Not Supported], [N/A]", {"index": 3, "name": "GRID K520", "load": None, "memory": None}),
+        ("[N/A], Tesla T4, 5, 300", None),
+        ("garbage", None),
+    ],
+)
+def test_parse_query_line(line, expected):
+    assert parse_query_line(line) == expected
@@ -0,0 +1,131 @@
+import gzip
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+
+from db_writer import BatchedDatabaseWriter
+from ingest import BATCH_CONTENT_ENCODING, BATCH_CONTENT_TYPE, append_records, encode_batch, merge_database
+
+
+# Начало отсчётов тестов: сейчас, чтобы фоновое сжатие не находило закрытых сегментов
+T0 = time.time_ns() // 1000
+
+
+def make_record(sample_id, **fields):
+    record = {
+        "id": sample_id,
+        "timestamp": T0 + sample_id * 1_000_000,
+        "cpu_usage": 10.0,
+        "memory_usage": 20.0,
+        "elapsed_time": 0.01,
+        "gpu": [["Fake GPU", 42.0, 1024.0]],
+    }
+    record.update(fields)
+    return record
+
+
+def performance(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT id, timestamp FROM performance ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    import main
+
+    monkeypatch.setitem(main.app.config, "UPLOAD_FOLDER", str(tmp_path))
+    main.app.config["TESTING"] = True
+    return main.app.test_client()
+
+
+def post_batch(client, body, host="host", encoding=BATCH_CONTENT_ENCODING):
+    headers = {"Content-Type": BATCH_CONTENT_TYPE}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return client.post(f"/api/ingest/{host}?source=agent", data=body, headers=headers)
+
+
+def test_append_records_dedupes_ids_within_batch(tmp_path):
+    db_path = str(tmp_path / "host.db")
+    records = [make_record(1), make_record(2), make_record(2, cpu_usage=99.0), make_record(3)]
+    assert append_records(db_path, "agent", records) == (3, 3)
+    assert len(performance(db_path)) == 3
+    # Повторная отправка той же пачки ничего не добавляет
+    assert append_records(db_path, "agent", records) == (0, 3)
+    assert len(performance(db_path)) == 3
+
+
+def test_api_ingest_accepts_batch(client, tmp_path):
+    response = post_batch(client, encode_batch([make_record(1), make_record(2), make_record(2)]))
+    assert response.status_code == 200
+    assert response.get_json()["accepted"] == 2
+    assert response.get_json()["last_id"] == 2
+    assert client.get("/api/ingest/host?source=agent").get_json()["last_id"] == 2
+
+
+@pytest.mark.parametrize(
+    "record",
+    [
+        make_record(1, timestamp="вчера"),
+        make_record(1, cpu_usage="10%"),
+        make_record(1, gpu=[["Fake GPU", 42.0]]),
+        make_record(1, extended={"cores": [1.0], "system": [1.0], "processes": []}),
+        {"id": 1},
+    ],
+)
+def test_api_ingest_rejects_malformed_record(client, tmp_path, record):
+    response = post_batch(client, encode_batch([make_record(0), record]))
+    assert response.status_code == 400
+    # Пачка отклоняется целиком, хранилище не создаётся
+    assert not os.path.exists(tmp_path / "host.db")
+
+
+@pytest.mark.parametrize(
+    "body, encoding",
+    [
+        (b"not gzip", BATCH_CONTENT_ENCODING),
+        (gzip.compress(b"{not json}\n"), BATCH_CONTENT_ENCODING),
+        (json.dumps([make_record(1)]).encode(), None),
+    ],
+)
+def test_api_ingest_rejects_bad_batch(client, tmp_path, body, encoding):
+    assert post_batch(client, body, encoding=encoding).status_code == 400
+    assert not os.path.exists(tmp_path / "host.db")
+
+
+def test_api_ingest_rejects_large_body(client, tmp_path, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "MAX_BATCH_BYTES", 1024)
+    # Без сжатия тело не проходит через _gunzip, поэтому ограничивается по Content-Length
+    body = "".join(json.dumps(make_record(sample_id)) + "\n" for sample_id in range(1, 100)).encode()
+    assert post_batch(client, body, encoding=None).status_code == 413
+    assert not os.path.exists(tmp_path / "host.db")
+
+
+def test_api_ingest_get_unknown_host(client, tmp_path):
+    response = client.get("/api/ingest/new-host?source=agent")
+    assert response.status_code == 200
+    assert response.get_json()["last_id"] == 0
+    assert not os.path.exists(tmp_path / "new-host.db")
+
+
+def test_merge_database_dedupes_source_timestamps(tmp_path):
+    source_path = str(tmp_path / "upload.db")
+    with BatchedDatabaseWriter(source_path) as writer:
+        for offset in (0, 1, 1, 2, 2, 2, 3):
+            writer.write(10.0, 20.0, "ГП не найден", 0.01, timestamp=T0 + offset * 1_000_000)
+    db_path = str(tmp_path / "host.db")
+    assert merge_database(db_path, source_path, "upload:upload.db") == 4
+    rows = performance(db_path)
+    assert [timestamp for _, timestamp in rows] == [T0 + offset * 1_000_000 for offset in range(4)]
+    # Повторная загрузка того же файла ничего не добавляет
+    assert merge_database(db_path, source_path, "upload:upload.db") == 0
+    assert merge_database(db_path, source_path, "upload:other.db") == 0
+    assert len(performance(db_path)) == 4
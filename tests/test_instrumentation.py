@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from instrumentation import (
+    HISTOGRAM_SIZE,
+    LINEAR_LIMIT,
+    PROMETHEUS_BUCKETS,
+    SUB_COUNT,
+    StageHistogram,
+    StageTimings,
+    bucket_bounds,
+    bucket_index,
+)
+
+
+def test_buckets_cover_values_without_gaps():
+    assert bucket_bounds(0) == (0, 0)
+    for index in range(1, HISTOGRAM_SIZE):
+        lower, upper = bucket_bounds(index)
+        assert lower == bucket_bounds(index - 1)[1] + 1
+        assert bucket_index(lower) == index
+        assert bucket_index(upper) == index
+        # Ширина корзины не больше 1 / SUB_COUNT от её нижней границы
+        if index >= LINEAR_LIMIT:
+            assert upper - lower + 1 <= lower / SUB_COUNT
+
+
+@pytest.mark.parametrize("value", [0, 1, LINEAR_LIMIT - 1, LINEAR_LIMIT, 1000, 2**20 + 12345, 2**43 - 1])
+def test_value_falls_into_its_bucket(value):
+    lower, upper = bucket_bounds(bucket_index(value))
+    assert lower <= value <= upper
+
+
+def test_large_and_negative_values_are_clamped():
+    assert bucket_index(2**60) == HISTOGRAM_SIZE - 1
+    assert bucket_index(-5) == 0
+
+
+def test_percentiles_match_exact_within_bucket_width():
+    rng = np.random.default_rng(7)
+    values = rng.lognormal(mean=13, sigma=1.5, size=20_000).astype(np.int64)
+    histogram = StageHistogram()
+    for value in values.tolist():
+        histogram.record(value)
+    assert histogram.count == len(values)
+    assert histogram.max == values.max()
+    ordered = np.sort(values)
+    for q in (50, 90, 99, 99.9):
+        # Процентиль — значение с рангом ceil(count * q / 100), ранг считается в целых числах
+        exact = ordered[-(-len(values) * round(q * 10) // 1000) - 1]
+        assert histogram.percentile(q) == pytest.approx(exact, rel=1 / SUB_COUNT)
+    assert histogram.percentile(100) == values.max()
+
+
+def test_empty_histogram():
+    histogram = StageHistogram()
+    assert histogram.percentile(50) is None
+    assert histogram.stats() == {
+        "count": 0,
+        "mean": None,
+        "max": None,
+        "p50": None,
+        "p90": None,
+        "p99": None,
+        "p99.9": None,
+    }
+
+
+def test_prometheus_buckets_are_cumulative():
+    timings = StageTimings()
+    for value in (500, 3_000, 40_000, 2_000_000, 20_000_000_000):
+        timings.record("cycle", value)
+    lines = [
+        line
+        for line in timings.prometheus().splitlines()
+        if line.startswith('collector_stage_seconds_bucket{stage="cycle"')
+    ]
+    counts = [int(line.rsplit(" ", 1)[1]) for line in lines]
+    assert len(counts) == len(PROMETHEUS_BUCKETS) + 1
+    assert counts == sorted(counts)
+    # 500 нс <= 1 мкс; 20 с — только в +Inf
+    assert counts[0] == 1 and counts[-2] == 4 and counts[-1] == 5
+    (row,) = timings.rows()
+    assert row[:2] == ("cycle", 5)
+    assert row[2] == pytest.approx(20_002_043_500 / 5 / 1e9)
+    assert row[-1] == 20.0
@@ -0,0 +1,116 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import retention
+from archive import read_series
+from db_writer import BatchedDatabaseWriter
+from retention import HOUR_US, MINUTE_US, Retention
+
+
+# Три часа отсчётов раз в 10 секунд, начало выровнено по часу
+T0 = 1_700_000_000_000_000 // HOUR_US * HOUR_US
+STEP = 10_000_000
+COUNT = 3 * 360
+# Срок хранения — час: при now = T0 + 3 ч удаляются первые два часа
+NOW = T0 + 3 * HOUR_US
+CUTOFF = T0 + 2 * HOUR_US
+
+
+def make_db(db_path):
+    with BatchedDatabaseWriter(db_path, batch_size=500) as writer:
+        for i in range(COUNT):
+            writer.write(float(i % 97), 50.0, [("Fake GPU", 10.0, 1.0)], 0.01, timestamp=T0 + i * STEP)
+
+
+def rollups(db_path, resolution, metric="cpu"):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT bucket, count, min, avg, max FROM sample_rollups WHERE resolution = ? AND metric = ? "
+            "ORDER BY bucket",
+            (resolution, metric),
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def scalar(db_path, query):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(query).fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture(autouse=True)
+def no_pause(monkeypatch):
+    # Пауза между пачками нужна сборщику, а не тестам
+    monkeypatch.setattr(retention, "RETENTION_PAUSE", 0.0)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "log.db")
+    make_db(path)
+    return path
+
+
+def test_prune_rolls_up_and_deletes_old_samples(db_path):
+    pruner = Retention(db_path, raw_days=1 / 24, batch_size=50)
+    assert pruner.prune(now=NOW) == 720
+    assert scalar(db_path, "SELECT MIN(timestamp) FROM performance") == CUTOFF
+    assert scalar(db_path, "SELECT COUNT(*) FROM performance") == COUNT - 720
+    # GPU удалённых отсчётов удалены вместе с ними
+    assert scalar(db_path, "SELECT COUNT(*) FROM gpu_samples") == COUNT - 720
+
+    values = np.array([float(i % 97) for i in range(720)])
+    hours = rollups(db_path, HOUR_US)
+    assert [row[:2] for row in hours] == [(T0, 360), (T0 + HOUR_US, 360)]
+    assert hours[0][2:] == pytest.approx((values[:360].min(), values[:360].mean(), values[:360].max()))
+    minutes = rollups(db_path, MINUTE_US)
+    assert len(minutes) == 120
+    assert sum(row[1] for row in minutes) == 720
+
+
+def test_batches_merge_into_same_rollups(tmp_path, db_path):
+    other = str(tmp_path / "other.db")
+    make_db(other)
+    # Пачка из 7 отсчётов не совпадает с границами минутных корзин — корзины собираются из нескольких пачек
+    Retention(db_path, raw_days=1 / 24, batch_size=7).prune(now=NOW)
+    Retention(other, raw_days=1 / 24, batch_size=10_000).prune(now=NOW)
+    for resolution in (MINUTE_US, HOUR_US):
+        assert np.allclose(rollups(db_path, resolution), rollups(other, resolution))
+
+
+def test_ids_continue_after_everything_is_deleted(db_path):
+    Retention(db_path, raw_days=0.001).prune(now=NOW + HOUR_US)
+    assert scalar(db_path, "SELECT COUNT(*) FROM performance") == 0
+    with BatchedDatabaseWriter(db_path) as writer:
+        writer.write(1.0, 1.0, "ГП не найден", 0.01, timestamp=NOW + HOUR_US)
+    assert scalar(db_path, "SELECT id FROM performance") == COUNT + 1
+
+
+def test_old_minute_rollups_expire(db_path):
+    Retention(db_path, raw_days=1 / 24).prune(now=NOW)
+    # Через сутки минутные агрегаты старше 0.5 дня удаляются, часовые остаются
+    pruner = Retention(db_path, raw_days=1 / 24, minute_days=0.5)
+    pruner.prune(now=NOW + 24 * HOUR_US)
+    assert rollups(db_path, MINUTE_US) == []
+    assert len(rollups(db_path, HOUR_US)) == 3
+    # 180 минутных корзин у каждой из четырёх метрик с данными (cpu, memory, elapsed_time, gpu)
+    assert pruner.rollups_removed == 4 * 180
+
+
+def test_read_series_serves_pruned_history(db_path):
+    Retention(db_path, raw_days=1 / 24).prune(now=NOW)
+    conn = sqlite3.connect(db_path)
+    try:
+        x, y = read_series(conn, db_path, "cpu")
+    finally:
+        conn.close()
+    # Удалённые два часа представлены минутными корзинами, дальше — исходные отсчёты
+    assert len(x) == 120 + COUNT - 720
+    assert x[0] == T0 and x[120] == CUTOFF
+    assert np.all(np.diff(x) > 0)
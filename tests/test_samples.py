@@ -0,0 +1,67 @@
+import json
+import sqlite3
+
+import pytest
+
+from db_writer import BatchedDatabaseWriter
+from samples import export_lines, fetch_page, iter_samples
+from schema import from_epoch_us
+
+
+T0 = 1_700_000_000_000_000
+
+
+@pytest.fixture
+def conn(tmp_path):
+    db_path = str(tmp_path / "log.db")
+    with BatchedDatabaseWriter(db_path) as writer:
+        for i in range(25):
+            writer.write(float(i), 50.0, [("A", i, 1.0), ("B", i + 5, 1.0)], 0.01, timestamp=T0 + i * 1_000_000)
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+
+def ids(page):
+    return [row[0] for row in page["rows"]]
+
+
+def test_pages_forward_and_back(conn):
+    first = fetch_page(conn, page_size=10)
+    assert ids(first) == list(range(1, 11))
+    assert (first["prev"], first["next"]) == (None, 10)
+
+    second = fetch_page(conn, after=first["next"], page_size=10)
+    assert ids(second) == list(range(11, 21))
+    assert (second["prev"], second["next"]) == (11, 20)
+
+    last = fetch_page(conn, after=second["next"], page_size=10)
+    assert ids(last) == list(range(21, 26))
+    assert (last["prev"], last["next"]) == (21, None)
+
+    assert fetch_page(conn, before=last["prev"], page_size=10) == second
+    assert fetch_page(conn, before=second["prev"], page_size=10) == first
+
+
+def test_page_rows_are_readable(conn):
+    row = fetch_page(conn, page_size=1)["rows"][0]
+    # Время — строка ISO, GPU — максимальная загрузка по всем GPU отсчёта
+    assert row[1] == from_epoch_us(T0).isoformat()
+    assert row[2:] == (0.0, 50.0, 5.0, 0.01)
+
+
+def test_pages_skip_deleted_ids(conn):
+    conn.execute("DELETE FROM performance WHERE id BETWEEN 5 AND 15")
+    page = fetch_page(conn, after=2, page_size=5)
+    assert ids(page) == [3, 4, 16, 17, 18]
+    assert ids(fetch_page(conn, before=16, page_size=5)) == [1, 2, 3, 4]
+
+
+def test_iter_samples_reads_everything_in_batches(conn):
+    assert [row[0] for row in iter_samples(conn, batch_size=7)] == list(range(1, 26))
+
+
+def test_export_ndjson(conn):
+    lines = "".join(export_lines(conn, "ndjson")).splitlines()
+    assert len(lines) == 25
+    assert json.loads(lines[-1])["id"] == 25
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from scheduler import MIN_RATE, FixedRateScheduler
+
+
+class FakeClock:
+    """
+    Монотонные часы, которые двигает сам тест.
+    """
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_deadlines_do_not_drift():
+    clock = FakeClock()
+    scheduler = FixedRateScheduler(rate=2.0, clock=clock).start()
+    assert scheduler.delay() == 0.0
+    scheduler._tick()
+    # Работа цикла занимает 0.2 с — следующий дедлайн всё равно через период от старта
+    clock.now += 0.2
+    assert scheduler.delay() == pytest.approx(0.3)
+    clock.now += 0.3
+    scheduler._tick()
+    assert scheduler.ticks == 2
+    assert scheduler.missed == 0
+
+
+def test_missed_deadlines_are_skipped():
+    clock = FakeClock()
+    scheduler = FixedRateScheduler(rate=10.0, clock=clock).start()
+    scheduler._tick()
+    # Такт дедлайна 100.1 проснулся в 100.35: дедлайны 100.2 и 100.3 пропущены, следующий — 100.4
+    clock.now += 0.35
+    scheduler._tick()
+    assert scheduler.missed == 2
+    assert scheduler.last_jitter == pytest.approx(0.25)
+    assert scheduler.delay() == pytest.approx(0.05)
+
+
+@pytest.mark.parametrize("rate", [0.0, MIN_RATE / 2, 11.0])
+def test_rate_out_of_range(rate):
+    with pytest.raises(ValueError):
+        FixedRateScheduler(rate=rate)
+
+
+def test_wait_returns_when_stopped():
+    scheduler = FixedRateScheduler(rate=MIN_RATE).start()
+    stop_event = threading.Event()
+    assert scheduler.wait(stop_event)
+    threading.Timer(0.1, stop_event.set).start()
+    started = time.monotonic()
+    assert not scheduler.wait(stop_event)
+    assert time.monotonic() - started < 1.0
+
+
+def test_wait_async_returns_when_stopped():
+    async def run():
+        scheduler = FixedRateScheduler(rate=MIN_RATE).start()
+        stop_event = asyncio.Event()
+        ticks = 0
+        asyncio.get_running_loop().call_later(0.1, stop_event.set)
+        started = time.monotonic()
+        while await scheduler.wait_async(stop_event):
+            ticks += 1
+        return ticks, time.monotonic() - started
+
+    ticks, elapsed = asyncio.run(run())
+    # Первый такт — сразу, дальше период 10 с прерывается остановкой
+    assert ticks == 1
+    assert elapsed < 1.0
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from shm_ring import GPU_SLOTS, SharedRingBuffer
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRingBuffer.create(capacity=4)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def push(ring, values):
+    for value in values:
+        ring.push(float(value), 50.0, [value, value + 1], 0.01, timestamp=value)
+
+
+def cpu(segments):
+    return np.concatenate([segment["cpu_usage"] for segment in segments]).tolist() if segments else []
+
+
+def test_read_since_without_loss(ring):
+    assert ring.read_since(0) == ([], 0, 0)
+    push(ring, range(3))
+    segments, last_seq, lost = ring.read_since(0)
+    assert cpu(segments) == [0, 1, 2]
+    assert (last_seq, lost) == (3, 0)
+    assert SharedRingBuffer.is_intact(segments[0], 1)
+
+
+def test_read_since_counts_overwritten_records(ring):
+    push(ring, range(3))
+    _, last_seq, _ = ring.read_since(0)
+    push(ring, range(3, 9))
+    segments, last_seq, lost = ring.read_since(last_seq)
+    # Из 6 новых отсчётов в буфере на 4 записи уцелели последние 4, два перезаписаны
+    assert (last_seq, lost) == (9, 2)
+    assert cpu(segments) == [5, 6, 7, 8]
+    # Данные переходят через конец буфера — два среза, номера записей идут подряд
+    assert len(segments) == 2
+    assert SharedRingBuffer.is_intact(segments[0], 6)
+    assert SharedRingBuffer.is_intact(segments[1], 6 + len(segments[0]))
+
+
+def test_read_since_limit_returns_newest(ring):
+    push(ring, range(4))
+    segments, last_seq, lost = ring.read_since(0, limit=2)
+    assert cpu(segments) == [2, 3]
+    assert (last_seq, lost) == (4, 0)
+
+
+def test_attached_reader_sees_producer(ring):
+    reader = SharedRingBuffer.attach(ring.name)
+    try:
+        assert reader.newest() is None
+        ring.push(10.0, 20.0, range(GPU_SLOTS + 2), 0.5, timestamp=123)
+        assert reader.write_seq == 1
+        assert reader.newest() == {
+            "timestamp": 123,
+            "cpu_usage": 10.0,
+            "memory_usage": 20.0,
+            "cycle_time": 0.5,
+            # Лишние GPU сверх GPU_SLOTS не записываются
+            "gpu_load": [float(load) for load in range(GPU_SLOTS)],
+        }
+    finally:
+        reader.close()
+
+
+def test_overwritten_segment_is_not_intact(ring):
+    push(ring, range(2))
+    (segment,) = ring.latest(2)
+    push(ring, range(2, 6))
+    assert not SharedRingBuffer.is_intact(segment, 1)